@@ -0,0 +1,71 @@
+"""Benchmark: Parsel vs. compiled lxml extraction of detail pages
+
+Extracts the detail page fixtures in tests/test_scrapy/ over and over with both
+extractors in a single process and reports pages per second per core, i.e. the
+upper bound of what one reactor thread or pool worker can parse.
+
+    uv run python benchmarks/bench_extract.py --repeat 200
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+URL = "https://www.foerderdatenbank.de/FDB/Content/DE/Foerderprogramm/Bund/BMWi/bench.html"
+
+
+def load_fixtures():
+    pages = []
+    for path in sorted(glob.glob(os.path.join(ROOT, "tests/test_scrapy/detail*.html"))):
+        with open(path, encoding="utf-8") as f:
+            pages.append(f.read())
+    return pages
+
+
+def bench(extractor, pages, repeat, parse):
+    from parsel import Selector
+    from funding_crawler.extract import extract_details, extract_details_compiled
+
+    selectors = None if parse else [Selector(text=page) for page in pages]
+
+    start = time.process_time()
+    for _ in range(repeat):
+        for i, page in enumerate(pages):
+            selector = Selector(text=page) if parse else selectors[i]
+            try:
+                if extractor == "lxml":
+                    extract_details_compiled(URL, selector.root)
+                else:
+                    extract_details(URL, selector)
+            except ValueError:
+                pass
+    elapsed = time.process_time() - start
+
+    return repeat * len(pages) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument(
+        "--no-parse",
+        action="store_true",
+        help="parse the HTML once up front and only measure extraction",
+    )
+    args = parser.parse_args()
+
+    pages = load_fixtures()
+
+    print(f"{'extractor':>9} {'pages/s/core':>12}")
+    for extractor in ("parsel", "lxml"):
+        rate = bench(extractor, pages, args.repeat, not args.no_parse)
+        print(f"{extractor:>9} {rate:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Benchmark: queries on the scd2 history before and after `migrations.migrate`
+
+Loads N crawl versions of synthetic programs (see `benchmarks/synthetic.py`) into
+a scratch dataset on the Postgres given by POSTGRES_CONN_STR, then reports the
+EXPLAIN ANALYZE execution time and the scan nodes of the history queries, once
+without and once with the indexes of `funding_crawler/migrations.py`.
+
+    POSTGRES_CONN_STR=postgresql://... uv run python benchmarks/bench_indexes.py --programs 5000 --versions 20
+"""
+
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import dlt  # noqa: E402
+from benchmarks.synthetic import generate_programs  # noqa: E402
+from funding_crawler.helpers import gen_comp_a, gen_comp_c, gen_query  # noqa: E402
+from funding_crawler.migrations import migrate  # noqa: E402
+from funding_crawler.models import FundingProgramSchema  # noqa: E402
+from funding_crawler.schema import dlt_columns  # noqa: E402
+from funding_crawler.snapshot import touched_query  # noqa: E402
+
+DATASET = "bench_indexes"
+TABLE = "programs"
+
+# parameters of the queries, a watermark after all loads for the touched programs
+PARAMS = {"touched since last load": ("9", "2100-01-01")}
+
+
+def load_history(pipeline, programs, versions):
+    for version in range(1, versions + 1):
+        pipeline.run(
+            dlt.resource([generate_programs(programs, version)], name=TABLE),
+            columns=dlt_columns(FundingProgramSchema),
+            write_disposition={
+                "disposition": "merge",
+                "strategy": "scd2",
+                "validity_column_names": ["on_website_from", "on_website_to"],
+                "row_version_column_name": "checksum",
+            },
+            loader_file_format="csv",
+        )
+
+
+def queries(table):
+    columns = list(FundingProgramSchema.__annotations__.keys())
+    # exact duplicate versions, see funding_crawler/compaction.py
+    duplicates = f"""SELECT MAX(_dlt_load_id), id_hash FROM {table}
+        GROUP BY id_hash, checksum HAVING COUNT(*) > 1"""
+
+    return {
+        "gen_comp_a": gen_comp_a(table),
+        "gen_comp_c": gen_comp_c(table, columns),
+        "gen_query": gen_query(table, columns),
+        "current checksums": f"SELECT id_hash, checksum FROM {table} WHERE on_website_to IS NULL",
+        "touched since last load": touched_query(table),
+        "duplicates": duplicates,
+    }
+
+
+def explain(client, query, *args):
+    ((plan,),) = client.execute_sql(f"EXPLAIN (ANALYZE, FORMAT JSON) {query}", *args)
+    plan = plan[0]
+
+    scans = set()
+    stack = [plan["Plan"]]
+    while stack:
+        node = stack.pop()
+        if "Scan" in node["Node Type"]:
+            scans.add(node["Node Type"])
+        stack.extend(node.get("Plans", []))
+
+    return plan["Execution Time"], ", ".join(sorted(scans))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--programs", type=int, default=5000)
+    parser.add_argument("--versions", type=int, default=20)
+    args = parser.parse_args()
+
+    conn_str = os.getenv("POSTGRES_CONN_STR")
+    if not conn_str:
+        parser.error("POSTGRES_CONN_STR is not set")
+
+    pipeline = dlt.pipeline(
+        pipeline_name=DATASET,
+        destination=dlt.destinations.postgres(conn_str),
+        dataset_name=DATASET,
+        dev_mode=True,
+    )
+    load_history(pipeline, args.programs, args.versions)
+
+    results = {}
+    with pipeline.sql_client() as client:
+        table = client.make_qualified_table_name(TABLE)
+        for name, query in queries(table).items():
+            results[name] = [explain(client, query, *PARAMS.get(name, ()))]
+
+    migrate(pipeline, TABLE)
+
+    with pipeline.sql_client() as client:
+        for name, query in queries(table).items():
+            results[name].append(explain(client, query, *PARAMS.get(name, ())))
+        client.drop_dataset()
+
+    print(f"{'query':>24} {'before':>10} {'after':>10}  scans after")
+    for name, ((before, _), (after, scans)) in results.items():
+        print(f"{name:>24} {before:>8.1f}ms {after:>8.1f}ms  {scans}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark: dlt INSERT loading vs. COPY (csv) loading for the scd2 merge
+
+Loads N crawl versions of synthetic programs (see `benchmarks/synthetic.py`)
+with the scd2 strategy used in main.py and reports the time of every load, once
+per loader file format. Runs against Postgres if POSTGRES_CONN_STR is set,
+otherwise against a local DuckDB file as stand-in (which has no COPY path, so
+parquet is compared instead of csv).
+
+    POSTGRES_CONN_STR=postgresql://... uv run python benchmarks/bench_load.py --programs 5000 --versions 5
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import dlt  # noqa: E402
+from benchmarks.synthetic import generate_programs  # noqa: E402
+from funding_crawler.models import FundingProgramSchema  # noqa: E402
+from funding_crawler.schema import dlt_columns  # noqa: E402
+
+WRITE_DISPOSITION = {
+    "disposition": "merge",
+    "strategy": "scd2",
+    "validity_column_names": ["on_website_from", "on_website_to"],
+    "row_version_column_name": "checksum",
+}
+
+
+def create_destination(name):
+    conn_str = os.getenv("POSTGRES_CONN_STR")
+    if conn_str:
+        return dlt.destinations.postgres(conn_str), ["insert_values", "csv"]
+
+    return dlt.destinations.duckdb(f"{name}.duckdb"), ["insert_values", "parquet"]
+
+
+def bench(loader_file_format, programs, versions, batch_size):
+    name = f"bench_load_{loader_file_format}"
+    destination, _ = create_destination(name)
+    pipeline = dlt.pipeline(
+        pipeline_name=name,
+        destination=destination,
+        dataset_name=name,
+        dev_mode=True,
+    )
+
+    timings = []
+    for version in range(1, versions + 1):
+        data = generate_programs(programs, version)
+        batches = [data[i : i + batch_size] for i in range(0, len(data), batch_size)]
+
+        start = time.perf_counter()
+        pipeline.run(
+            dlt.resource(batches, name=name),
+            columns=dlt_columns(FundingProgramSchema),
+            write_disposition=WRITE_DISPOSITION,
+            loader_file_format=loader_file_format,
+        )
+        timings.append(time.perf_counter() - start)
+
+    if not os.getenv("POSTGRES_CONN_STR") and os.path.exists(f"{name}.duckdb"):
+        os.remove(f"{name}.duckdb")
+
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--programs", type=int, default=5000)
+    parser.add_argument("--versions", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--formats", nargs="+", default=None)
+    args = parser.parse_args()
+
+    _, formats = create_destination("bench_load")
+    formats = args.formats or formats
+
+    print(
+        f"{'format':>13} "
+        + " ".join(f"{f'v{v}':>8}" for v in range(1, args.versions + 1))
+    )
+    for loader_file_format in formats:
+        timings = bench(
+            loader_file_format, args.programs, args.versions, args.batch_size
+        )
+        print(f"{loader_file_format:>13} " + " ".join(f"{s:>7.1f}s" for s in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Benchmark: inline detail parsing vs. parsing in a worker pool
+
+Serves a detail page fixture from a local HTTP server (with an artificial latency
+to mimic the real website) and crawls it with FundingSpider for several values of
+CONCURRENT_REQUESTS, once with parsing on the reactor thread and once with
+FUNDING_PARSE_WORKERS. Every configuration runs in its own process, because the
+Twisted reactor cannot be restarted.
+
+    uv run python benchmarks/bench_parse_offload.py --pages 1000 --workers 4
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FIXTURE = os.path.join(ROOT, "tests/test_scrapy/detail_single_desc.html")
+
+
+def serve(port, latency):
+    with open(FIXTURE, "rb") as f:
+        body = f.read()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    ThreadingHTTPServer(("127.0.0.1", port), Handler).serve_forever()
+
+
+def crawl(port, pages, concurrency, workers):
+    from scrapy import Request
+    from scrapy.crawler import CrawlerProcess
+    from funding_crawler.spider import FundingSpider
+
+    class BenchSpider(FundingSpider):
+        name = "bench"
+
+        def start_requests(self):
+            for i in range(pages):
+                yield Request(
+                    f"http://127.0.0.1:{port}/FDB/Content/DE/Foerderprogramm/p{i}.html",
+                    callback=self.details_callback,
+                )
+
+    process = CrawlerProcess(
+        settings={
+            "LOG_LEVEL": "ERROR",
+            "TELNETCONSOLE_ENABLED": False,
+            "ROBOTSTXT_OBEY": False,
+            "CONCURRENT_REQUESTS": concurrency,
+            "CONCURRENT_REQUESTS_PER_DOMAIN": concurrency,
+            "FUNDING_PARSE_WORKERS": workers,
+        }
+    )
+    crawler = process.create_crawler(BenchSpider)
+    process.crawl(crawler)
+
+    start = time.perf_counter()
+    process.start()
+    elapsed = time.perf_counter() - start
+
+    items = crawler.stats.get_value("item_scraped_count", 0)
+    print(json.dumps({"items": items, "seconds": elapsed}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[4, 8, 16, 32])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--single", nargs=2, type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        crawl(args.port, args.pages, *args.single)
+        return
+
+    server = multiprocessing.Process(
+        target=serve, args=(args.port, args.latency), daemon=True
+    )
+    server.start()
+    time.sleep(0.5)
+
+    print(f"{'concurrency':>11} {'workers':>7} {'pages/s':>8}")
+    try:
+        for concurrency in args.concurrency:
+            for workers in (0, args.workers):
+                result = subprocess.run(
+                    [
+                        sys.executable,
+                        __file__,
+                        "--pages",
+                        str(args.pages),
+                        "--port",
+                        str(args.port),
+                        "--single",
+                        str(concurrency),
+                        str(workers),
+                    ],
+                    capture_output=True,
+                    check=True,
+                    text=True,
+                )
+                stats = json.loads(result.stdout.strip().splitlines()[-1])
+                rate = stats["items"] / stats["seconds"]
+                print(f"{concurrency:>11} {workers:>7} {rate:>8.1f}")
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Synthetic funding programs for the load and query benchmarks
+
+`generate_programs(count, version)` returns the programs as they would be scraped
+in crawl `version` (starting at 1): in every version a share of the programs
+changes its content (and therefore its checksum) and a few programs are missing
+from the website.
+"""
+
+import hashlib
+import random
+from funding_crawler.helpers import compute_checksum, gen_license
+
+BASE_URL = (
+    "https://www.foerderdatenbank.de/FDB/Content/DE/Foerderprogramm/Bund/Synthetic/"
+)
+
+WORDS = (
+    "Förderung Zuschuss Darlehen Unternehmen Forschung Innovation Kommune "
+    "Bildung Energie Klimaschutz Digitalisierung Gründung Beratung Infrastruktur"
+).split()
+
+
+def revision(index, version, change_rate):
+    """Number of content changes of program `index` up to `version`."""
+    return sum(
+        random.Random(f"{index}-{v}").random() < change_rate
+        for v in range(2, version + 1)
+    )
+
+
+def text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def generate_program(index, rev):
+    rng = random.Random(f"{index}-rev-{rev}")
+    id_url = f"synthetic-{index}"
+    url = f"{BASE_URL}{id_url}.html"
+    title = f"Programm {index} {text(rng, 3)}"
+
+    dct = {
+        "title": title,
+        "description": f"<article><p>{text(rng, 200)}</p></article>",
+        "more_info": f"<article><p>{text(rng, 100)}</p></article>",
+        "legal_basis": f"<article><p>{text(rng, 50)}</p></article>",
+        "contact_info_institution": text(rng, 4),
+        "contact_info_street": "Musterstraße 1",
+        "contact_info_city": "12345 Berlin",
+        "contact_info_fax": None,
+        "contact_info_phone": "+49 30 123456",
+        "contact_info_email": "info@example.com",
+        "contact_info_website": "https://example.com",
+        "funding_type": ["Zuschuss"],
+        "funding_area": rng.sample(WORDS, 2),
+        "funding_location": ["bundesweit"],
+        "eligible_applicants": ["Unternehmen", "Kommune"],
+        "funding_body": "Bund",
+        "further_links": ["https://example.com/info"],
+    }
+
+    checksum = compute_checksum(dct, list(dct.keys()))
+    dct.update(
+        {
+            "url": url,
+            "id_url": id_url,
+            "id_hash": hashlib.md5(id_url.encode()).hexdigest(),
+            "checksum": checksum,
+            "license_info": gen_license(title, "2026-01-01", url),
+        }
+    )
+    return dct
+
+
+def generate_programs(count, version, change_rate=0.1, missing_rate=0.01):
+    """Programs scraped in crawl `version`, see module docstring."""
+    programs = []
+    for index in range(count):
+        if random.Random(f"{index}-missing-{version}").random() < missing_rate:
+            continue
+        programs.append(generate_program(index, revision(index, version, change_rate)))
+    return programs
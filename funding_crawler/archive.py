@@ -0,0 +1,113 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import datetime
+import zstandard
+
+
+class HtmlArchive:
+    """
+    Content-addressed archive of raw responses.
+
+    Bodies are stored zstd-compressed under `objects/` and deduplicated by their
+    sha256 hash. An SQLite index maps every URL fetched in a crawl run to the body
+    it returned, which allows to re-parse a whole run without network access
+    (see `funding_crawler.replay`).
+    """
+
+    def __init__(self, root, level=10):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.compressor = zstandard.ZstdCompressor(level=level)
+        self.decompressor = zstandard.ZstdDecompressor()
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            os.path.join(root, "index.sqlite"), check_same_thread=False
+        )
+        with self.lock, self.connection:
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    run_id TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    callback TEXT NOT NULL,
+                    digest TEXT NOT NULL,
+                    content_type TEXT,
+                    fetched_at TEXT NOT NULL,
+                    PRIMARY KEY (run_id, url)
+                )"""
+            )
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}.zst")
+
+    def put(self, run_id, url, callback, body, content_type=None):
+        """Store a response body (once per content) and index it for the run."""
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.object_path(digest)
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(self.compressor.compress(body))
+            os.replace(tmp_path, path)
+
+        self.index(run_id, url, callback, digest, content_type)
+        return digest
+
+    def index(self, run_id, url, callback, digest, content_type=None):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    run_id,
+                    url,
+                    callback,
+                    digest,
+                    content_type,
+                    datetime.now().isoformat(),
+                ),
+            )
+
+    def link_latest(self, run_id, url, callback):
+        """Index the most recently archived body of `url` for another run, e.g. after a 304."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT digest, content_type FROM responses WHERE url = ? ORDER BY fetched_at DESC LIMIT 1",
+                (url,),
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        self.index(run_id, url, callback, *row)
+        return row[0]
+
+    def get(self, digest):
+        with open(self.object_path(digest), "rb") as f:
+            return self.decompressor.decompress(f.read())
+
+    def runs(self):
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT DISTINCT run_id FROM responses ORDER BY run_id"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def entries(self, run_id):
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT url, callback, digest, content_type FROM responses WHERE run_id = ? ORDER BY url",
+                (run_id,),
+            ).fetchall()
+        return [
+            {"url": url, "callback": callback, "digest": digest, "content_type": ct}
+            for url, callback, digest, ct in rows
+        ]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
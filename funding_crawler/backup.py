@@ -0,0 +1,104 @@
+"""Background backup of the database
+
+`BackgroundBackup` dumps the database with `pg_dump -Fd -j N` (directory format,
+one table per worker, zstd compressed) in a thread, packs the directory into a
+tar and uploads it, while the crawl is already running. pg_dump reads from a
+snapshot taken when it starts, so the dump is the state before the crawl.
+
+The load must not start before the dump is done: the workers of a parallel dump
+fail if dlt takes an exclusive lock (e.g. to add a column) in the meantime. Pass
+`wait_for_dump` as `before_load` to the pipeline runner. Restore with
+`restore_backup.sh`.
+"""
+
+import logging
+import os
+import shutil
+import subprocess
+import tarfile
+import threading
+from funding_crawler.upload import TRANSFER_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class BackupError(Exception):
+    pass
+
+
+class BackgroundBackup:
+    def __init__(self, conn_str, client, bucket, name, jobs=4, compress="zstd:12"):
+        self.conn_str = conn_str
+        self.client = client
+        self.bucket = bucket
+        self.name = name
+        self.jobs = jobs
+        self.compress = compress
+        self.dumped = threading.Event()
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name="backup", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        try:
+            self.dump()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.dumped.set()
+
+        if self.error is None:
+            try:
+                self.upload()
+            except Exception as e:
+                self.error = e
+
+    def dump(self):
+        logger.info(f"Dumping database to {self.name} with {self.jobs} jobs")
+        shutil.rmtree(self.name, ignore_errors=True)
+        result = subprocess.run(
+            [
+                "/usr/bin/pg_dump",
+                "-Fd",
+                "-j",
+                str(self.jobs),
+                "-v",
+                "-d",
+                self.conn_str,
+                "-f",
+                self.name,
+                f"--compress={self.compress}",
+            ],
+            capture_output=True,
+        )
+
+        if result.returncode != 0:
+            logger.error(f"STDERR: {result.stderr.decode('utf-8', errors='replace')}")
+            logger.error(f"STDOUT: {result.stdout.decode('utf-8', errors='replace')}")
+            raise BackupError(f"pg_dump failed with return code {result.returncode}")
+
+    def upload(self):
+        # the files of the directory are compressed already, the tar is not
+        tar_name = f"{self.name}.tar"
+        with tarfile.open(tar_name, "w") as tar:
+            tar.add(self.name, arcname=self.name)
+        shutil.rmtree(self.name)
+
+        logger.info(f"Uploading {tar_name} to bucket {self.bucket}")
+        self.client.upload_file(tar_name, self.bucket, tar_name, Config=TRANSFER_CONFIG)
+        os.remove(tar_name)
+
+    def wait_for_dump(self):
+        """Block until pg_dump finished, raise if it failed."""
+        self.dumped.wait()
+        if self.error is not None:
+            raise BackupError("Backup failed, not loading") from self.error
+
+    def join(self):
+        """Block until the backup is uploaded, raise if it failed."""
+        self.thread.join()
+        if self.error is not None:
+            raise BackupError("Backup failed") from self.error
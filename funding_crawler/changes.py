@@ -0,0 +1,130 @@
+"""Incremental change feed of the scd2 history
+
+Every crawl run loads its versions with `on_website_from` set to the run's
+boundary timestamp and retires versions with `on_website_to` set to the same
+timestamp. A change set is everything that happened at one boundary:
+
+- `insert`: a new version of a program that had no version retired at the boundary,
+- `update`: a new version that replaces a version retired at the boundary,
+- `retire`: a version retired at the boundary without a successor.
+
+`export_changes` writes one small parquet file per run that is not yet in the
+manifest and appends the run to the manifest, so mirrors only download the
+change sets they have not seen yet. The feed starts with the latest run at the
+first export, the full dumps hold everything before it.
+"""
+
+import os
+from datetime import datetime, timezone
+import polars as pl
+
+MANIFEST_NAME = "manifest.json"
+
+
+def gen_changes_query(history_table):
+    return f"""
+    SELECT
+        h.*,
+        CASE
+            WHEN h.on_website_from = %s AND EXISTS (
+                SELECT 1 FROM {history_table} p
+                WHERE p.id_hash = h.id_hash AND p.on_website_to = %s
+            ) THEN 'update'
+            WHEN h.on_website_from = %s THEN 'insert'
+            ELSE 'retire'
+        END AS change
+    FROM {history_table} h
+    WHERE h.on_website_from = %s
+    OR (
+        h.on_website_to = %s AND NOT EXISTS (
+            SELECT 1 FROM {history_table} n
+            WHERE n.id_hash = h.id_hash AND n.on_website_from = %s
+        )
+    )
+    ORDER BY h.id_hash"""
+
+
+def change_boundaries(client, history_table, after=None):
+    """Boundary timestamps of all runs after `after`, in order."""
+    rows = client.execute_sql(
+        f"""SELECT boundary FROM (
+            SELECT on_website_from AS boundary FROM {history_table}
+            UNION
+            SELECT on_website_to AS boundary FROM {history_table}
+        ) AS boundaries
+        WHERE boundary IS NOT NULL AND boundary > %s
+        ORDER BY boundary""",
+        after or datetime(1970, 1, 1, tzinfo=timezone.utc),
+    )
+    return [row[0] for row in rows]
+
+
+def write_change_set(client, history_table, boundary, directory):
+    """
+    Write the changes at `boundary` to a parquet file in `directory`.
+
+    The file is named after the dlt load id of the run, or after the boundary
+    timestamp in the same format if the run only retired programs.
+
+    Returns:
+        dict: The manifest entry of the change set.
+    """
+    with client.execute_query(
+        gen_changes_query(history_table), *[boundary] * 6
+    ) as cursor:
+        names = [c[0] for c in cursor.description]
+        rows = cursor.fetchall()
+
+    df = pl.DataFrame(rows, schema=names, orient="row", infer_schema_length=None)
+    loaded = df.filter(pl.col("change") != "retire")["_dlt_load_id"]
+    load_id = loaded.max() if len(loaded) else f"{boundary.timestamp():.6f}"
+
+    file_name = f"{load_id}.parquet"
+    df.write_parquet(os.path.join(directory, file_name))
+
+    counts = df["change"].value_counts()
+    counts = dict(zip(counts["change"], counts["count"]))
+    return {
+        "load_id": load_id,
+        "boundary": boundary.isoformat(),
+        "file": file_name,
+        "inserted": counts.get("insert", 0),
+        "updated": counts.get("update", 0),
+        "retired": counts.get("retire", 0),
+    }
+
+
+def export_changes(pipeline, table_name, directory, manifest=None, backfill=False):
+    """
+    Write the change sets of all runs missing in `manifest` to `directory`.
+
+    Args:
+        pipeline (dlt.Pipeline): Pipeline of the scd2 history table.
+        table_name (str): Name of the scd2 history table.
+        directory (str): Directory for the parquet files.
+        manifest (dict): Manifest of the previous export, None for the first one.
+        backfill (bool): Start the first export with the first run of the history
+            instead of the latest one, one file per run.
+
+    Returns:
+        tuple: The new manifest entries and the updated manifest.
+    """
+    manifest = manifest or {"table": table_name, "runs": []}
+    after = (
+        datetime.fromisoformat(manifest["runs"][-1]["boundary"])
+        if manifest["runs"]
+        else None
+    )
+
+    os.makedirs(directory, exist_ok=True)
+    with pipeline.sql_client() as client:
+        history_table = client.make_qualified_table_name(table_name)
+        boundaries = change_boundaries(client, history_table, after)
+        if after is None and not backfill:
+            boundaries = boundaries[-1:]
+        entries = [
+            write_change_set(client, history_table, boundary, directory)
+            for boundary in boundaries
+        ]
+
+    return entries, {**manifest, "runs": manifest["runs"] + entries}
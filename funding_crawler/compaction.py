@@ -0,0 +1,228 @@
+"""Set-based compaction of the scd2 history
+
+Replaces `queries/fix_dupliates.sql`. In one pass over the history table it
+
+- removes exact duplicate versions,
+- merges consecutive versions of a program whose content is equal after
+  normalization (e.g. the code/label flip-flop described in the README),
+- stitches the validity intervals of the merged versions back together.
+
+The normalized checksum is computed in Python, a page of versions at a time, and
+inserted into a temporary table with query parameters, everything else is a
+single gaps-and-islands query. Of every
+island of equal versions the most recent row is kept (its checksum is the one
+the spider produces today), with `on_website_from` of the first and
+`on_website_to` of the last version. Usage:
+
+    POSTGRES_CONN_STR=... python -m funding_crawler.compaction [--dry-run]
+"""
+
+import argparse
+import json
+import logging
+import os
+import dlt
+from funding_crawler.extract import code_to_label
+from funding_crawler.helpers import compute_checksum
+from funding_crawler.models import FundingProgramSchema
+from funding_crawler.snapshot import invalidate_snapshots
+
+logger = logging.getLogger(__name__)
+
+# fields that are not part of the content, like in `extract.add_identifiers`
+IGNORE_FIELDS = ["url", "id_hash", "id_url", "checksum", "license_info"]
+LABEL_FIELDS = [
+    "funding_type",
+    "funding_area",
+    "funding_location",
+    "eligible_applicants",
+]
+CONTENT_FIELDS = [
+    field for field in FundingProgramSchema.model_fields if field not in IGNORE_FIELDS
+]
+
+NORM_TABLE = "compaction_norm"
+PLAN_TABLE = "compaction_plan"
+
+
+def normalized_checksum(row):
+    """Checksum of the content of a version, with codes mapped to labels and empty fields dropped."""
+    dct = {}
+    for field in CONTENT_FIELDS:
+        value = row[field]
+        if field in LABEL_FIELDS and value is not None:
+            if isinstance(value, str):  # json columns are strings in some destinations
+                value = json.loads(value)
+            value = [code_to_label.get(v, v) for v in value]
+        if value is not None:
+            dct[field] = value
+    return compute_checksum(dct, list(dct.keys()))
+
+
+def write_norms(client, history_table, chunk_size):
+    """
+    Fill `NORM_TABLE` with the normalized checksum of every version.
+
+    The versions are read in pages of `chunk_size` by `_dlt_id`, so only one page
+    of texts is held in memory.
+
+    Returns:
+        int: Number of versions.
+    """
+    columns = ", ".join(["_dlt_id", *CONTENT_FIELDS])
+    versions = 0
+    last_id = ""
+    while True:
+        with client.execute_query(
+            f"SELECT {columns} FROM {history_table} WHERE _dlt_id > %s ORDER BY _dlt_id LIMIT %s",
+            last_id,
+            chunk_size,
+        ) as cursor:
+            names = [c[0] for c in cursor.description]
+            rows = [dict(zip(names, values)) for values in cursor.fetchall()]
+        if not rows:
+            return versions
+
+        client.execute_sql(
+            f"INSERT INTO {NORM_TABLE} VALUES {', '.join(['(%s, %s)'] * len(rows))}",
+            *[
+                value
+                for row in rows
+                for value in (row["_dlt_id"], normalized_checksum(row))
+            ],
+        )
+        versions += len(rows)
+        last_id = rows[-1]["_dlt_id"]
+
+
+def gen_plan_query(history_table):
+    # islands: consecutive versions of a program with equal normalized content,
+    # a gap between two versions (the program was off the website) starts a new island
+    return f"""
+    WITH ordered AS (
+        SELECT
+            h._dlt_id,
+            h.id_hash,
+            h._dlt_load_id,
+            h.on_website_from,
+            h.on_website_to,
+            n.norm,
+            LAG(n.norm) OVER w AS prev_norm,
+            LAG(h.on_website_to) OVER w AS prev_to
+        FROM {history_table} h
+        JOIN {NORM_TABLE} n ON n._dlt_id = h._dlt_id
+        WINDOW w AS (PARTITION BY h.id_hash ORDER BY h.on_website_from, h._dlt_load_id, h._dlt_id)
+    ),
+    flagged AS (
+        SELECT
+            *,
+            CASE
+                WHEN prev_norm = norm AND (prev_to IS NULL OR prev_to >= on_website_from) THEN 0
+                ELSE 1
+            END AS new_island
+        FROM ordered
+    ),
+    islands AS (
+        SELECT
+            *,
+            SUM(new_island) OVER (
+                PARTITION BY id_hash ORDER BY on_website_from, _dlt_load_id, _dlt_id
+                ROWS UNBOUNDED PRECEDING
+            ) AS island
+        FROM flagged
+    ),
+    spans AS (
+        SELECT
+            *,
+            MIN(on_website_from) OVER i AS island_from,
+            CASE
+                WHEN COUNT(*) OVER i > COUNT(on_website_to) OVER i THEN NULL
+                ELSE MAX(on_website_to) OVER i
+            END AS island_to,
+            ROW_NUMBER() OVER (
+                PARTITION BY id_hash, island
+                ORDER BY on_website_from DESC, _dlt_load_id DESC, _dlt_id DESC
+            ) AS island_rank
+        FROM islands
+        WINDOW i AS (PARTITION BY id_hash, island)
+    )
+    SELECT
+        _dlt_id,
+        island_rank = 1 AS keep,
+        island_from,
+        island_to,
+        on_website_from IS DISTINCT FROM island_from
+            OR on_website_to IS DISTINCT FROM island_to AS restitch
+    FROM spans"""
+
+
+def compact(pipeline, table_name, dry_run=False, chunk_size=1000):
+    """
+    Compact the scd2 history table `table_name`.
+
+    Returns:
+        dict: Number of `versions` before, of `deleted` versions and of `restitched`
+        versions whose validity interval was extended.
+    """
+    with pipeline.sql_client() as client:
+        history_table = client.make_qualified_table_name(table_name)
+
+        client.execute_sql(f"DROP TABLE IF EXISTS {NORM_TABLE}")
+        client.execute_sql(f"DROP TABLE IF EXISTS {PLAN_TABLE}")
+        client.execute_sql(
+            f"CREATE TEMPORARY TABLE {NORM_TABLE} (_dlt_id varchar PRIMARY KEY, norm varchar NOT NULL)"
+        )
+        versions = write_norms(client, history_table, chunk_size)
+
+        client.execute_sql(
+            f"CREATE TEMPORARY TABLE {PLAN_TABLE} AS {gen_plan_query(history_table)}"
+        )
+        ((deleted, restitched),) = client.execute_sql(
+            f"SELECT COUNT(*) FILTER (WHERE NOT keep), COUNT(*) FILTER (WHERE keep AND restitch) FROM {PLAN_TABLE}"
+        )
+        stats = {"versions": versions, "deleted": deleted, "restitched": restitched}
+
+        if not dry_run:
+            with client.begin_transaction():
+                client.execute_sql(
+                    f"DELETE FROM {history_table} WHERE _dlt_id IN (SELECT _dlt_id FROM {PLAN_TABLE} WHERE NOT keep)"
+                )
+                client.execute_sql(
+                    f"""UPDATE {history_table}
+                    SET on_website_from = p.island_from, on_website_to = p.island_to
+                    FROM {PLAN_TABLE} p
+                    WHERE {history_table}._dlt_id = p._dlt_id AND p.keep AND p.restitch"""
+                )
+
+        client.execute_sql(f"DROP TABLE {PLAN_TABLE}")
+        client.execute_sql(f"DROP TABLE {NORM_TABLE}")
+
+    if not dry_run and (deleted or restitched):
+        # deleted versions are not visible to the incremental refresh
+        invalidate_snapshots(pipeline)
+
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dataset", default="foerderdatenbankdumpbackend")
+    parser.add_argument("--table", default=None, help="defaults to the dataset name")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    pipeline = dlt.pipeline(
+        pipeline_name="fundingcrawler",
+        destination=dlt.destinations.postgres(os.environ["POSTGRES_CONN_STR"]),
+        dataset_name=args.dataset,
+    )
+    stats = compact(pipeline, args.table or args.dataset, dry_run=args.dry_run)
+    logger.info(
+        f"{'Would delete' if args.dry_run else 'Deleted'} {stats['deleted']} of {stats['versions']} versions, restitched {stats['restitched']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+from dlt.destinations.exceptions import DatabaseUndefinedRelation
+
+
+class ChangeDetector:
+    """
+    Client-side change detection before the scd2 load.
+
+    Knows the checksum of every current (not retired) program. `filter` drops
+    scraped programs whose checksum did not change, so only new and changed
+    programs are merged. Since unchanged programs are no longer part of the load,
+    the resource needs `merge_key="id_hash"` (scd2 then only retires versions of
+    loaded ids), and programs that disappeared from the website are retired
+    explicitly with `retire` after a complete crawl.
+    """
+
+    def __init__(self, current=None):
+        self.current = dict(current or {})  # id_hash -> checksum
+        self.seen = set()
+        self.forwarded = 0
+
+    @classmethod
+    def from_destination(cls, pipeline, table_name):
+        """Load the checksums of the current rows of `table_name` from the destination."""
+        try:
+            with pipeline.sql_client() as client:
+                table = client.make_qualified_table_name(table_name)
+                rows = client.execute_sql(
+                    f"SELECT id_hash, checksum FROM {table} WHERE on_website_to IS NULL"
+                )
+        except DatabaseUndefinedRelation:
+            rows = []
+
+        return cls(rows)
+
+    def filter(self, rows):
+        """Return the new or changed programs of a batch."""
+        changed = []
+        for row in rows:
+            self.seen.add(row["id_hash"])
+            if self.current.get(row["id_hash"]) != row["checksum"]:
+                changed.append(row)
+                self.current[row["id_hash"]] = row["checksum"]
+
+        self.forwarded += len(changed)
+        return changed
+
+    def mark_seen(self, id_hashes):
+        """Mark programs as still on the website, e.g. pages that failed to parse."""
+        self.seen.update(id_hashes)
+
+    def absent(self):
+        """Current programs that were not seen in this crawl."""
+        return set(self.current) - self.seen
+
+    def retire(self, pipeline, table_name, boundary_timestamp):
+        """
+        Retire the current rows of all programs that were not seen in this crawl.
+
+        Only call this after a complete crawl, otherwise programs that were merely
+        not reached are retired. `boundary_timestamp` should be the one used for
+        the scd2 load.
+
+        Returns:
+            set: The retired `id_hash` values.
+        """
+        absent = self.absent()
+        if absent:
+            placeholders = ", ".join(["%s"] * len(absent))
+            with pipeline.sql_client() as client:
+                table = client.make_qualified_table_name(table_name)
+                client.execute_sql(
+                    f"UPDATE {table} SET on_website_to = %s WHERE on_website_to IS NULL AND id_hash IN ({placeholders})",
+                    boundary_timestamp,
+                    *sorted(absent),
+                )
+
+        for id_hash in absent:
+            del self.current[id_hash]
+
+        return absent
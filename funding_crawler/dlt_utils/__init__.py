@@ -23,6 +23,7 @@ def run_pipeline(  # type: ignore[valid-type]
     scrapy_settings: t.Optional[AnyDict] = None,
     batch_size: t.Optional[int] = None,
     queue_size: t.Optional[int] = None,
+    queue_max_bytes: t.Optional[int] = None,
     queue_result_timeout: t.Optional[float] = None,
     **kwargs: P.kwargs,
 ) -> None:
@@ -53,6 +54,9 @@ def run_pipeline(  # type: ignore[valid-type]
     if queue_size:
         options["queue_size"] = queue_size
 
+    if queue_max_bytes:
+        options["queue_max_bytes"] = queue_max_bytes
+
     if queue_result_timeout:
         options["queue_result_timeout"] = queue_result_timeout
 
@@ -8,13 +8,21 @@ from dlt.common.configuration.specs.base_configuration import (
     BaseConfiguration,
 )
 
+from pydantic import BaseModel
 from scrapy import Spider
 
 from .queue import ScrapingQueue
-from .settings import SOURCE_SCRAPY_QUEUE_SIZE, SOURCE_SCRAPY_SETTINGS
+from .settings import (
+    SOURCE_SCRAPY_QUEUE_MAX_BYTES,
+    SOURCE_SCRAPY_QUEUE_SIZE,
+    SOURCE_SCRAPY_SETTINGS,
+)
 from .runner import ScrapingHost, PipelineRunner, ScrapyRunner, Signals
 from .types import AnyDict
 
+if t.TYPE_CHECKING:
+    import pyarrow as pa
+
 cfg_provider = SettingsTomlProvider(
     "main", supports_secrets=False, file_name="dlt_config.toml", settings_dir=""
 )
@@ -28,7 +36,10 @@ class ScrapingConfig(BaseConfiguration):
     # maxsize for queue
     queue_size: t.Optional[int] = SOURCE_SCRAPY_QUEUE_SIZE
 
-    # result wait timeout for our queue
+    # max estimated size of the queued items in bytes
+    queue_max_bytes: t.Optional[int] = SOURCE_SCRAPY_QUEUE_MAX_BYTES
+
+    # maximum batch latency: how long a started batch waits to fill up
     queue_result_timeout: t.Optional[float] = 1.0
 
     # List of start urls
@@ -57,23 +68,52 @@ def resolve_start_urls(
     return list(set(urls))
 
 
+def add_arrow_dlt_columns(pipeline: dlt.Pipeline) -> None:
+    """Let dlt add `_dlt_load_id` and `_dlt_id` to the Arrow tables of `pipeline`
+
+    dlt leaves both columns off Arrow tables by default. The option is set for
+    this pipeline only, e.g. a restore replays Arrow tables that hold both
+    columns. They cannot be added to a table that already holds rows, so call
+    this before the first load.
+    """
+    for option in ("add_dlt_load_id", "add_dlt_id"):
+        dlt.config[
+            f"{pipeline.pipeline_name}.normalize.parquet_normalizer.{option}"
+        ] = True
+
+
 @with_config(sections=("sources", "scraping"), spec=ScrapingConfig)
 def create_pipeline_runner(
     pipeline: dlt.Pipeline,
     spider: t.Type[Spider],
     batch_size: int = dlt.config.value,
     queue_size: int = dlt.config.value,
+    queue_max_bytes: int = dlt.config.value,
     queue_result_timeout: float = dlt.config.value,
     scrapy_settings: t.Optional[AnyDict] = None,
+    spider_kwargs: t.Optional[AnyDict] = None,
+    item_model: t.Optional[t.Type[BaseModel]] = None,
+    quarantine: t.Optional[t.Any] = None,
+    arrow_schema: t.Optional["pa.Schema"] = None,
+    batch_filter: t.Optional[t.Callable[[t.List[AnyDict]], t.List[AnyDict]]] = None,
+    before_load: t.Optional[t.Callable[[], None]] = None,
 ) -> ScrapingHost:
     """Creates scraping host instance
     This helper only creates pipeline host, so running and controlling
     scrapy runner and pipeline is completely delegated to advanced users
+
+    `spider_kwargs` are passed to the spider constructor. If `item_model` is
+    given, scraped items are validated against it batch-wise in the pipeline thread.
+    A `quarantine` receives pages and items that fail instead of aborting the run,
+    it is passed to the spider as well. With `arrow_schema`, batches are handed
+    to dlt as Arrow tables, see `add_arrow_dlt_columns`. `batch_filter` is applied to every validated batch.
+    `before_load` is called in the pipeline thread before the load starts.
     """
     queue = ScrapingQueue(  # type: ignore
         maxsize=queue_size,
         batch_size=batch_size,
         read_timeout=queue_result_timeout,
+        max_bytes=queue_max_bytes,
     )
 
     signals = Signals(
@@ -91,11 +131,21 @@ def create_pipeline_runner(
         start_urls=resolve_start_urls(),
         signals=signals,
         settings=settings,
+        spider_kwargs=(
+            {**(spider_kwargs or {}), "quarantine": quarantine}
+            if quarantine is not None
+            else spider_kwargs
+        ),
     )
 
     pipeline_runner = PipelineRunner(
         pipeline=pipeline,
         queue=queue,
+        item_model=item_model,
+        quarantine=quarantine,
+        arrow_schema=arrow_schema,
+        batch_filter=batch_filter,
+        before_load=before_load,
     )
 
     scraping_host = ScrapingHost(
@@ -0,0 +1,106 @@
+"""Scrapy item pipeline feeding scraped items into the queue of its crawler"""
+
+import typing as t
+
+from dlt.common import logger
+
+from scrapy import signals, Item, Spider  # type: ignore
+from scrapy.crawler import Crawler  # type: ignore
+
+from .queue import QueueClosedError, ScrapingQueue
+from .settings import SOURCE_SCRAPY_QUEUE_CHUNK_SIZE
+
+T = t.TypeVar("T")
+
+
+class QueueItemPipeline:
+    """Hands scraped items over to the queue of the crawler in chunks
+
+    The queue is the spider argument `scraping_queue` (passed by `ScrapyRunner`),
+    so several crawlers can run in one reactor, each feeding its own queue.
+    Items are buffered and put into the queue `SCRAPING_QUEUE_CHUNK_SIZE` at
+    a time, the rest is flushed when the spider gets idle or closes.
+
+    Putting items never blocks the reactor: once the queue is full, the engine
+    of the crawler is paused until the pipeline thread drained the queue.
+    """
+
+    def __init__(
+        self, crawler: Crawler, queue: ScrapingQueue[T], chunk_size: int
+    ) -> None:
+        self.crawler = crawler
+        self.queue = queue
+        self.chunk_size = chunk_size
+        self.buffer: t.List[T] = []
+        self.paused = False
+        self.stopping = False
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler) -> "QueueItemPipeline":
+        # the spider is created before the item pipelines
+        queue = getattr(crawler.spider, "scraping_queue", None)
+        if queue is None:
+            raise ValueError(
+                "QueueItemPipeline needs the spider argument scraping_queue, e.g. crawler.crawl(scraping_queue=queue)"
+            )
+
+        pipeline = cls(
+            crawler,
+            queue,
+            crawler.settings.getint(
+                "SCRAPING_QUEUE_CHUNK_SIZE", SOURCE_SCRAPY_QUEUE_CHUNK_SIZE
+            ),
+        )
+        crawler.signals.connect(pipeline.flush, signal=signals.spider_idle)
+        return pipeline
+
+    def process_item(self, item: Item, spider: Spider) -> Item:
+        self.buffer.append(item)
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+        return item
+
+    def close_spider(self, spider: Spider) -> None:
+        self.flush()
+
+    def flush(self) -> None:
+        if not self.buffer:
+            return
+
+        items, self.buffer = self.buffer, []
+
+        try:
+            self.queue.put_many(items)
+        except QueueClosedError:
+            logger.info("Queue is closed, stopping")
+            if not self.stopping:
+                self.stopping = True
+                self.crawler.stop()
+            return
+
+        if not self.paused and self.queue.is_full:
+            self.pause_engine()
+
+    def pause_engine(self) -> None:
+        """Pauses crawling until the pipeline drained the queue"""
+        from twisted.internet import reactor
+
+        logger.info(
+            f"Queue is full ({self.queue.qsize()} items, {self.queue.bytes} bytes), pausing the crawling engine"
+        )
+        self.paused = True
+        self.crawler.engine.pause()
+
+        # drain listeners are called from the pipeline thread
+        self.queue.add_drain_listener(
+            lambda: reactor.callFromThread(self.resume_engine)
+        )
+
+    def resume_engine(self) -> None:
+        if not self.paused:
+            return
+
+        logger.info("Queue drained, resuming the crawling engine")
+        self.paused = False
+        if self.crawler.engine is not None:
+            self.crawler.engine.unpause()
@@ -1,5 +1,7 @@
+import time
 import typing as t
-from queue import Empty, Queue
+from collections import deque
+from queue import Queue
 
 from dlt.common import logger
 
@@ -19,55 +21,175 @@ else:
 
 
 class QueueClosedError(Exception):
-    pass
+    """Raised by `put` and `put_many` once the queue is closed"""
+
+
+def estimate_size(item: t.Any) -> int:
+    """Rough estimate of the memory held by a scraped item in bytes"""
+    if isinstance(item, (str, bytes)):
+        return len(item)
+    if isinstance(item, t.Mapping):
+        return sum(estimate_size(k) + estimate_size(v) for k, v in item.items())
+    if isinstance(item, (list, tuple, set)):
+        return sum(estimate_size(v) for v in item)
+    return 8
 
 
 class ScrapingQueue(_Queue[T]):
+    """Queue between the Scrapy reactor and the dlt pipeline thread
+
+    `maxsize` and `max_bytes` (estimated size of the queued items) are soft
+    limits: `put` never blocks, so the reactor thread is never stalled, and
+    the queue itself takes any number of items. The limits only hold because
+    `QueueItemPipeline` checks `is_full` and pauses the crawling engine until
+    the queue drained to half of its capacity, which is signalled to the
+    listeners registered with `add_drain_listener`. Other producers have to
+    do the same.
+
+    Once the queue is closed nobody consumes it anymore, `put` and `put_many`
+    raise `QueueClosedError`.
+    """
+
     def __init__(
         self,
         maxsize: int = 0,
         batch_size: int = 10,
         read_timeout: float = 1.0,
+        max_bytes: t.Optional[int] = None,
     ) -> None:
-        super().__init__(maxsize)
+        # unbounded, capacity is enforced by the producer via `is_full`
+        super().__init__(0)
+        self.max_items = maxsize
+        self.max_bytes = max_bytes
         self.batch_size = batch_size
+        # maximum time a batch waits for more items once its first item arrived
         self.read_timeout = read_timeout
         self._is_closed = False
+        self._sizes: t.Deque[int] = deque()
+        self.bytes = 0
+        # high-water marks, e.g. to size the memory of the container
+        self.max_bytes_seen = 0
+        self.max_items_seen = 0
+        self._drain_listeners: t.List[t.Callable[[], None]] = []
+
+    def _put(self, item: T) -> None:
+        if self._is_closed:
+            raise QueueClosedError("Queue is closed")
+
+        super()._put(item)
+        size = estimate_size(item)
+        self._sizes.append(size)
+        self.bytes += size
+        self.max_bytes_seen = max(self.max_bytes_seen, self.bytes)
+        self.max_items_seen = max(self.max_items_seen, self._qsize())
+
+    def _get(self) -> T:
+        item = super()._get()
+        self.bytes -= self._sizes.popleft()
+
+        if self._drain_listeners and self._is_drained():
+            listeners, self._drain_listeners = self._drain_listeners, []
+            for listener in listeners:
+                listener()
+
+        return item
+
+    def _is_drained(self) -> bool:
+        if self.max_items and self._qsize() > self.max_items // 2:
+            return False
+        if self.max_bytes and self.bytes > self.max_bytes // 2:
+            return False
+        return True
+
+    @property
+    def is_full(self) -> bool:
+        """True if the queue holds more than `maxsize` items or `max_bytes` bytes"""
+        with self.mutex:
+            return bool(
+                (self.max_items and self._qsize() >= self.max_items)
+                or (self.max_bytes and self.bytes >= self.max_bytes)
+            )
+
+    def add_drain_listener(self, listener: t.Callable[[], None]) -> None:
+        """Calls `listener` once the queue drained to half of its capacity
+
+        The listener is called from the consumer thread while the queue is
+        locked, it must not block or access the queue.
+        """
+        with self.mutex:
+            if self._is_drained() or self._is_closed:
+                listener()
+            else:
+                self._drain_listeners.append(listener)
+
+    def put_many(self, items: t.Iterable[T]) -> None:
+        """Puts several items at once, holding the lock once
+
+        Raises:
+            QueueClosedError: If the queue is closed.
+        """
+        with self.mutex:
+            count = 0
+            for item in items:
+                self._put(item)
+                count += 1
+
+            if count:
+                self.unfinished_tasks += count
+                self.not_empty.notify()
+
+    def get_many(self, max_items: int, max_wait: float) -> t.List[T]:
+        """Takes up to `max_items` items at once
+
+        Blocks without polling until an item is available or the queue is closed.
+        Once the first item is available, waits at most `max_wait` seconds for
+        the batch to fill up. All items are taken while holding the lock once
+        and are marked as done right away.
+
+        Returns:
+            List[T]: taken items, empty only if the queue is closed and drained
+        """
+        deadline = None
+        with self.not_empty:
+            while self._qsize() < max_items and not self._is_closed:
+                if not self._qsize():
+                    self.not_empty.wait()
+                    continue
+
+                if deadline is None:
+                    deadline = time.monotonic() + max_wait
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.not_empty.wait(remaining)
+
+            items = [self._get() for _ in range(min(max_items, self._qsize()))]
+
+            if items:
+                self.not_full.notify(len(items))
+                self.unfinished_tasks -= len(items)
+                if self.unfinished_tasks <= 0:
+                    self.all_tasks_done.notify_all()
+
+        return items
 
     def get_batches(self) -> t.Iterator[t.Any]:
         """Batching helper can be wrapped as a dlt.resource
 
+        Items still in the queue when it is closed are drained as well.
+
         Returns:
-            Iterator[Any]: yields scraped items one by one
+            Iterator[Any]: yields batches of scraped items
         """
-        batch: t.List[T] = []
         while True:
-            if len(batch) == self.batch_size:
-                yield batch
-                batch = []
-
-            try:
-                if self.is_closed:
-                    raise QueueClosedError("Queue is closed")
-
-                item = self.get(timeout=self.read_timeout)
-                batch.append(item)
-
-                # Mark task as completed
-                self.task_done()
-            except Empty:
-                if batch:
-                    yield batch
-                    batch = []
-            except QueueClosedError:
+            batch = self.get_many(self.batch_size, self.read_timeout)
+            if not batch:
                 logger.info("Queue is closed, stopping...")
-
-                # Return the last batch before exiting
-                if batch:
-                    yield batch
-
                 break
 
+            yield batch
+
     def stream(self) -> t.Iterator[t.Any]:
         """Streaming generator, wraps get_batches
         and handles `GeneratorExit` if dlt closes it.
@@ -79,10 +201,28 @@ class ScrapingQueue(_Queue[T]):
             yield from self.get_batches()
         except GeneratorExit:
             self.close()
+            # nobody is going to consume them, don't let join() wait for them
+            self.discard()
 
     def close(self) -> None:
-        """Marks queue as closed"""
-        self._is_closed = True
+        """Marks queue as closed and wakes up all waiting consumers"""
+        with self.mutex:
+            self._is_closed = True
+            self.not_empty.notify_all()
+            # producers must not wait for a consumer that is gone
+            listeners, self._drain_listeners = self._drain_listeners, []
+            for listener in listeners:
+                listener()
+
+    def discard(self) -> None:
+        """Drops all queued items and marks them as done"""
+        with self.mutex:
+            self.queue.clear()
+            self._sizes.clear()
+            self.bytes = 0
+            self.unfinished_tasks = 0
+            self.not_full.notify_all()
+            self.all_tasks_done.notify_all()
 
     @property
     def is_closed(self) -> bool:
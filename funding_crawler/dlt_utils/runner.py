@@ -4,24 +4,30 @@ import threading
 import typing as t
 import dlt
 
-from dlt.common import logger
-from pydispatch import dispatcher  # type: ignore
+from dlt.common import json, logger
+from pydantic import BaseModel, TypeAdapter, ValidationError
 from typing_extensions import Self
 
-from scrapy import signals, Item, Spider  # type: ignore
-from scrapy.crawler import CrawlerProcess  # type: ignore
+from scrapy import signals, Spider  # type: ignore
+from scrapy.crawler import Crawler, CrawlerProcess  # type: ignore
 
 from .types import AnyDict, Runnable, P
+from .pipelines import QueueItemPipeline
 from .queue import ScrapingQueue
 
+if t.TYPE_CHECKING:
+    import pyarrow as pa
+
 T = t.TypeVar("T")
 
 
 class Signals:
     """Signals context wrapper
 
-    This wrapper is also a callable which accepts `CrawlerProcess` instance
+    This wrapper is also a callable which accepts the `Crawler` instance,
     this is required to stop the scraping process as soon as the queue closes.
+    Signals are connected to this crawler only, so several scraping hosts
+    can share one process.
     """
 
     def __init__(self, pipeline_name: str, queue: ScrapingQueue[T]) -> None:
@@ -29,39 +35,27 @@ class Signals:
         self.queue = queue
         self.pipeline_name = pipeline_name
 
-    def on_item_scraped(self, item: Item) -> None:
-        if not self.queue.is_closed:
-            self.queue.put(item)
-        else:
-            logger.info(
-                "Queue is closed, stopping",
-                extra={"pipeline_name": self.pipeline_name},
-            )
-            if not self.stopping:
-                self.on_engine_stopped()
-
     def on_engine_stopped(self) -> None:
         logger.info(f"Crawling engine stopped for pipeline={self.pipeline_name}")
+        logger.info(
+            f"Queue high-water marks: {self.queue.max_items_seen} items, {self.queue.max_bytes_seen} bytes"
+        )
         self.stopping = True
         self.crawler.stop()
         self.queue.close()
         self.queue.join()
 
-    def __call__(self, crawler: CrawlerProcess) -> Self:
+    def __call__(self, crawler: Crawler) -> Self:
         self.crawler = crawler
         return self
 
     def __enter__(self) -> None:
-        # We want to receive on_item_scraped callback from
-        # outside so we don't have to know about any queue instance.
-        dispatcher.connect(self.on_item_scraped, signals.item_scraped)
-
-        # Once crawling engine stops we would like to know about it as well.
-        dispatcher.connect(self.on_engine_stopped, signals.engine_stopped)
+        # Once crawling engine stops we would like to know about it.
+        # Items are handed over to the queue by `QueueItemPipeline`.
+        self.crawler.signals.connect(self.on_engine_stopped, signals.engine_stopped)
 
     def __exit__(self, exc_type: t.Any, exc_val: t.Any, exc_tb: t.Any) -> None:
-        dispatcher.disconnect(self.on_item_scraped, signals.item_scraped)
-        dispatcher.disconnect(self.on_engine_stopped, signals.engine_stopped)
+        self.crawler.signals.disconnect(self.on_engine_stopped, signals.engine_stopped)
 
 
 class ScrapyRunner(Runnable):
@@ -73,50 +67,103 @@ class ScrapyRunner(Runnable):
         start_urls: t.List[str],
         settings: AnyDict,
         signals: Signals,
+        spider_kwargs: t.Optional[AnyDict] = None,
     ) -> None:
         self.spider = spider
         self.start_urls = start_urls
-        self.crawler = CrawlerProcess(settings=settings)
+        self.crawler = CrawlerProcess(
+            settings={
+                **settings,
+                "ITEM_PIPELINES": {
+                    **settings.get("ITEM_PIPELINES", {}),
+                    QueueItemPipeline: 1000,
+                },
+            }
+        )
         self.signals = signals
+        self.spider_kwargs = spider_kwargs or {}
+        self.spider_crawler: t.Optional[Crawler] = None
+        # Scrapy stats of the last crawl, e.g. `finish_reason`
+        self.stats: AnyDict = {}
 
     def run(self, *args: P.args, **kwargs: P.kwargs) -> None:
         """Runs scrapy crawler process
 
-        All `kwargs` are forwarded to `crawler.crawl(**kwargs)`.
+        `spider_kwargs` and all `kwargs` are forwarded to `crawler.crawl(**kwargs)`,
+        together with the queue as `scraping_queue` for `QueueItemPipeline`.
         Also manages relevant signal handling in proper way.
         """
+        self.spider_crawler = self.crawler.create_crawler(self.spider)
+
         self.crawler.crawl(
-            self.spider,
+            self.spider_crawler,
             name="scraping_spider",
             start_urls=self.start_urls,
-            **kwargs,
+            scraping_queue=self.signals.queue,
+            **{**self.spider_kwargs, **kwargs},
         )
 
         try:
             logger.info("Starting the crawler")
-            with self.signals(self.crawler):
+            with self.signals(self.spider_crawler):
                 self.crawler.start()
         except Exception:
             logger.error("Was unable to start crawling process")
             raise
         finally:
             self.signals.on_engine_stopped()
-            logger.info("Scraping stopped")
+            self.stats = self.spider_crawler.stats.get_stats()
+            logger.info(
+                f"Scraping stopped, finish_reason={self.stats.get('finish_reason')}"
+            )
 
 
 class PipelineRunner(Runnable):
     """Pipeline runner runs dlt pipeline in a separate thread
     Since scrapy wants to run in the main thread it is the only available
     option to host pipeline in a thread and communicate via the queue.
+
+    If `item_model` is given, every batch taken from the queue is validated
+    at once with a `TypeAdapter(list[item_model])` and the rows passed to dlt
+    are dumped from the validated models. Invalid items are handed to
+    `quarantine.add(url, error, item=item)` if a quarantine is given, otherwise
+    a validation error aborts the run.
+
+    If `arrow_schema` is given, every batch is converted to a `pyarrow.Table`
+    with this schema, so dlt neither normalizes nor infers types row by row
+    and writes the load files directly from Arrow. Lists and dicts in string
+    columns are JSON encoded, e.g. for csv load files. dlt leaves `_dlt_load_id`
+    and `_dlt_id` off Arrow tables by default, switch them on for the pipeline
+    with `helpers.add_arrow_dlt_columns` before its first load.
+
+    `batch_filter` is applied to the validated rows of every batch, e.g. to
+    drop rows that did not change since the last load.
+
+    `before_load` is called in the pipeline thread before `pipeline.run`, e.g.
+    to wait for a backup. Until it returns, scraped items pile up in the queue.
     """
 
     def __init__(
         self,
         pipeline: dlt.Pipeline,
         queue: ScrapingQueue[T],
+        item_model: t.Optional[t.Type[BaseModel]] = None,
+        quarantine: t.Optional[t.Any] = None,
+        arrow_schema: t.Optional["pa.Schema"] = None,
+        batch_filter: t.Optional[t.Callable[[t.List[AnyDict]], t.List[AnyDict]]] = None,
+        before_load: t.Optional[t.Callable[[], None]] = None,
     ) -> None:
         self.pipeline = pipeline
+        self.before_load = before_load
         self.queue = queue
+        self.quarantine = quarantine
+        self.arrow_schema = arrow_schema
+        self.batch_filter = batch_filter
+        # load info of the last run, None until it succeeded
+        self.load_info: t.Optional[t.Any] = None
+        self.batch_adapter = (
+            TypeAdapter(t.List[item_model]) if item_model is not None else None  # type: ignore[valid-type]
+        )
 
         if pipeline.dataset_name and not self.is_default_dataset_name(pipeline):
             resource_name = pipeline.dataset_name
@@ -128,10 +175,78 @@ class PipelineRunner(Runnable):
         self.scraping_resource = dlt.resource(
             # Queue get_batches is a generator so we can
             # pass it to pipeline.run and dlt will handle the rest.
-            self.queue.stream(),
+            self.batches(),
             name=resource_name,
         )
 
+    def batches(self) -> t.Iterator[t.Union[t.List[AnyDict], "pa.Table"]]:
+        """Batches from the queue, validated with `item_model` if given"""
+        stream = self.queue.stream()
+        try:
+            for batch in stream:
+                rows = self.validate_batch(batch)
+                if self.batch_filter is not None:
+                    rows = self.batch_filter(rows)
+
+                if not rows:
+                    continue
+
+                if self.arrow_schema is not None:
+                    yield self.to_arrow(rows)
+                else:
+                    yield rows
+        finally:
+            # closes the queue if dlt stops consuming early
+            stream.close()
+
+    def validate_batch(self, batch: t.List[AnyDict]) -> t.List[AnyDict]:
+        if self.batch_adapter is None:
+            return batch
+
+        try:
+            models = self.batch_adapter.validate_python(batch)
+        except ValidationError as e:
+            if self.quarantine is None:
+                raise
+
+            # errors are located by the index of the item in the batch
+            errors: t.Dict[int, t.List[str]] = {}
+            for error in e.errors():
+                errors.setdefault(error["loc"][0], []).append(  # type: ignore[arg-type]
+                    f"{'.'.join(map(str, error['loc'][1:]))}: {error['msg']}"
+                )
+
+            for index, messages in errors.items():
+                item = batch[index]
+                self.quarantine.add(item.get("url"), "; ".join(messages), item=item)
+
+            valid = [item for i, item in enumerate(batch) if i not in errors]
+            models = self.batch_adapter.validate_python(valid)
+
+        return [model.model_dump() for model in models]
+
+    def to_arrow(self, rows: t.List[AnyDict]) -> "pa.Table":
+        import pyarrow as pa
+
+        json_columns = [
+            field.name
+            for field in self.arrow_schema  # type: ignore[union-attr]
+            if pa.types.is_string(field.type)
+        ]
+        rows = [
+            {
+                **row,
+                **{
+                    name: json.dumps(row[name])
+                    for name in json_columns
+                    if isinstance(row.get(name), (list, dict))
+                },
+            }
+            for row in rows
+        ]
+
+        return pa.Table.from_pylist(rows, schema=self.arrow_schema)
+
     def is_default_dataset_name(self, pipeline: dlt.Pipeline) -> bool:
         default_name = pipeline.pipeline_name + pipeline.DEFAULT_DATASET_SUFFIX
         return pipeline.dataset_name == default_name
@@ -159,7 +274,9 @@ class PipelineRunner(Runnable):
 
         def run() -> None:
             try:
-                self.pipeline.run(self.scraping_resource, **kwargs)  # type: ignore[arg-type]
+                if self.before_load is not None:
+                    self.before_load()
+                self.load_info = self.pipeline.run(self.scraping_resource, **kwargs)  # type: ignore[arg-type]
             except Exception:
                 logger.error("Error during pipeline.run call, closing the queue")
                 raise
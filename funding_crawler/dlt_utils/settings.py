@@ -2,6 +2,10 @@ from .types import AnyDict
 
 SOURCE_BATCH_SIZE: int = 10
 SOURCE_SCRAPY_QUEUE_SIZE: int = 3000
+# Number of items the item pipeline hands over to the queue at once
+SOURCE_SCRAPY_QUEUE_CHUNK_SIZE: int = 10
+# Estimated size of the queued items in bytes, above which crawling is paused
+SOURCE_SCRAPY_QUEUE_MAX_BYTES: int = 256 * 1024 * 1024
 SOURCE_SCRAPY_QUEUE_RESULT_TIMEOUT: int = 5
 SOURCE_SCRAPY_SETTINGS: AnyDict = {
     "LOG_LEVEL": "INFO",
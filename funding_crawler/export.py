@@ -0,0 +1,73 @@
+"""Streaming export of the published dataset
+
+`export_to_ipc` streams the result of a query from Postgres as Arrow record
+batches (ADBC reads them with `COPY ... TO STDOUT (FORMAT binary)`) into an Arrow
+IPC file, one batch at a time. `scan_export` opens that file as a lazy Polars
+frame, so the parquet and CSV exports are sunk from it without ever holding the
+whole dataset in memory.
+"""
+
+import adbc_driver_postgresql.dbapi
+import polars as pl
+import pyarrow as pa
+import pyarrow.ipc
+
+# soft limit for the size of one record batch
+BATCH_SIZE_HINT_BYTES = 16 * 1024 * 1024
+
+
+def export_to_ipc(conn_str, query, path, batch_size_hint_bytes=BATCH_SIZE_HINT_BYTES):
+    """
+    Stream the result of `query` into the Arrow IPC file `path`.
+
+    The connection is closed before returning, also if the export fails.
+
+    Returns:
+        int: Number of exported rows.
+    """
+    rows = 0
+    with adbc_driver_postgresql.dbapi.connect(conn_str) as conn:
+        with conn.cursor() as cursor:
+            cursor.adbc_statement.set_options(
+                **{"adbc.postgresql.batch_size_hint_bytes": str(batch_size_hint_bytes)}
+            )
+            cursor.execute(query)
+            reader = cursor.fetch_record_batch()
+            with pa.OSFile(path, "wb") as sink:
+                with pa.ipc.new_file(sink, reader.schema) as writer:
+                    for batch in reader:
+                        writer.write_batch(batch)
+                        rows += batch.num_rows
+
+    return rows
+
+
+def apply_schema(lf, schema):
+    """Cast the columns of `lf` to `schema`, json columns are decoded into lists."""
+    source = lf.collect_schema()
+    exprs = []
+    for name, dtype in schema.items():
+        if name not in source:
+            continue
+        if isinstance(dtype, pl.List) and source[name] == pl.Utf8:
+            # dlt stores lists as jsonb, which ADBC reads as text
+            exprs.append(pl.col(name).str.json_decode(dtype))
+        else:
+            exprs.append(pl.col(name).cast(dtype))
+
+    return lf.with_columns(exprs)
+
+
+def scan_export(path, schema=None):
+    """Lazy frame over an IPC file written by `export_to_ipc`, optionally cast to `schema`."""
+    lf = pl.scan_ipc(path, memory_map=True)
+    return apply_schema(lf, schema) if schema else lf
+
+
+def join_lists(lf, separator=", "):
+    """Join all list columns into strings, e.g. for CSV."""
+    return lf.with_columns(
+        pl.col(name).list.join(separator)
+        for name, dtype in lf.collect_schema().items()
+        if isinstance(dtype, pl.List)
+    )
@@ -0,0 +1,475 @@
+import hashlib
+import logging
+import re
+from datetime import datetime
+from lxml import etree
+from parsel import Selector
+from w3lib.html import replace_entities
+from funding_crawler.helpers import compute_checksum, gen_license
+
+logger = logging.getLogger(__name__)
+
+# Mapping of internal codes to display names, extracted from the overview page sidebar filters.
+# Some detail pages serve these codes instead of the human-readable labels due to a website bug.
+code_to_label = {
+    # funding_area (Förderbereich)
+    "arbeit": "Arbeit",
+    "aus_weiterbildung": "Aus- & Weiterbildung",
+    "aussenwirtschaft": "Außenwirtschaft",
+    "beratung": "Beratung",
+    "corona": "Corona-Hilfe",
+    "digitalisierung": "Digitalisierung",
+    "energieeffizienz_erneuerbare_energien": "Energieeffizienz & Erneuerbare Energien",
+    "existenzgruendung_festigung": "Existenzgründung & -festigung",
+    "forschung_innovation_themenoffen": "Forschung & Innovation (themenoffen)",
+    "forschung_innovation_themenspezifisch": "Forschung & Innovation (themenspezifisch)",
+    "frauenfoerderung": "Frauenförderung",
+    "gesundheit_soziales": "Gesundheit & Soziales",
+    "infrastruktur": "Infrastruktur",
+    "kultur_medien_sport": "Kultur, Medien & Sport",
+    "landwirtschaft_laendliche_entwicklung": "Landwirtschaft & Ländliche Entwicklung",
+    "messen_ausstellungen": "Messen & Ausstellungen",
+    "mobilitaet": "Mobilität",
+    "regionalfoerderung": "Regionalförderung",
+    "smart_cities_regionen": "Smart Cities & Regionen",
+    "staedtebau_stadterneuerung": "Städtebau & Stadterneuerung",
+    "umwelt_naturschutz": "Umwelt- & Naturschutz",
+    "unternehmensfinanzierung": "Unternehmensfinanzierung",
+    "wohnungsbau_modernisierung": "Wohnungsbau & Modernisierung",
+    # funding_type (Förderart)
+    "beteiligung": "Beteiligung",
+    "buergschaft": "Bürgschaft",
+    "darlehen": "Darlehen",
+    "garantie": "Garantie",
+    "sonstige": "Sonstige",
+    "zuschuss": "Zuschuss",
+    # funding_location (Fördergebiet)
+    "_bundesweit": "bundesweit",
+    "baden_wuerttemberg": "Baden-Württemberg",
+    "bayern": "Bayern",
+    "berlin": "Berlin",
+    "brandenburg": "Brandenburg",
+    "bremen": "Bremen",
+    "de_ni": "Niedersachsen",
+    "de_st": "Sachsen-Anhalt",
+    "hamburg": "Hamburg",
+    "hessen": "Hessen",
+    "mecklenburg_vorpommern": "Mecklenburg-Vorpommern",
+    "nordrhein_westfalen": "Nordrhein-Westfalen",
+    "rheinland_pfalz": "Rheinland-Pfalz",
+    "saarland": "Saarland",
+    "sachsen": "Sachsen",
+    "schleswig_holstein": "Schleswig-Holstein",
+    "thueringen": "Thüringen",
+    # eligible_applicants (Förderberechtigte)
+    "bildungseinrichtung": "Bildungseinrichtung",
+    "existenzgruenderin": "Existenzgründer/in",
+    "forschungseinrichtung": "Forschungseinrichtung",
+    "hochschule": "Hochschule",
+    "kommune": "Kommune",
+    "oeffentliche_einrichtung": "Öffentliche Einrichtung",
+    "privatperson": "Privatperson",
+    "unternehmen": "Unternehmen",
+    "verband_vereinigung": "Verband/Vereinigung",
+}
+
+# Known display labels, used to reconstruct labels that contain the list separator ", "
+# (e.g. "Kultur, Medien & Sport" gets split incorrectly by a naive split on ", ").
+known_labels = set(code_to_label.values())
+
+translate_map = {
+    "Kurzzusammenfassung": "description",
+    "Zusatzinfos": "more_info",
+    "Rechtsgrundlage": "legal_basis",
+    "Ansprechpunkt": "contact_info",
+    "Weiterführende Links": "further_links",
+    "WeiterfuehrendeLinks": "further_links",  # ASCII variant
+    "Förderart": "funding_type",
+    "Foerderart": "funding_type",  # ASCII variant
+    "Förderbereich": "funding_area",
+    "Foerderbereich": "funding_area",  # ASCII variant
+    "Fördergebiet": "funding_location",
+    "Foerdergebiet": "funding_location",  # ASCII variant
+    "Förderberechtigte": "eligible_applicants",
+    "Foerderberechtigte": "eligible_applicants",  # ASCII variant
+    "Fördergeber": "funding_body",
+    "Foerdergeber": "funding_body",  # ASCII variant
+}
+
+
+class DetailPageError(Exception):
+    """Raised if a detail page cannot be turned into a valid funding program item."""
+
+
+def split_labels(lst_str):
+    """Split a comma separated list of labels, normalizing internal codes to labels."""
+    parts = lst_str.strip().split(", ") if lst_str else []
+    # Merge consecutive parts that form a known label containing ", "
+    # (e.g. "Kultur, Medien & Sport" would otherwise be split in two).
+    merged = []
+    i = 0
+    while i < len(parts):
+        if i + 1 < len(parts):
+            combined = parts[i] + ", " + parts[i + 1]
+            if combined in known_labels:
+                merged.append(combined)
+                i += 2
+                continue
+        merged.append(parts[i])
+        i += 1
+    lst = [code_to_label.get(v, v) for v in merged]
+    return lst if lst else None
+
+
+def program_ids(url):
+    """URL slug based id and its hash (`id_url`, `id_hash`) of a program URL."""
+    url_parts = url.partition("Foerderprogramm/")
+
+    if url_parts[1] == "":
+        url_parts = url.partition(
+            "Archiv/"
+        )  # e.g. 'https://www.foerderdatenbank.de/FDB/Content/DE/Archiv/innovativer-schiffbau-sichert-arbeitsplaetze.html'
+
+    foerderprogramm_url_id = url_parts[2].replace("/", "-").replace(".html", "").lower()
+    foerderprogramm_hash_id = hashlib.md5(foerderprogramm_url_id.encode()).hexdigest()
+    return foerderprogramm_url_id, foerderprogramm_hash_id
+
+
+def add_identifiers(dct, url):
+    """Add URL based identifiers, the checksum and the license info to an item."""
+    foerderprogramm_url_id, foerderprogramm_hash_id = program_ids(url)
+
+    dct["url"] = url
+    dct["id_hash"] = foerderprogramm_hash_id
+    dct["id_url"] = foerderprogramm_url_id
+
+    ignore_fields = ["url", "id_hash", "id_url"]
+    watch_fields = [x for x in list(dct.keys()) if x not in ignore_fields]
+
+    dct["checksum"] = compute_checksum(dct, watch_fields)
+
+    date = datetime.today()
+    dct["license_info"] = gen_license(dct["title"], date, dct["url"])
+
+    return dct
+
+
+def extract_details(url, selector):
+    """
+    Extract a funding program from the selector of its detail page.
+
+    Extracts details such as title, description, funding information, contact details,
+    and additional links. Computes unique identifiers and a checksum for the data.
+    Does not depend on Scrapy, so it can also run in worker processes.
+
+    Args:
+        url (str): The URL of the detail page.
+        selector (Selector): Parsel selector of the detail page.
+
+    Returns:
+        dict: A dictionary containing the extracted program details.
+    """
+    dct = {}
+
+    dct["title"] = "".join(
+        selector.xpath("//h1[@class='title']//text()").getall()
+    ).strip()
+    dct["title"] = dct["title"] if dct["title"] else None
+
+    if not dct["title"]:
+        logger.warning(f"No title found on page: {url}")
+        raise ValueError(f"No title found on page: {url}")
+
+    tab_names = selector.xpath(
+        "/html/body/main/div[2]/div/div[1]/h2/span//text()"
+    ).getall()
+
+    if tab_names:
+        # try format with article tags first
+        article_nodes = selector.xpath("//div[@class='content']//article")
+
+        # if no articles found, try older format where content is in rich--text div
+        if not article_nodes:
+            article_nodes = selector.xpath("//div[@class='rich--text']")
+
+        for i, article in enumerate(article_nodes):
+            content = article.get()
+            try:
+                key = translate_map[tab_names[i].strip()]
+            except KeyError:
+                raise DetailPageError(
+                    f"Unknown tab name: '{tab_names[i].strip()}' on page: {url}"
+                ) from None
+
+            dct[key] = content
+
+        # Log warning if description is missing
+        if "description" not in dct:
+            logger.warning(
+                f"No 'Kurzzusammenfassung' (description) tab found on page: {url}. Found tabs: {tab_names}"
+            )
+            dct["description"] = None
+    else:
+        content_node = selector.xpath(
+            "//main/div[@class='jumbotron']/following-sibling::div/div[@class='content']"
+        ).get()
+
+        if not content_node:
+            logger.warning(f"No description found on page: {url}")
+            dct["description"] = None
+        else:
+            dct["description"] = content_node
+
+    dt_elements = selector.xpath("//dt")
+    dd_elements = selector.xpath("//dd")
+
+    for dt, dd in zip(dt_elements, dd_elements):
+        key = dt.xpath("text()").get()
+        if key:
+            key = translate_map.get(key.strip().replace(":", ""))
+            if not key:
+                logger.warning("Field not in translate map: %s", key)
+                continue
+        else:
+            logger.warning("Field couldnt be extracted: %s %s", dt, dd)
+            continue
+
+        if key in [
+            "funding_type",
+            "funding_area",
+            "funding_location",
+            "eligible_applicants",
+        ]:
+            dct[key] = split_labels(dd.xpath("text()").get())
+
+        elif key == "funding_body":
+            # Try both umlaut and ASCII versions of the title attribute
+            str = dd.xpath(
+                "p[@class='card--title']/a[@title='Öffnet die Einzelsicht' or @title='OeffnetEinzelsicht']/span[@class='link--label']/text()"
+            ).get()
+            dct[key] = str.strip() if str else None
+
+        elif key == "further_links":
+            links = []
+            for link in dd.xpath(".//a[@href]"):
+                link_url = link.xpath("@href").get()
+                if not link_url.startswith("http"):
+                    link_url = "https://www.foerderdatenbank.de/" + link_url
+                links.append(link_url)
+
+            dct[key] = links if links else None
+
+        elif key == "contact_info":
+            dct["contact_info_institution"] = (
+                " ".join(
+                    dd.xpath(
+                        ".//a[@title='Öffnet die Einzelsicht' or @title='OeffnetEinzelsicht']/span[@class='link--label']//text()"
+                    ).getall()
+                ).strip()
+                or None
+            )
+
+            dct["contact_info_street"] = (
+                dd.xpath(".//p[@class='adr']/text()").get() or ""
+            ).strip() or None
+
+            dct["contact_info_city"] = (
+                dd.xpath(".//p[@class='locality']/text()").get() or ""
+            ).strip() or None
+
+            dct["contact_info_fax"] = (
+                dd.xpath(".//p[@class='fax']/text()").re_first(r"Fax:\s*(.*)") or None
+            )
+
+            dct["contact_info_phone"] = (
+                dd.xpath(".//p[@class='tel']/text()").re_first(r"Tel:\s*(.*)") or None
+            )
+
+            dct["contact_info_email"] = (
+                dd.xpath(".//p[@class='email']/a[@href]")
+                .xpath("@href")
+                .re_first(r"mailto:(.*)")
+                or None
+            )
+
+            dct["contact_info_website"] = (
+                dd.xpath(".//p[@class='website']/a[@href]").xpath("@href").get() or None
+            )
+
+        else:
+            value = dd.xpath("text()").get()
+            dct[key] = value.strip() if value else None
+
+    return add_identifiers(dct, url)
+
+
+def _xpath(query):
+    return etree.XPath(query, smart_strings=False)
+
+
+# Precompiled queries of the "lxml" extractor, equivalent to the ones in extract_details
+XPATH_TITLE = _xpath("//h1[@class='title']//text()")
+XPATH_TAB_NAMES = _xpath("/html/body/main/div[2]/div/div[1]/h2/span//text()")
+XPATH_ARTICLES = _xpath("//div[@class='content']//article")
+XPATH_RICH_TEXT = _xpath("//div[@class='rich--text']")
+XPATH_CONTENT = _xpath(
+    "//main/div[@class='jumbotron']/following-sibling::div/div[@class='content']"
+)
+XPATH_DT = _xpath("//dt")
+XPATH_DD = _xpath("//dd")
+XPATH_TEXT = _xpath("text()")
+XPATH_FUNDING_BODY = _xpath(
+    "p[@class='card--title']/a[@title='Öffnet die Einzelsicht' or @title='OeffnetEinzelsicht']/span[@class='link--label']/text()"
+)
+XPATH_LINK_HREFS = _xpath(".//a[@href]/@href")
+XPATH_INSTITUTION = _xpath(
+    ".//a[@title='Öffnet die Einzelsicht' or @title='OeffnetEinzelsicht']/span[@class='link--label']//text()"
+)
+XPATH_STREET = _xpath(".//p[@class='adr']/text()")
+XPATH_CITY = _xpath(".//p[@class='locality']/text()")
+XPATH_FAX = _xpath(".//p[@class='fax']/text()")
+XPATH_PHONE = _xpath(".//p[@class='tel']/text()")
+XPATH_EMAIL = _xpath(".//p[@class='email']/a[@href]/@href")
+XPATH_WEBSITE = _xpath(".//p[@class='website']/a[@href]/@href")
+
+RE_FAX = re.compile(r"Fax:\s*(.*)")
+RE_PHONE = re.compile(r"Tel:\s*(.*)")
+RE_EMAIL = re.compile(r"mailto:(.*)")
+
+
+def _first(values):
+    return values[0] if values else None
+
+
+def _serialize(element):
+    # same serialization as parsel's Selector.get() for HTML documents
+    return etree.tostring(element, method="html", encoding="unicode", with_tail=False)
+
+
+def _re_first(regex, values):
+    # same semantics as parsel's SelectorList.re_first()
+    for value in values:
+        for match in regex.findall(value):
+            return replace_entities(match, keep=["lt", "amp"])
+    return None
+
+
+def extract_details_compiled(url, root):
+    """
+    Same as `extract_details`, but evaluates precompiled XPath expressions directly on
+    the lxml tree instead of going through parsel selectors.
+
+    Args:
+        url (str): The URL of the detail page.
+        root (lxml.html.HtmlElement): Root of the parsed detail page, e.g. `selector.root`.
+
+    Returns:
+        dict: A dictionary containing the extracted program details.
+    """
+    dct = {}
+
+    dct["title"] = "".join(XPATH_TITLE(root)).strip()
+    dct["title"] = dct["title"] if dct["title"] else None
+
+    if not dct["title"]:
+        logger.warning(f"No title found on page: {url}")
+        raise ValueError(f"No title found on page: {url}")
+
+    tab_names = XPATH_TAB_NAMES(root)
+
+    if tab_names:
+        article_nodes = XPATH_ARTICLES(root)
+        if not article_nodes:
+            article_nodes = XPATH_RICH_TEXT(root)
+
+        for i, article in enumerate(article_nodes):
+            content = _serialize(article)
+            try:
+                key = translate_map[tab_names[i].strip()]
+            except KeyError:
+                raise DetailPageError(
+                    f"Unknown tab name: '{tab_names[i].strip()}' on page: {url}"
+                ) from None
+
+            dct[key] = content
+
+        if "description" not in dct:
+            logger.warning(
+                f"No 'Kurzzusammenfassung' (description) tab found on page: {url}. Found tabs: {tab_names}"
+            )
+            dct["description"] = None
+    else:
+        content_nodes = XPATH_CONTENT(root)
+
+        if not content_nodes:
+            logger.warning(f"No description found on page: {url}")
+            dct["description"] = None
+        else:
+            dct["description"] = _serialize(content_nodes[0])
+
+    for dt, dd in zip(XPATH_DT(root), XPATH_DD(root)):
+        key = _first(XPATH_TEXT(dt))
+        if key:
+            key = translate_map.get(key.strip().replace(":", ""))
+            if not key:
+                logger.warning("Field not in translate map: %s", key)
+                continue
+        else:
+            logger.warning("Field couldnt be extracted: %s %s", dt, dd)
+            continue
+
+        if key in [
+            "funding_type",
+            "funding_area",
+            "funding_location",
+            "eligible_applicants",
+        ]:
+            dct[key] = split_labels(_first(XPATH_TEXT(dd)))
+
+        elif key == "funding_body":
+            value = _first(XPATH_FUNDING_BODY(dd))
+            dct[key] = value.strip() if value else None
+
+        elif key == "further_links":
+            links = []
+            for link_url in XPATH_LINK_HREFS(dd):
+                if not link_url.startswith("http"):
+                    link_url = "https://www.foerderdatenbank.de/" + link_url
+                links.append(link_url)
+
+            dct[key] = links if links else None
+
+        elif key == "contact_info":
+            dct["contact_info_institution"] = (
+                " ".join(XPATH_INSTITUTION(dd)).strip() or None
+            )
+            dct["contact_info_street"] = (
+                _first(XPATH_STREET(dd)) or ""
+            ).strip() or None
+            dct["contact_info_city"] = (_first(XPATH_CITY(dd)) or "").strip() or None
+            dct["contact_info_fax"] = _re_first(RE_FAX, XPATH_FAX(dd)) or None
+            dct["contact_info_phone"] = _re_first(RE_PHONE, XPATH_PHONE(dd)) or None
+            dct["contact_info_email"] = _re_first(RE_EMAIL, XPATH_EMAIL(dd)) or None
+            dct["contact_info_website"] = _first(XPATH_WEBSITE(dd)) or None
+
+        else:
+            value = _first(XPATH_TEXT(dd))
+            dct[key] = value.strip() if value else None
+
+    return add_identifiers(dct, url)
+
+
+def process_details(url, text, extractor="parsel"):
+    """
+    Extract a funding program from the HTML of its detail page.
+
+    Entry point for worker pools: takes and returns only picklable values.
+    `extractor` is either "parsel" (`extract_details`) or "lxml"
+    (`extract_details_compiled`).
+    """
+    selector = Selector(text=text)
+    if extractor == "lxml":
+        dct = extract_details_compiled(url, selector.root)
+    else:
+        dct = extract_details(url, selector)
+    return dct
@@ -0,0 +1,126 @@
+"""HTML to Markdown conversion of the export columns
+
+Every distinct HTML value is converted once with `markdownify` (default options,
+so the output is identical to `markdownify(html)`). Results are memoized in a
+SQLite cache keyed by the sha256 of the HTML and the markdownify version, so a
+run only converts new or changed texts, and those fan out over a process pool.
+`format_columns` converts the batches of a lazy frame while it is sunk, so the
+columns are never held in memory as a whole. The batches are converted in
+Polars' streaming threads, so one pool of `markdown_pool` serves the whole
+export.
+"""
+
+import hashlib
+import multiprocessing
+import os
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from importlib.metadata import version
+import polars as pl
+from markdownify import markdownify
+
+MARKDOWNIFY_VERSION = version("markdownify")
+
+# below this many conversions, handing them to the process pool is not worth it
+MIN_PARALLEL = 32
+
+
+def content_hash(html):
+    return hashlib.sha256(f"{MARKDOWNIFY_VERSION}\0{html}".encode()).hexdigest()
+
+
+class MarkdownCache:
+    """Persistent content hash -> Markdown store, shared by the streaming threads."""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS markdown (hash TEXT PRIMARY KEY, markdown TEXT NOT NULL)"
+            )
+
+    def get_many(self, hashes, chunk_size=500):
+        found = {}
+        for i in range(0, len(hashes), chunk_size):
+            chunk = hashes[i : i + chunk_size]
+            placeholders = ", ".join(["?"] * len(chunk))
+            with self.lock:
+                found.update(
+                    self.connection.execute(
+                        f"SELECT hash, markdown FROM markdown WHERE hash IN ({placeholders})",
+                        chunk,
+                    ).fetchall()
+                )
+        return found
+
+    def put_many(self, converted):
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO markdown VALUES (?, ?)", converted.items()
+            )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def markdown_pool(workers=None):
+    """
+    Process pool for `to_markdown` and `format_columns`, use it as context manager.
+
+    spawn: the export runs Polars' streaming threads, forking them is unsafe.
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def to_markdown(values, cache=None, pool=None):
+    """
+    Convert HTML strings to Markdown, like `[markdownify(v) for v in values]`.
+
+    Cached values are not converted again, the others are converted in `pool`
+    (see `markdown_pool`) if given and added to the cache.
+    """
+    hashes = [content_hash(html) for html in values]
+    converted = cache.get_many(hashes) if cache is not None else {}
+
+    missing = {h: html for h, html in zip(hashes, values) if h not in converted}
+    if pool is not None and len(missing) >= MIN_PARALLEL:
+        results = pool.map(markdownify, missing.values(), chunksize=16)
+        new = dict(zip(missing, results))
+    else:
+        new = {h: markdownify(html) for h, html in missing.items()}
+
+    if cache is not None and new:
+        cache.put_many(new)
+    converted.update(new)
+
+    return [converted[h] for h in hashes]
+
+
+def format_columns(lf, columns, cache=None, pool=None):
+    """
+    Replace the HTML of `columns` in the lazy frame `lf` with Markdown.
+
+    The frame stays lazy, the values are converted batch by batch once it is
+    collected or sunk, so `pool` must stay open until then.
+    """
+
+    def convert(batch):
+        html = batch.drop_nulls().unique()
+        if not len(html):
+            return batch.cast(pl.String)
+        markdown = to_markdown(html.to_list(), cache, pool)
+        return batch.replace_strict(
+            html, markdown, default=None, return_dtype=pl.String
+        )
+
+    return lf.with_columns(
+        pl.col(columns).map_batches(
+            convert, return_dtype=pl.String, is_elementwise=True
+        )
+    )
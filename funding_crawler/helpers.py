@@ -1,12 +1,8 @@
 import hashlib
 import json
 from pydantic import BaseModel
-import polars as pl
-import requests
-from typing import Union, Dict, Any
-from bs4 import BeautifulSoup
-import random
-import time
+from funding_crawler import schema
+from typing import Dict, Any
 
 
 def compute_checksum(data: dict, fields: list[str]) -> str:
@@ -22,7 +18,12 @@ def compute_checksum(data: dict, fields: list[str]) -> str:
     return checksum
 
 
-def gen_comp_b(dataset_name, columns):
+def gen_filter(where):
+    # Optional additional filter, e.g. to restrict the query to some id_hash values
+    return f" AND ({where})" if where else ""
+
+
+def gen_comp_b(dataset_name, columns, where=None):
     # Filter new or unchanged data where on_website_to is NULL (should be one per id)
     return f"""
         SELECT
@@ -32,10 +33,10 @@ def gen_comp_b(dataset_name, columns):
         FROM
             {dataset_name}
         WHERE
-            on_website_to IS NULL"""
+            on_website_to IS NULL{gen_filter(where)}"""
 
 
-def gen_comp_a(dataset_name):
+def gen_comp_a(dataset_name, where=None):
     # Aggregate retired data with previous update dates for each id_hash
     return f"""
 SELECT
@@ -45,16 +46,16 @@ SELECT
         FROM
             {dataset_name}
         WHERE
-            on_website_to IS NOT NULL
+            on_website_to IS NOT NULL{gen_filter(where)}
         GROUP BY
             id_hash
             """
 
 
-def gen_comp_c(dataset_name, columns):
+def gen_comp_c(dataset_name, columns, where=None):
     return f"""
      WITH aggregated_data_retired AS(
-        {gen_comp_a(dataset_name)}
+        {gen_comp_a(dataset_name, where)}
      )
      SELECT 
             aggregated_data_retired.agg_id,
@@ -67,7 +68,8 @@ def gen_comp_c(dataset_name, columns):
             AND aggregated_data_retired.last_updated = {dataset_name}.on_website_to"""
 
 
-def gen_query(dataset_name, columns):
+def gen_query(dataset_name, columns, where=None):
+    # `where` restricts all components, e.g. to the id_hash values touched by a load
     coalesce_columns = [
         f"COALESCE(data_new.{col}, most_recent_data_retired.{col}) AS {col}"
         for col in columns
@@ -76,10 +78,10 @@ def gen_query(dataset_name, columns):
 
     query = f"""
     WITH data_new AS (
-        {gen_comp_b(dataset_name, columns)}
+        {gen_comp_b(dataset_name, columns, where)}
     ),
     most_recent_data_retired AS (
-        {gen_comp_c(dataset_name, columns)}
+        {gen_comp_c(dataset_name, columns, where)}
     ),
     deleted_records AS (
         SELECT 
@@ -124,51 +126,4 @@ def gen_license(title, scrape_date, url):
 
 def pydantic_to_polars_schema(model: type[BaseModel]) -> Dict[str, Any]:
     """Convert Pydantic model fields to Polars schema overrides."""
-    schema_overrides = {}
-    for field_name, field in model.__annotations__.items():
-        base_type = field
-        if hasattr(field, "__origin__"):
-            if field.__origin__ is Union:
-                base_type = field.__args__[0]
-            elif field.__origin__ is list:
-                continue
-
-        if base_type is str:
-            schema_overrides[field_name] = pl.Utf8
-
-    return schema_overrides
-
-
-def get_hits_count(url, max_retries=3, backoff_factor=0.5):
-    """
-    Extract number of funding programs with retry logic.
-    """
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
-
-    retry_count = 0
-    while retry_count <= max_retries:
-        try:
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, "html.parser")
-            element = soup.find("span", {"id": "hits--count"})
-            if element:
-                return int(element.get_text().strip())
-            else:
-                raise RuntimeError("Hits count element not found")
-        except requests.RequestException as e:
-            print(f"Request to {url} failed (retry {retry_count+1}/{max_retries}): {e}")
-        except Exception as e:
-            print(
-                f"Error parsing content from {url} (retry {retry_count+1}/{max_retries}): {e}"
-            )
-
-        retry_count += 1
-        if retry_count <= max_retries:
-            backoff_delay = backoff_factor * (2**retry_count) + random.uniform(0, 1)
-            print(f"Retrying in {backoff_delay:.2f} seconds...")
-            time.sleep(backoff_delay)
-
-    raise RuntimeError(f"All retries failed for {url}")
+    return schema.pydantic_to_polars_schema(model)
@@ -0,0 +1,232 @@
+"""Incremental backups of the scd2 history
+
+Instead of dumping the whole database every run, every increment contains
+
+- the rows loaded since the previous increment (`_dlt_load_id` newer than its
+  watermark), as zstd parquet file,
+- the retirements of older rows since the previous increment (`_dlt_id` and the
+  new `on_website_to`), as second zstd parquet file.
+
+The manifest lists all increments in order, starting with the first one that
+holds the whole table, and the full `pg_dump` backups (see `backup.py`), which
+are only needed weekly. `restore` replays the increments into Postgres or
+DuckDB, either from scratch or on top of a restored full dump:
+
+    python -m funding_crawler.incremental_backup BACKUP_DIR DESTINATION [--skip INCREMENTS]
+
+Compaction (see `compaction.py`) rewrites the history, take a full dump and
+start a new increment chain afterwards.
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime, timedelta, timezone
+import dlt
+import polars as pl
+import pyarrow.parquet as pq
+from funding_crawler.models import FundingProgramSchema
+from funding_crawler.schema import SCD2_COLUMNS, dlt_columns
+
+MANIFEST_NAME = "manifest.json"
+
+FULL_DUMP_INTERVAL = timedelta(days=7)
+
+# watermark of the retirements before the first increment
+RETIRED_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# e.g. `on_website_to` is NULL for all rows of a first increment
+VALIDITY_TYPES = {name: pl.Datetime("us", "UTC") for name in SCD2_COLUMNS}
+
+
+def empty_manifest(table_name):
+    return {"table": table_name, "increments": [], "full_dumps": []}
+
+
+def fetch_frame(client, query, *args):
+    with client.execute_query(query, *args) as cursor:
+        names = [c[0] for c in cursor.description]
+        rows = cursor.fetchall()
+    return pl.DataFrame(
+        rows,
+        schema=names,
+        schema_overrides={k: v for k, v in VALIDITY_TYPES.items() if k in names},
+        orient="row",
+        infer_schema_length=None,
+    )
+
+
+def backup_increment(pipeline, table_name, directory, manifest=None):
+    """
+    Write the rows and retirements since the last increment of `manifest` to `directory`.
+
+    Returns:
+        tuple: The new manifest entry (None if nothing changed) and the updated manifest.
+    """
+    manifest = manifest or empty_manifest(table_name)
+    last = manifest["increments"][-1] if manifest["increments"] else None
+    load_id_after = last["load_id_to"] if last else ""
+    retired_after = (
+        datetime.fromisoformat(last["retired_to"]) if last else RETIRED_EPOCH
+    )
+
+    with pipeline.sql_client() as client:
+        table = client.make_qualified_table_name(table_name)
+        ((load_id_to, retired_to),) = client.execute_sql(
+            f"SELECT MAX(_dlt_load_id), MAX(on_website_to) FROM {table}"
+        )
+        load_id_to = load_id_to or load_id_after
+        retired_to = retired_to or retired_after
+        if (load_id_to, retired_to) == (load_id_after, retired_after):
+            return None, manifest
+
+        rows = fetch_frame(
+            client,
+            f"SELECT * FROM {table} WHERE _dlt_load_id > %s AND _dlt_load_id <= %s",
+            load_id_after,
+            load_id_to,
+        )
+        # rows of the increment carry their retirement already
+        retirements = fetch_frame(
+            client,
+            f"""SELECT _dlt_id, on_website_to FROM {table}
+            WHERE _dlt_load_id <= %s AND on_website_to > %s AND on_website_to <= %s""",
+            load_id_after,
+            retired_after,
+            retired_to,
+        )
+
+    os.makedirs(directory, exist_ok=True)
+    index = len(manifest["increments"])
+    entry = {
+        "load_id_from": load_id_after,
+        "load_id_to": load_id_to,
+        "retired_from": retired_after.isoformat(),
+        "retired_to": retired_to.isoformat(),
+        "rows_file": f"rows_{index:06d}.parquet",
+        "retirements_file": f"retirements_{index:06d}.parquet",
+        "rows": len(rows),
+        "retirements": len(retirements),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    rows.write_parquet(os.path.join(directory, entry["rows_file"]), compression="zstd")
+    retirements.write_parquet(
+        os.path.join(directory, entry["retirements_file"]), compression="zstd"
+    )
+
+    return entry, {**manifest, "increments": manifest["increments"] + [entry]}
+
+
+def add_full_dump(manifest, name, created_at=None):
+    """
+    Record a full dump in the manifest.
+
+    The dump has to be taken after the last increment and before the next load,
+    it contains the first `increments` increments (pass them to `restore` as `skip`).
+    """
+    dump = {
+        "name": name,
+        "increments": len(manifest["increments"]),
+        "created_at": (created_at or datetime.now(timezone.utc)).isoformat(),
+    }
+    return {**manifest, "full_dumps": manifest["full_dumps"] + [dump]}
+
+
+def full_dump_due(manifest, now=None, interval=FULL_DUMP_INTERVAL):
+    """Whether the last full dump is older than `interval`."""
+    if not manifest or not manifest["full_dumps"]:
+        return True
+    last = datetime.fromisoformat(manifest["full_dumps"][-1]["created_at"])
+    return (now or datetime.now(timezone.utc)) - last >= interval
+
+
+def restore(pipeline, table_name, directory, manifest, skip=0, columns=None):
+    """
+    Replay the increments in `directory` into the destination of `pipeline`.
+
+    The first `skip` increments are left out, e.g. on top of a restored full dump
+    that contains them. `columns` are dlt column hints for the table, so columns
+    that are NULL in all rows of an increment are still created.
+
+    Returns:
+        int: Number of replayed increments.
+    """
+    increments = manifest["increments"][skip:]
+
+    for entry in increments:
+        rows = pq.read_table(os.path.join(directory, entry["rows_file"]))
+        if rows.num_rows:
+            # _dlt_id and _dlt_load_id come from the increment, dlt does not add
+            # them to Arrow tables unless `add_dlt_id`/`add_dlt_load_id` are set
+            pipeline.run(
+                rows,
+                table_name=table_name,
+                write_disposition="append",
+                columns=columns,
+            )
+
+        retirements = pl.read_parquet(
+            os.path.join(directory, entry["retirements_file"])
+        )
+        if not len(retirements):
+            continue
+
+        with pipeline.sql_client() as client:
+            table = client.make_qualified_table_name(table_name)
+            for (on_website_to,), group in retirements.group_by(
+                "on_website_to", maintain_order=True
+            ):
+                ids = group["_dlt_id"].to_list()
+                placeholders = ", ".join(["%s"] * len(ids))
+                client.execute_sql(
+                    f"UPDATE {table} SET on_website_to = %s WHERE _dlt_id IN ({placeholders})",
+                    on_website_to,
+                    *ids,
+                )
+
+    return len(increments)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "directory", help="directory with the manifest and the increments"
+    )
+    parser.add_argument(
+        "destination", help="Postgres connection string or path of a DuckDB file"
+    )
+    parser.add_argument("--dataset", default="foerderdatenbankdumpbackend")
+    parser.add_argument(
+        "--skip",
+        type=int,
+        default=0,
+        help="increments contained in a restored full dump, see `full_dumps` in the manifest",
+    )
+    args = parser.parse_args(argv)
+
+    with open(os.path.join(args.directory, MANIFEST_NAME), encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    destination = (
+        dlt.destinations.postgres(args.destination)
+        if args.destination.startswith("postgres")
+        else dlt.destinations.duckdb(args.destination)
+    )
+    pipeline = dlt.pipeline(
+        pipeline_name="fundingcrawlerrestore",
+        destination=destination,
+        dataset_name=args.dataset,
+    )
+    replayed = restore(
+        pipeline,
+        manifest["table"],
+        args.directory,
+        manifest,
+        args.skip,
+        columns={**dlt_columns(FundingProgramSchema), **SCD2_COLUMNS},
+    )
+    print(f"Replayed {replayed} increments")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import threading
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from w3lib.url import canonicalize_url
+from funding_crawler import extract, helpers, models
+from funding_crawler.archive import HtmlArchive
+
+# modules that determine the item extracted from a page, besides the spider
+PARSER_MODULES = [extract, helpers, models]
+
+
+def parser_version(spider_cls):
+    """Hash of the source code of the spider and of `PARSER_MODULES`."""
+    digest = hashlib.sha256()
+    for obj in [spider_cls, *PARSER_MODULES]:
+        with open(inspect.getsourcefile(obj), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class ValidatorStore:
+    """
+    Persistent store for HTTP validators of detail pages, keyed by canonical URL.
+
+    Besides ETag and Last-Modified it keeps a hash of the response body and the last
+    item that was extracted from the page, so that unchanged pages can be re-emitted
+    without parsing them again. Entries stored for another `version` of the parser
+    are ignored, so a parser fix invalidates all cached items.
+    """
+
+    def __init__(self, path, version):
+        self.version = version
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS validators (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    body_hash TEXT NOT NULL,
+                    item TEXT NOT NULL,
+                    version TEXT NOT NULL
+                )"""
+            )
+
+    def get(self, url):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT etag, last_modified, body_hash, item FROM validators WHERE url = ? AND version = ?",
+                (url, self.version),
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        etag, last_modified, body_hash, item = row
+        return {
+            "etag": etag,
+            "last_modified": last_modified,
+            "body_hash": body_hash,
+            "item": json.loads(item),
+        }
+
+    def put(self, url, etag, last_modified, body_hash, item):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO validators VALUES (?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, body_hash, json.dumps(item), self.version),
+            )
+
+    def remove(self, urls):
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "DELETE FROM validators WHERE url = ?", [(url,) for url in urls]
+            )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def forget_validators(path, spider_cls, urls):
+    """
+    Drop the stored validators and items of `urls`, so the next crawl parses
+    their pages again.
+
+    Items are stored when they are scraped, before the pipeline validates them,
+    so the pages of items that failed the batch validation (see
+    `funding_crawler.quarantine`) have to be forgotten before the next crawl.
+    """
+    store = ValidatorStore(path, parser_version(spider_cls))
+    try:
+        store.remove(canonicalize_url(url) for url in urls)
+    finally:
+        store.close()
+
+
+class ConditionalRecrawlMiddleware:
+    """
+    Downloader middleware for conditional re-crawls of detail pages.
+
+    Requests flagged with `meta["conditional_recrawl"]` are sent with `If-None-Match` /
+    `If-Modified-Since` headers if the page was crawled before. If the server answers
+    with 304 or the body hash did not change, the last known item is attached to the
+    request as `meta["cached_item"]` and re-emitted by the spider instead of parsing
+    the page. Validators of a changed page travel with its request as
+    `meta["validators"]` and are only stored once an item was scraped from the
+    response, so pages that fail to parse leave nothing behind. Items that fail the
+    validation of the pipeline are stored nonetheless, `forget_validators` drops
+    them before the next crawl.
+
+    Enabled by setting CONDITIONAL_RECRAWL_STORE to the path of the validator store.
+    The store is versioned by the source code of the spider and the parser modules
+    (see `parser_version`).
+    """
+
+    def __init__(self, path, stats):
+        self.path = path
+        self.stats = stats
+        self.store = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        path = crawler.settings.get("CONDITIONAL_RECRAWL_STORE")
+        if not path:
+            raise NotConfigured("CONDITIONAL_RECRAWL_STORE is not set")
+
+        middleware = cls(path, crawler.stats)
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def spider_opened(self, spider):
+        self.store = ValidatorStore(self.path, parser_version(type(spider)))
+
+    def process_request(self, request, spider):
+        if not request.meta.get("conditional_recrawl"):
+            return None
+
+        entry = self.store.get(canonicalize_url(request.url))
+        if entry is None:
+            return None
+
+        if entry["etag"]:
+            request.headers.setdefault("If-None-Match", entry["etag"])
+        if entry["last_modified"]:
+            request.headers.setdefault("If-Modified-Since", entry["last_modified"])
+
+        # let 304 responses pass HttpErrorMiddleware
+        handle_httpstatus_list = request.meta.get("handle_httpstatus_list", [])
+        if 304 not in handle_httpstatus_list:
+            request.meta["handle_httpstatus_list"] = [*handle_httpstatus_list, 304]
+
+        return None
+
+    def process_response(self, request, response, spider):
+        if not request.meta.get("conditional_recrawl"):
+            return response
+
+        if response.status not in (200, 304):
+            return response
+
+        url = canonicalize_url(request.url)
+        entry = self.store.get(url)
+
+        if response.status == 304:
+            if entry is None:
+                # validators were sent by someone else, fetch the full page
+                spider.logger.warning(f"Unexpected 304 without stored item for {url}")
+                request.meta["conditional_recrawl"] = False
+                return request.replace(
+                    headers={
+                        k: v
+                        for k, v in request.headers.items()
+                        if k not in (b"If-None-Match", b"If-Modified-Since")
+                    },
+                    dont_filter=True,
+                )
+
+            self.stats.inc_value("conditional_recrawl/not_modified", spider=spider)
+            request.meta["cached_item"] = entry["item"]
+            return response
+
+        body_hash = hashlib.sha256(response.body).hexdigest()
+
+        if entry is not None and entry["body_hash"] == body_hash:
+            self.stats.inc_value("conditional_recrawl/unchanged_body", spider=spider)
+            request.meta["cached_item"] = entry["item"]
+            return response
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        request.meta["validators"] = (
+            etag.decode("latin-1") if etag else None,
+            last_modified.decode("latin-1") if last_modified else None,
+            body_hash,
+        )
+        self.stats.inc_value("conditional_recrawl/changed", spider=spider)
+        return response
+
+    def item_scraped(self, item, response, spider):
+        validators = response.meta.get("validators")
+
+        if validators is not None:
+            self.store.put(
+                canonicalize_url(response.request.url), *validators, dict(item)
+            )
+
+    def spider_closed(self, spider):
+        if self.store is not None:
+            self.store.close()
+
+
+class ArchiveMiddleware:
+    """
+    Downloader middleware writing every fetched overview and detail page into an
+    `HtmlArchive`, indexed by URL and the crawl run id of the spider.
+
+    A 304 response indexes the last archived body of the URL for the current run,
+    so every run can be replayed completely. Enabled by setting ARCHIVE_DIR.
+    """
+
+    def __init__(self, archive, stats):
+        self.archive = archive
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        root = crawler.settings.get("ARCHIVE_DIR")
+        if not root:
+            raise NotConfigured("ARCHIVE_DIR is not set")
+
+        middleware = cls(HtmlArchive(root), crawler.stats)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def process_response(self, request, response, spider):
+        callback = request.callback.__name__ if request.callback else "parse"
+
+        if response.status == 200:
+            content_type = response.headers.get("Content-Type")
+            self.archive.put(
+                spider.run_id,
+                response.url,
+                callback,
+                response.body,
+                content_type.decode("latin-1") if content_type else None,
+            )
+            self.stats.inc_value("archive/stored", spider=spider)
+        elif response.status == 304:
+            if self.archive.link_latest(spider.run_id, response.url, callback):
+                self.stats.inc_value("archive/linked", spider=spider)
+
+        return response
+
+    def spider_closed(self, spider):
+        self.archive.close()
@@ -0,0 +1,73 @@
+"""Managed migrations for the scd2 history table
+
+dlt creates the history table without any index besides the unique `_dlt_id`.
+`migrate` creates the indexes the queries on the table need (`gen_query` and its
+components, `snapshot.refresh_snapshot`, the duplicate cleanup) and records every
+applied migration in `schema_migrations`, so it is cheap to run after every load.
+
+Indexes are Postgres only. Partitioning the table into current and retired rows
+is left out on purpose: dlt owns the table and its merge statements, and a
+partitioned table would have to be created before dlt ever sees it.
+"""
+
+from datetime import datetime, timezone
+
+MIGRATIONS_TABLE = "schema_migrations"
+
+# version -> statement, `{table}` is the qualified history table and `{name}` its name
+MIGRATIONS = {
+    # retired versions per program: gen_comp_a, gen_comp_c and refresh_snapshot
+    "0001_id_hash_on_website_to": "CREATE INDEX IF NOT EXISTS {name}_id_hash_on_website_to_idx ON {table} (id_hash, on_website_to)",
+    # versions of a program by checksum and load: duplicate cleanup
+    "0002_id_hash_checksum_load_id": "CREATE INDEX IF NOT EXISTS {name}_id_hash_checksum_load_id_idx ON {table} (id_hash, checksum, _dlt_load_id)",
+    # current versions only: gen_comp_b, ChangeDetector and the scd2 merge
+    "0003_current_id_hash": "CREATE INDEX IF NOT EXISTS {name}_current_id_hash_idx ON {table} (id_hash) INCLUDE (checksum) WHERE on_website_to IS NULL",
+    # touched programs since the snapshot watermark
+    "0004_load_id": "CREATE INDEX IF NOT EXISTS {name}_load_id_idx ON {table} (_dlt_load_id)",
+}
+
+
+def migrate(pipeline, table_name):
+    """
+    Apply all pending migrations to the history table `table_name`.
+
+    Returns:
+        list: Versions of the migrations applied in this call.
+    """
+    if not pipeline.destination.destination_type.endswith(".postgres"):
+        return []
+
+    applied = []
+    with pipeline.sql_client() as client:
+        table = client.make_qualified_table_name(table_name)
+        migrations_table = client.make_qualified_table_name(MIGRATIONS_TABLE)
+
+        client.execute_sql(
+            f"CREATE TABLE IF NOT EXISTS {migrations_table} (table_name varchar NOT NULL, version varchar NOT NULL, applied_at timestamp with time zone NOT NULL, PRIMARY KEY (table_name, version))"
+        )
+        done = {
+            row[0]
+            for row in client.execute_sql(
+                f"SELECT version FROM {migrations_table} WHERE table_name = %s",
+                table_name,
+            )
+        }
+
+        for version, statement in MIGRATIONS.items():
+            if version in done:
+                continue
+
+            with client.begin_transaction():
+                client.execute_sql(statement.format(table=table, name=table_name))
+                client.execute_sql(
+                    f"INSERT INTO {migrations_table} VALUES (%s, %s, %s)",
+                    table_name,
+                    version,
+                    datetime.now(timezone.utc),
+                )
+            applied.append(version)
+
+        if applied:
+            client.execute_sql(f"ANALYZE {table}")
+
+    return applied
@@ -0,0 +1,216 @@
+"""Dead-letter quarantine for program pages that could not be parsed or validated
+
+Instead of aborting the crawl, failing pages are stored together with the error
+and the crawl run. Only if a run quarantines more than `max_failures` pages, the
+crawl is aborted. After a parser fix, the next crawl parses the pages again and
+loads them, `release` then removes their entries of earlier runs. Pages that failed
+to parse never had their validators stored, items that failed the validation of the
+pipeline are dropped from the validator store before the next crawl (see
+`funding_crawler.middlewares.forget_validators` and `invalid_urls`). A parser fix
+can be checked before with a dry run, which re-parses the quarantined pages and
+writes the recovered items as JSON lines, without loading or releasing anything:
+
+    python -m funding_crawler.quarantine QUARANTINE_DB [--run-id RUN_ID] [--output items.jsonl]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+from pydantic import ValidationError
+from funding_crawler.extract import DetailPageError, process_details, program_ids
+from funding_crawler.models import FundingProgramSchema
+
+logger = logging.getLogger(__name__)
+
+
+class QuarantineLimitExceeded(Exception):
+    pass
+
+
+class Quarantine:
+    """
+    SQLite sink for failed program pages of a crawl run.
+
+    Failures of the spider (e.g. unknown tab names) are stored with the raw HTML,
+    failures of the batch validation in the pipeline with the extracted item.
+    """
+
+    def __init__(self, path, run_id, max_failures=None):
+        self.run_id = run_id
+        self.max_failures = max_failures
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS quarantine (
+                    run_id TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    html TEXT,
+                    item TEXT,
+                    error TEXT NOT NULL,
+                    quarantined_at TEXT NOT NULL,
+                    PRIMARY KEY (run_id, url)
+                )"""
+            )
+
+    def add(self, url, error, html=None, item=None):
+        """
+        Quarantine a page of the current run.
+
+        Raises:
+            QuarantineLimitExceeded: If the run has more than `max_failures` failures.
+        """
+        logger.error(f"Quarantining {url}: {error}")
+
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO quarantine VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    self.run_id,
+                    url,
+                    html,
+                    json.dumps(item, ensure_ascii=False) if item is not None else None,
+                    str(error),
+                    datetime.now().isoformat(),
+                ),
+            )
+
+        failures = self.count()
+        if self.max_failures is not None and failures > self.max_failures:
+            raise QuarantineLimitExceeded(
+                f"{failures} pages quarantined in run {self.run_id}, more than the allowed {self.max_failures}"
+            )
+
+    def count(self, run_id=None):
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM quarantine WHERE run_id = ?",
+                (run_id or self.run_id,),
+            ).fetchone()[0]
+
+    def entries(self, run_id=None):
+        """Quarantined pages, of all runs if `run_id` is None."""
+        query = "SELECT run_id, url, html, item, error FROM quarantine"
+        params = ()
+        if run_id is not None:
+            query += " WHERE run_id = ?"
+            params = (run_id,)
+
+        with self.lock:
+            rows = self.connection.execute(query + " ORDER BY run_id, url", params)
+            rows = rows.fetchall()
+
+        return [
+            {
+                "run_id": run_id,
+                "url": url,
+                "html": html,
+                "item": json.loads(item) if item is not None else None,
+                "error": error,
+            }
+            for run_id, url, html, item, error in rows
+        ]
+
+    def invalid_urls(self):
+        """URLs of the items of all runs that failed the batch validation."""
+        return [entry["url"] for entry in self.entries() if entry["item"] is not None]
+
+    def remove(self, run_id, url):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM quarantine WHERE run_id = ? AND url = ?", (run_id, url)
+            )
+
+    def release(self, id_hashes):
+        """
+        Remove the pages of earlier runs whose programs are in `id_hashes`, e.g.
+        the programs loaded by the current run.
+
+        Returns:
+            list: The removed entries.
+        """
+        released = [
+            entry
+            for entry in self.entries()
+            if entry["run_id"] != self.run_id
+            and program_ids(entry["url"])[1] in id_hashes
+        ]
+        for entry in released:
+            self.remove(entry["run_id"], entry["url"])
+        return released
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def reprocess(quarantine, run_id=None, extractor="parsel"):
+    """
+    Re-process quarantined pages with the current parser and schema.
+
+    Pages with HTML are extracted again, pages quarantined by the batch validation
+    only have their item validated again.
+
+    Yields:
+        tuple: (entry, item) for every page that passes now, (entry, None) otherwise.
+    """
+    for entry in quarantine.entries(run_id):
+        if entry["html"] is None and entry["item"] is None:
+            yield entry, None
+            continue
+
+        try:
+            if entry["html"] is not None:
+                dct = process_details(entry["url"], entry["html"], extractor)
+            else:
+                dct = entry["item"]
+            item = FundingProgramSchema(**dct).model_dump()
+        except (DetailPageError, ValidationError, ValueError) as e:
+            logger.warning(f"Still failing: {entry['url']}: {e}")
+            yield entry, None
+            continue
+
+        yield entry, item
+
+
+def main(argv=None):
+    """Dry run of `reprocess`, the quarantine and the destination are left as they are."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("quarantine_db")
+    parser.add_argument("--run-id", default=None)
+    parser.add_argument("--extractor", default="parsel", choices=["parsel", "lxml"])
+    parser.add_argument(
+        "--output", default=None, help="JSON lines file, default stdout"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    quarantine = Quarantine(args.quarantine_db, run_id=args.run_id)
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        recovered, failing = 0, 0
+        for _, item in reprocess(quarantine, args.run_id, args.extractor):
+            if item is None:
+                failing += 1
+                continue
+
+            out.write(json.dumps(item, ensure_ascii=False) + "\n")
+            recovered += 1
+
+        logger.info(f"Re-processed {recovered} pages, {failing} still failing")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        quarantine.close()
+
+
+if __name__ == "__main__":
+    main()
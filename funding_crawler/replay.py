@@ -0,0 +1,186 @@
+"""Offline re-parsing of archived crawl runs
+
+Feeds the responses of a crawl run stored in an `HtmlArchive` through
+`FundingSpider.parse` / `FundingSpider.parse_details` without any network access,
+spread across a process pool. A sharded run is stored in several archives (one
+per shard, see `funding_crawler.shards`), they are replayed together. Usage:
+
+    python -m funding_crawler.replay ARCHIVE_DIR [ARCHIVE_DIR ...] [--run-id RUN_ID] [--output items.jsonl]
+"""
+
+import argparse
+import json
+import logging
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pydantic import ValidationError
+from scrapy.http import HtmlResponse
+from w3lib.url import canonicalize_url
+from funding_crawler.archive import HtmlArchive
+from funding_crawler.models import FundingProgramSchema
+from funding_crawler.spider import FundingSpider
+
+logger = logging.getLogger(__name__)
+
+
+def replay_entries(root, entries):
+    """
+    Re-parse archived responses in a worker process.
+
+    Returns:
+        tuple: extracted items, detail URLs found on overview pages, and
+        (url, error) pairs for pages that could not be parsed.
+    """
+    archive = HtmlArchive(root)
+    spider = FundingSpider()
+    items, detail_urls, errors = [], [], []
+
+    try:
+        for entry in entries:
+            headers = {}
+            if entry["content_type"]:
+                headers["Content-Type"] = entry["content_type"]
+
+            response = HtmlResponse(
+                url=entry["url"], body=archive.get(entry["digest"]), headers=headers
+            )
+
+            try:
+                if entry["callback"].startswith("parse_details"):
+                    items.extend(spider.parse_details(response))
+                else:
+                    detail_urls.extend(
+                        request.url
+                        for request in spider.parse(response)
+                        if request.callback == spider.details_callback
+                    )
+            except Exception as e:
+                errors.append((entry["url"], repr(e)))
+    finally:
+        archive.close()
+
+    return items, detail_urls, errors
+
+
+def validate_items(items):
+    """
+    Validate replayed items one by one with `FundingProgramSchema`.
+
+    Invalid items are logged and left out, like the quarantine of a crawl, so
+    one bad archived page does not abort the replay.
+
+    Returns:
+        list: The dumped models of the valid items.
+    """
+    programs = []
+    for item in items:
+        try:
+            programs.append(FundingProgramSchema.model_validate(item).model_dump())
+        except ValidationError as e:
+            logger.error(f"Replayed item of {item.get('url')} is invalid: {e}")
+    return programs
+
+
+def replay(root, run_id=None, workers=None, chunk_size=50):
+    """
+    Re-parse an archived crawl run across a process pool.
+
+    Args:
+        root (str or list): Directory of the `HtmlArchive`, or several directories
+            holding parts of the run, e.g. one per shard.
+        run_id (str): Crawl run to replay, defaults to the latest run.
+        workers (int): Number of worker processes, defaults to the number of CPUs.
+        chunk_size (int): Number of responses handed to a worker at once.
+
+    Yields:
+        list: Batches of extracted program items, validated with `FundingProgramSchema`
+        (see `validate_items`).
+    """
+    roots = [root] if isinstance(root, str) else list(root)
+    archives = [HtmlArchive(root) for root in roots]
+    try:
+        runs = sorted({run for archive in archives for run in archive.runs()})
+        if not runs:
+            raise ValueError(f"Archives {roots} do not contain any crawl run")
+        run_id = run_id or runs[-1]
+        entries = {
+            root: archive.entries(run_id) for root, archive in zip(roots, archives)
+        }
+    finally:
+        for archive in archives:
+            archive.close()
+
+    logger.info(
+        f"Replaying {sum(map(len, entries.values()))} responses of run {run_id}"
+    )
+
+    archived_details = {
+        canonicalize_url(entry["url"])
+        for root_entries in entries.values()
+        for entry in root_entries
+        if entry["callback"].startswith("parse_details")
+    }
+    found_details = set()
+    seen = set()
+    chunks = [
+        (root, root_entries[i : i + chunk_size])
+        for root, root_entries in entries.items()
+        for i in range(0, len(root_entries), chunk_size)
+    ]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for items, detail_urls, errors in executor.map(
+            replay_entries,
+            [root for root, _ in chunks],
+            [chunk for _, chunk in chunks],
+        ):
+            found_details.update(detail_urls)
+
+            for url, error in errors:
+                logger.error(f"Replay failed for {url}: {error}")
+
+            batch = []
+            for item in items:
+                if item["id_hash"] in seen:
+                    continue
+                seen.add(item["id_hash"])
+                batch.append(item)
+
+            programs = validate_items(batch)
+            if programs:
+                yield programs
+
+    missing = found_details - archived_details
+    if missing:
+        logger.warning(
+            f"{len(missing)} program URLs listed on archived overview pages have no archived detail page"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("archive_dir", nargs="+")
+    parser.add_argument("--run-id", default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--output", default=None, help="JSON lines file, default stdout"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        count = 0
+        for batch in replay(args.archive_dir, args.run_id, args.workers):
+            for item in batch:
+                out.write(json.dumps(item, ensure_ascii=False) + "\n")
+            count += len(batch)
+        logger.info(f"Replayed {count} programs")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Schema compiler
+
+Derives every schema used along the pipeline from one Pydantic model (usually
+`FundingProgramSchema`), so no stage has to infer types and the stages cannot
+drift apart:
+
+- `dlt_columns` and `DLT_SCHEMA_CONTRACT` for `pipeline.run`,
+- `pydantic_to_arrow_schema` for Arrow batches handed to dlt,
+- `pydantic_to_polars_schema` / `query_polars_schema` for reading the dataset,
+- `create_table_ddl` for Postgres and DuckDB.
+"""
+
+import typing as t
+from datetime import date, datetime
+import polars as pl
+import pyarrow as pa
+from pydantic import BaseModel
+
+# data types of the model fields: python type -> dlt data type, Arrow type, Polars type
+FIELD_TYPES = {
+    str: ("text", pa.string(), pl.Utf8),
+    int: ("bigint", pa.int64(), pl.Int64),
+    float: ("double", pa.float64(), pl.Float64),
+    bool: ("bool", pa.bool_(), pl.Boolean),
+    datetime: ("timestamp", pa.timestamp("us", tz="UTC"), pl.Datetime("us", "UTC")),
+    date: ("date", pa.date32(), pl.Date),
+}
+
+# dlt data type -> SQL type, like dlt creates the columns
+SQL_TYPES = {
+    "postgres": {
+        "text": "varchar",
+        "bigint": "bigint",
+        "double": "double precision",
+        "bool": "boolean",
+        "timestamp": "timestamp with time zone",
+        "date": "date",
+        "json": "jsonb",
+    },
+    "duckdb": {
+        "text": "VARCHAR",
+        "bigint": "BIGINT",
+        "double": "DOUBLE",
+        "bool": "BOOLEAN",
+        "timestamp": "TIMESTAMP WITH TIME ZONE",
+        "date": "DATE",
+        "json": "JSON",
+    },
+}
+
+# New tables may be created, but the columns and their types are fixed by the model.
+DLT_SCHEMA_CONTRACT = {"tables": "evolve", "columns": "freeze", "data_type": "freeze"}
+
+# Columns added by the scd2 strategy, see `validity_column_names` in main.py
+SCD2_COLUMNS = {
+    "on_website_from": {"data_type": "timestamp", "nullable": True},
+    "on_website_to": {"data_type": "timestamp", "nullable": True},
+}
+
+DLT_SYSTEM_COLUMNS = {
+    "_dlt_load_id": {"data_type": "text", "nullable": False},
+    "_dlt_id": {"data_type": "text", "nullable": False, "unique": True},
+}
+
+# Polars types of the columns `gen_query` adds to the model columns
+QUERY_COLUMNS = {
+    "previous_update_dates": pl.List(pl.Datetime("us", "UTC")),
+    "last_updated": pl.Datetime("us", "UTC"),
+    "on_website_from": pl.Datetime("us", "UTC"),
+    "deleted": pl.Boolean,
+}
+
+
+def unwrap_optional(annotation):
+    """Return the inner type of `Optional[X]` and whether the field is nullable."""
+    if t.get_origin(annotation) is t.Union:
+        args = [arg for arg in t.get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0], True
+    return annotation, False
+
+
+def field_types(annotation):
+    """dlt data type, Arrow type and Polars type of a (non-optional) annotation."""
+    if t.get_origin(annotation) is list:
+        (item_type,) = t.get_args(annotation)
+        _, arrow_type, polars_type = field_types(item_type)
+        # dlt stores lists as json
+        return "json", pa.list_(arrow_type), pl.List(polars_type)
+
+    try:
+        return FIELD_TYPES[annotation]
+    except KeyError:
+        raise TypeError(f"Unsupported field type {annotation}") from None
+
+
+def model_fields(model: type[BaseModel]):
+    """Yield name, nullability and the dlt, Arrow and Polars types of all model fields."""
+    for name, field in model.model_fields.items():
+        annotation, nullable = unwrap_optional(field.annotation)
+        yield (name, nullable, *field_types(annotation))
+
+
+def dlt_columns(model: type[BaseModel]) -> t.Dict[str, t.Dict[str, t.Any]]:
+    """dlt column schema of the model, e.g. for `pipeline.run(columns=...)`."""
+    return {
+        name: {"name": name, "data_type": data_type, "nullable": nullable}
+        for name, nullable, data_type, _, _ in model_fields(model)
+    }
+
+
+def pydantic_to_arrow_schema(
+    model: type[BaseModel], json_lists: bool = False
+) -> pa.Schema:
+    """
+    Convert Pydantic model fields to a fixed Arrow schema, e.g. for Arrow batches in dlt.
+
+    With `json_lists`, list fields are strings holding the JSON encoded list:
+    csv load files cannot hold Arrow list columns, and dlt still loads the
+    strings into the json columns of `dlt_columns`.
+    """
+    return pa.schema(
+        [
+            pa.field(
+                name,
+                pa.string() if json_lists and data_type == "json" else arrow_type,
+                nullable=nullable,
+            )
+            for name, nullable, data_type, arrow_type, _ in model_fields(model)
+        ]
+    )
+
+
+def pydantic_to_polars_schema(model: type[BaseModel]) -> t.Dict[str, pl.DataType]:
+    """Convert Pydantic model fields to a complete Polars schema, lists included."""
+    return {name: polars_type for name, _, _, _, polars_type in model_fields(model)}
+
+
+def query_polars_schema(model: type[BaseModel]) -> t.Dict[str, pl.DataType]:
+    """Polars schema of the result of `gen_query` for the model columns."""
+    return {**pydantic_to_polars_schema(model), **QUERY_COLUMNS}
+
+
+def create_table_ddl(
+    model: type[BaseModel],
+    table_name: str,
+    dialect: str = "postgres",
+    extra_columns: t.Optional[t.Dict[str, t.Dict[str, t.Any]]] = None,
+) -> str:
+    """
+    CREATE TABLE statement for the model in Postgres or DuckDB.
+
+    `extra_columns` are dlt column schemas appended to the model columns, e.g.
+    `{**SCD2_COLUMNS, **DLT_SYSTEM_COLUMNS}` for the table dlt loads into.
+    """
+    sql_types = SQL_TYPES[dialect]
+    columns = {**dlt_columns(model), **(extra_columns or {})}
+
+    definitions = []
+    for name, column in columns.items():
+        definition = f"{name} {sql_types[column['data_type']]}"
+        if not column.get("nullable", True):
+            definition += " NOT NULL"
+        if column.get("unique"):
+            definition += " UNIQUE"
+        definitions.append(definition)
+
+    body = ",\n    ".join(definitions)
+    return f"CREATE TABLE IF NOT EXISTS {table_name} (\n    {body}\n)"
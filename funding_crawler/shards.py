@@ -0,0 +1,404 @@
+"""Sharded crawl
+
+Splits the detail pages of the search into disjoint shards. `fetch_plan` crawls
+the overview pages of the unfiltered search once, without their detail pages,
+and lists every program URL together with the hits of the search.
+`partition_urls` assigns every URL to exactly one shard by its hash, so no
+detail page is fetched twice and programs without a location (or any other
+facet) are crawled like all others. Every shard runs its own `CrawlerProcess`
+in a separate process (or Modal container, see `main.py`), fetches only its
+detail pages and writes its items as JSON lines. `merge_items` keeps every
+`id_hash` once, so the shards can be loaded in one dlt load, and `merge_stats`
+checks the merged programs against the hits of the unfiltered search. Pages
+that cannot be parsed are quarantined per shard (`quarantine_<shard>.sqlite`),
+their URLs are returned so they are not retired.
+
+A URL stays in its shard as long as the number of shards does not change, so
+the validator store of a shard (conditional re-crawls) keeps matching its pages.
+Every shard archives its responses in its own `HtmlArchive` (e.g. `archive_<shard>`
+next to the archive of the plan), `funding_crawler.replay` reads them together.
+
+The shards share less than the request budget of an unsharded crawl
+(`SHARD_RATE`). Every shard gets a share in proportion to its detail pages
+(`shard_shares`), `shard_settings` stretches its download delay and splits the
+concurrent requests of one crawl between the shards, so the shards finish at
+about the same time and together stay below the rate of one crawl. With
+politeness as the bottleneck, a sharded crawl is therefore not faster than an
+unsharded one; it spreads parsing and validation over several processes.
+
+The facet filters of the search (e.g. `funding_location` per Bundesland) are
+not used as shards: they overlap (their counts add up to about four times the
+hits), so detail pages would be fetched several times, and programs without a
+facet value would be in no shard.
+
+Local equivalent, e.g. for testing:
+
+    python -m funding_crawler.shards OUTPUT_DIR [--shards 4] [--processes 4]
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+from datetime import datetime
+from scrapy import Request
+from scrapy.crawler import CrawlerProcess
+from funding_crawler.middlewares import forget_validators
+from funding_crawler.quarantine import Quarantine
+from funding_crawler.spider import FundingSpider
+
+logger = logging.getLogger(__name__)
+
+# the shards together request at most this fraction of the rate of one crawl
+SHARD_RATE = 0.9
+
+
+class ShardPlanSpider(FundingSpider):
+    """Crawls the overview pages of the unfiltered search, the detail pages are left to the shards."""
+
+    name = "shard_plan"
+
+    def parse(self, response):
+        for request in super().parse(response):
+            # the URL is listed in unique_urls, the shards fetch it
+            if request.callback != self.details_callback:
+                yield request
+
+
+class ShardSpider(FundingSpider):
+    """Fetches the detail pages `detail_urls` of one shard, listed by `ShardPlanSpider`."""
+
+    name = "shard"
+
+    def __init__(self, *args, detail_urls=(), **kwargs):
+        super(ShardSpider, self).__init__(*args, **kwargs)
+        self.unique_urls = {url: (None, None) for url in detail_urls}
+
+    def start_requests(self):
+        for url in self.unique_urls:
+            yield Request(
+                url=url,
+                callback=self.details_callback,
+                meta={"conditional_recrawl": True},
+            )
+
+
+def crawl_plan(start_url, settings, run_id=None):
+    process = CrawlerProcess(settings=settings)
+    crawler = process.create_crawler(ShardPlanSpider)
+    process.crawl(crawler, start_urls=[start_url], run_id=run_id)
+    process.start()
+
+    stats = crawler.stats.get_stats()
+    return {
+        "finish_reason": stats.get("finish_reason"),
+        "hits_count": stats.get("funding/hits_count"),
+        "total_cards_found": stats.get("funding/total_cards_found"),
+        "urls": sorted(crawler.spider.unique_urls),
+    }
+
+
+def fetch_plan(start_url, settings, run_id=None):
+    """
+    Program URLs and hits of the unfiltered search, from its overview pages.
+
+    The overview pages are archived under `run_id` if ARCHIVE_DIR is set.
+
+    Returns:
+        dict: `finish_reason` of the plan crawl, `hits_count` (None if not found),
+            `total_cards_found` and the canonical detail page `urls`.
+    """
+    # a fresh process, the reactor cannot be restarted; it exits after the crawl,
+    # since Scrapy's SIGTERM handler would keep the pool from terminating it
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        return pool.apply(crawl_plan, (start_url, settings, run_id))
+
+
+def partition_urls(urls, shards):
+    """
+    Split `urls` into `shards` disjoint lists.
+
+    A URL is assigned by its hash, so it lands in the same shard in every run
+    with the same number of shards.
+    """
+    partition = [[] for _ in range(shards)]
+    for url in urls:
+        digest = hashlib.sha256(url.encode("utf-8")).digest()
+        partition[int.from_bytes(digest[:8], "big") % shards].append(url)
+    return partition
+
+
+def shard_shares(partition):
+    """
+    Share of the request budget of every shard, in proportion to its detail pages.
+
+    Shards are numbered by their index in `partition`, shards without pages are
+    left out.
+    """
+    total = sum(len(urls) for urls in partition)
+    return {shard: len(urls) / total for shard, urls in enumerate(partition) if urls}
+
+
+def shard_concurrency(shares, budget):
+    """
+    Split `budget` concurrent requests between the shards, in proportion to their
+    shares (largest remainders) and at least one per shard.
+    """
+    if len(shares) > budget:
+        raise ValueError(
+            f"{len(shares)} shards need at least {len(shares)} concurrent requests, only {budget} are available"
+        )
+
+    spare = budget - len(shares)
+    quotas = {shard: share * spare for shard, share in shares.items()}
+    concurrency = {shard: 1 + int(quota) for shard, quota in quotas.items()}
+    by_remainder = sorted(
+        quotas, key=lambda shard: quotas[shard] - int(quotas[shard]), reverse=True
+    )
+    for shard in by_remainder[: budget - sum(concurrency.values())]:
+        concurrency[shard] += 1
+    return concurrency
+
+
+def shard_settings(settings, shares, rate=SHARD_RATE):
+    """
+    Scrapy settings of every shard, together below the request rate of one crawl.
+
+    A shard with `share` of the pages gets `share * rate` of the request rate
+    (download delay) and of the concurrent requests of `settings`, so the sums
+    stay below those of one crawl for `rate` < 1.
+
+    Args:
+        shares (dict): Shard -> share of the pages, see `shard_shares`.
+
+    Raises:
+        ValueError: If there are more shards than concurrent requests to split.
+    """
+    concurrent_requests = settings.get("CONCURRENT_REQUESTS", 16)
+    concurrency = shard_concurrency(
+        shares, min(int(concurrent_requests * rate), concurrent_requests - 1)
+    )
+    return {
+        shard: {
+            **settings,
+            "DOWNLOAD_DELAY": settings.get("DOWNLOAD_DELAY", 0) / (share * rate),
+            "CONCURRENT_REQUESTS": concurrency[shard],
+            "CONCURRENT_REQUESTS_PER_DOMAIN": concurrency[shard],
+        }
+        for shard, share in shares.items()
+    }
+
+
+def crawl_shard(
+    shard,
+    urls,
+    settings,
+    output_path,
+    run_id=None,
+    quarantine_path=None,
+    max_failures=None,
+    invalid_urls=None,
+):
+    """
+    Crawl the detail pages `urls` of one shard into the JSON lines file `output_path`.
+
+    Starts a Twisted reactor, so call it once per process. Pages that cannot be
+    parsed go to the quarantine at `quarantine_path`, if given. The stored items
+    of `invalid_urls`, pages whose items failed the validation of the pipeline,
+    are dropped from the validator store of the shard before the crawl.
+
+    Returns:
+        dict: The shard, its output, its crawl stats and its quarantined URLs.
+    """
+    run_id = run_id or datetime.now().strftime("%Y%m%d_%H%M%S")
+    quarantine = (
+        Quarantine(quarantine_path, run_id=run_id, max_failures=max_failures)
+        if quarantine_path
+        else None
+    )
+    if invalid_urls and settings.get("CONDITIONAL_RECRAWL_STORE"):
+        forget_validators(
+            settings["CONDITIONAL_RECRAWL_STORE"], ShardSpider, invalid_urls
+        )
+
+    process = CrawlerProcess(
+        settings={
+            **settings,
+            "FEEDS": {
+                output_path: {
+                    "format": "jsonlines",
+                    "encoding": "utf8",
+                    "overwrite": True,
+                }
+            },
+        }
+    )
+    crawler = process.create_crawler(ShardSpider)
+    process.crawl(
+        crawler,
+        name=f"shard_{shard}",
+        detail_urls=urls,
+        run_id=run_id,
+        quarantine=quarantine,
+    )
+    process.start()
+
+    quarantined = []
+    if quarantine is not None:
+        quarantined = [entry["url"] for entry in quarantine.entries(run_id)]
+        quarantine.close()
+
+    stats = crawler.stats.get_stats()
+    return {
+        "shard": shard,
+        "path": output_path,
+        "finish_reason": stats.get("finish_reason"),
+        "unique_urls": stats.get("funding/unique_urls"),
+        "quarantined": quarantined,
+    }
+
+
+def shard_archive(settings, shard):
+    """Settings of a shard with its own archive next to ARCHIVE_DIR, if it is set."""
+    if not settings.get("ARCHIVE_DIR"):
+        return settings
+    return {**settings, "ARCHIVE_DIR": f"{settings['ARCHIVE_DIR']}_{shard}"}
+
+
+def run_local(
+    partition,
+    settings,
+    output_dir,
+    processes=None,
+    run_id=None,
+    max_failures=None,
+):
+    """
+    Crawl the shards in parallel local processes, one process per shard.
+
+    If ARCHIVE_DIR is set, every shard archives into `<ARCHIVE_DIR>_<shard>`.
+
+    Args:
+        partition (list): The detail page URLs of every shard, see `partition_urls`.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    sharded = shard_settings(settings, shard_shares(partition))
+    args = [
+        (
+            shard,
+            partition[shard],
+            shard_archive(settings_of_shard, shard),
+            os.path.join(output_dir, f"{shard}.jsonl"),
+            run_id,
+            os.path.join(output_dir, f"quarantine_{shard}.sqlite"),
+            max_failures,
+        )
+        for shard, settings_of_shard in sharded.items()
+    ]
+
+    # a fresh process per shard, the reactor cannot be restarted
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(processes or len(args), maxtasksperchild=1) as pool:
+        return pool.starmap(crawl_shard, args, chunksize=1)
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def merge_items(shards):
+    """
+    Merge the items of all shards, keeping the first item of every `id_hash`.
+
+    Args:
+        shards (iterable): One iterable of items per shard.
+    """
+    merged = {}
+    for items in shards:
+        for item in items:
+            merged.setdefault(item["id_hash"], item)
+    return list(merged.values())
+
+
+def merge_stats(plan, results, merged, tolerance=4):
+    """
+    Crawl stats of the sharded crawl, like those of one crawl.
+
+    The crawl only counts as finished if the plan and every shard finished and
+    the `merged` programs and the quarantined pages of all shards add up to
+    about the hits of the unfiltered search.
+    """
+    hits_count = plan["hits_count"]
+    programs = merged + sum(len(result["quarantined"]) for result in results)
+    complete = hits_count is not None and programs >= hits_count - tolerance
+    if plan["finish_reason"] != "finished":
+        finish_reason = "plan_not_finished"
+    elif not all(result["finish_reason"] == "finished" for result in results):
+        finish_reason = "shard_not_finished"
+    elif not complete:
+        finish_reason = "shards_incomplete"
+    else:
+        finish_reason = "finished"
+
+    return {
+        "finish_reason": finish_reason,
+        "funding/hits_count": hits_count,
+        "funding/unique_urls": len(plan["urls"]),
+        "funding/missing_urls": None
+        if hits_count is None
+        else hits_count - len(plan["urls"]),
+        "funding/total_cards_found": plan["total_cards_found"],
+        "funding/merged_programs": merged,
+    }
+
+
+def main(argv=None):
+    import dlt
+    from scrapy_settings import scrapy_settings
+    from funding_crawler.dlt_utils.helpers import cfg_provider, resolve_start_urls
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output_dir")
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--max-failures", type=int, default=25)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    dlt.config.register_provider(cfg_provider)
+
+    (start_url,) = resolve_start_urls()
+    plan = fetch_plan(start_url, scrapy_settings)
+    results = run_local(
+        partition_urls(plan["urls"], args.shards),
+        scrapy_settings,
+        args.output_dir,
+        args.processes,
+        max_failures=args.max_failures,
+    )
+    items = merge_items(read_jsonl(result["path"]) for result in results)
+
+    with open(
+        os.path.join(args.output_dir, "merged.jsonl"), "w", encoding="utf-8"
+    ) as f:
+        for item in items:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+    for result in results:
+        logger.info(
+            f"Shard {result['shard']}: {result['finish_reason']}, {result['unique_urls']} detail pages, {len(result['quarantined'])} quarantined"
+        )
+    stats = merge_stats(plan, results, len(items))
+    logger.info(
+        f"{len(items)} unique programs of {plan['hits_count']} hits, {stats['finish_reason']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Incrementally maintained snapshot of the published dataset
+
+`gen_query` derives the published dataset (one row per program, with
+`previous_update_dates`, `last_updated` and `deleted`) from the whole scd2
+history. `refresh_snapshot` materializes its result in a table once and
+afterwards only recomputes the rows of programs touched since the last refresh,
+so reading the dataset is a plain table scan.
+
+A program is touched if a row was loaded for it (`_dlt_load_id`) or one of its
+rows was retired (`on_website_to`) after the watermark stored in the state table,
+which also covers explicit retirements (see `ChangeDetector.retire`).
+"""
+
+from funding_crawler.helpers import gen_query
+
+STATE_TABLE = "snapshot_state"
+
+# programs touched since the watermark, during a refresh
+TOUCHED_TABLE = "snapshot_touched"
+
+
+def touched_query(history_table):
+    # parameters: the watermark, i.e. the last load id and the last retirement
+    return f"""SELECT DISTINCT id_hash FROM {history_table}
+        WHERE _dlt_load_id > %s OR on_website_to > CAST(%s AS timestamp with time zone)"""
+
+
+def read_watermark(client, state_table, snapshot_name):
+    client.execute_sql(
+        f"CREATE TABLE IF NOT EXISTS {state_table} (snapshot_table varchar NOT NULL, last_load_id varchar, last_retired_at varchar)"
+    )
+    rows = client.execute_sql(
+        f"SELECT last_load_id, last_retired_at FROM {state_table} WHERE snapshot_table = %s",
+        snapshot_name,
+    )
+    return rows[0] if rows else None
+
+
+def refresh_snapshot(pipeline, history_name, snapshot_name, columns):
+    """
+    Bring the snapshot table up to date with the scd2 history table.
+
+    Args:
+        pipeline (dlt.Pipeline): Pipeline whose dataset holds both tables.
+        history_name (str): Name of the scd2 table.
+        snapshot_name (str): Name of the snapshot table, created on the first refresh.
+        columns (list): Model columns, as for `gen_query`.
+
+    Returns:
+        int: Number of snapshot rows that were recomputed, None for a full rebuild.
+    """
+    with pipeline.sql_client() as client:
+        history_table = client.make_qualified_table_name(history_name)
+        snapshot_table = client.make_qualified_table_name(snapshot_name)
+        state_table = client.make_qualified_table_name(STATE_TABLE)
+
+        with client.begin_transaction():
+            watermark = read_watermark(client, state_table, snapshot_name)
+            ((last_load_id, last_retired_at),) = client.execute_sql(
+                f"SELECT MAX(_dlt_load_id), CAST(MAX(on_website_to) AS varchar) FROM {history_table}"
+            )
+
+            if watermark is None:
+                client.execute_sql(f"DROP TABLE IF EXISTS {snapshot_table}")
+                client.execute_sql(
+                    f"CREATE TABLE {snapshot_table} AS {gen_query(history_table, columns)}"
+                )
+                recomputed = None
+            else:
+                # computed once, `gen_query` filters every component by it
+                client.execute_sql(
+                    f"CREATE TEMPORARY TABLE {TOUCHED_TABLE} AS {touched_query(history_table)}",
+                    *watermark,
+                )
+                where = f"id_hash IN (SELECT id_hash FROM {TOUCHED_TABLE})"
+                client.execute_sql(f"DELETE FROM {snapshot_table} WHERE {where}")
+                client.execute_sql(
+                    f"INSERT INTO {snapshot_table} {gen_query(history_table, columns, where)}"
+                )
+                ((recomputed,),) = client.execute_sql(
+                    f"SELECT COUNT(*) FROM {TOUCHED_TABLE}"
+                )
+                client.execute_sql(f"DROP TABLE {TOUCHED_TABLE}")
+
+            client.execute_sql(
+                f"DELETE FROM {state_table} WHERE snapshot_table = %s", snapshot_name
+            )
+            client.execute_sql(
+                f"INSERT INTO {state_table} VALUES (%s, %s, %s)",
+                snapshot_name,
+                last_load_id or "",
+                last_retired_at or "1970-01-01",
+            )
+
+    return recomputed
+
+
+def invalidate_snapshots(pipeline):
+    """Drop all watermarks, so the next refresh rebuilds the snapshots from scratch."""
+    with pipeline.sql_client() as client:
+        client.execute_sql(
+            f"DROP TABLE IF EXISTS {client.make_qualified_table_name(STATE_TABLE)}"
+        )
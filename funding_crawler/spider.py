@@ -1,98 +1,30 @@
-import hashlib
-from scrapy import Request, Spider
-from scrapy.exceptions import CloseSpider
+import math
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from scrapy import Request, Spider, signals
+from scrapy.exceptions import CloseSpider, DontCloseSpider
+from scrapy.utils.defer import maybe_deferred_to_future
+from twisted.internet.defer import Deferred
+from twisted.python.failure import Failure
 from datetime import datetime
-from funding_crawler.helpers import compute_checksum, gen_license
-from funding_crawler.models import FundingProgramSchema
+from funding_crawler.extract import (  # noqa: F401 (mappings are re-exported)
+    DetailPageError,
+    code_to_label,
+    extract_details,
+    extract_details_compiled,
+    known_labels,
+    process_details,
+    translate_map,
+)
+from funding_crawler.helpers import gen_license
+from funding_crawler.quarantine import QuarantineLimitExceeded
 from w3lib.url import canonicalize_url
-from pydantic import ValidationError
-
-# Mapping of internal codes to display names, extracted from the overview page sidebar filters.
-# Some detail pages serve these codes instead of the human-readable labels due to a website bug.
-code_to_label = {
-    # funding_area (Förderbereich)
-    "arbeit": "Arbeit",
-    "aus_weiterbildung": "Aus- & Weiterbildung",
-    "aussenwirtschaft": "Außenwirtschaft",
-    "beratung": "Beratung",
-    "corona": "Corona-Hilfe",
-    "digitalisierung": "Digitalisierung",
-    "energieeffizienz_erneuerbare_energien": "Energieeffizienz & Erneuerbare Energien",
-    "existenzgruendung_festigung": "Existenzgründung & -festigung",
-    "forschung_innovation_themenoffen": "Forschung & Innovation (themenoffen)",
-    "forschung_innovation_themenspezifisch": "Forschung & Innovation (themenspezifisch)",
-    "frauenfoerderung": "Frauenförderung",
-    "gesundheit_soziales": "Gesundheit & Soziales",
-    "infrastruktur": "Infrastruktur",
-    "kultur_medien_sport": "Kultur, Medien & Sport",
-    "landwirtschaft_laendliche_entwicklung": "Landwirtschaft & Ländliche Entwicklung",
-    "messen_ausstellungen": "Messen & Ausstellungen",
-    "mobilitaet": "Mobilität",
-    "regionalfoerderung": "Regionalförderung",
-    "smart_cities_regionen": "Smart Cities & Regionen",
-    "staedtebau_stadterneuerung": "Städtebau & Stadterneuerung",
-    "umwelt_naturschutz": "Umwelt- & Naturschutz",
-    "unternehmensfinanzierung": "Unternehmensfinanzierung",
-    "wohnungsbau_modernisierung": "Wohnungsbau & Modernisierung",
-    # funding_type (Förderart)
-    "beteiligung": "Beteiligung",
-    "buergschaft": "Bürgschaft",
-    "darlehen": "Darlehen",
-    "garantie": "Garantie",
-    "sonstige": "Sonstige",
-    "zuschuss": "Zuschuss",
-    # funding_location (Fördergebiet)
-    "_bundesweit": "bundesweit",
-    "baden_wuerttemberg": "Baden-Württemberg",
-    "bayern": "Bayern",
-    "berlin": "Berlin",
-    "brandenburg": "Brandenburg",
-    "bremen": "Bremen",
-    "de_ni": "Niedersachsen",
-    "de_st": "Sachsen-Anhalt",
-    "hamburg": "Hamburg",
-    "hessen": "Hessen",
-    "mecklenburg_vorpommern": "Mecklenburg-Vorpommern",
-    "nordrhein_westfalen": "Nordrhein-Westfalen",
-    "rheinland_pfalz": "Rheinland-Pfalz",
-    "saarland": "Saarland",
-    "sachsen": "Sachsen",
-    "schleswig_holstein": "Schleswig-Holstein",
-    "thueringen": "Thüringen",
-    # eligible_applicants (Förderberechtigte)
-    "bildungseinrichtung": "Bildungseinrichtung",
-    "existenzgruenderin": "Existenzgründer/in",
-    "forschungseinrichtung": "Forschungseinrichtung",
-    "hochschule": "Hochschule",
-    "kommune": "Kommune",
-    "oeffentliche_einrichtung": "Öffentliche Einrichtung",
-    "privatperson": "Privatperson",
-    "unternehmen": "Unternehmen",
-    "verband_vereinigung": "Verband/Vereinigung",
-}
-
-# Known display labels, used to reconstruct labels that contain the list separator ", "
-# (e.g. "Kultur, Medien & Sport" gets split incorrectly by a naive split on ", ").
-known_labels = set(code_to_label.values())
-
-translate_map = {
-    "Kurzzusammenfassung": "description",
-    "Zusatzinfos": "more_info",
-    "Rechtsgrundlage": "legal_basis",
-    "Ansprechpunkt": "contact_info",
-    "Weiterführende Links": "further_links",
-    "WeiterfuehrendeLinks": "further_links",  # ASCII variant
-    "Förderart": "funding_type",
-    "Foerderart": "funding_type",  # ASCII variant
-    "Förderbereich": "funding_area",
-    "Foerderbereich": "funding_area",  # ASCII variant
-    "Fördergebiet": "funding_location",
-    "Foerdergebiet": "funding_location",  # ASCII variant
-    "Förderberechtigte": "eligible_applicants",
-    "Foerderberechtigte": "eligible_applicants",  # ASCII variant
-    "Fördergeber": "funding_body",
-    "Foerdergeber": "funding_body",  # ASCII variant
-}
+
+
+def response_meta(response):
+    """Request meta of a response, empty if the response is not tied to a request."""
+    return response.request.meta if response.request is not None else {}
 
 
 class FundingSpider(Spider):
@@ -104,11 +36,75 @@ class FundingSpider(Spider):
 
     name = "funding"
 
-    def __init__(self, *args, **kwargs):
+    # Schedule all overview pages as soon as the first one is parsed instead of
+    # following the "weiter" link page by page (setting FUNDING_PARALLEL_PAGINATION).
+    parallel_pagination = False
+    # Overview pages get their own priority lane so that the detail requests
+    # they produce cannot starve them (setting FUNDING_PAGINATION_PRIORITY).
+    pagination_priority = 10
+    # Number of workers for extraction of detail pages, 0 runs them
+    # inline on the reactor thread (settings FUNDING_PARSE_WORKERS and
+    # FUNDING_PARSE_EXECUTOR, which is either "process" or "thread").
+    parse_workers = 0
+    parse_executor = "process"
+    # Detail page extractor, "parsel" (extract_details) or "lxml" with precompiled
+    # XPath expressions (extract_details_compiled), setting FUNDING_EXTRACTOR.
+    extractor = "parsel"
+    # Rounds of re-crawling overview pages with fewer cards than expected when the
+    # spider idles with fewer unique URLs than hits (setting FUNDING_RECRAWL_SHORT_PAGES).
+    recrawl_short_pages = 1
+    cards_per_page = 10
+    # Programs that may be missing from the unique URLs before the spider closes with
+    # finish_reason "urls_incomplete" instead of "finished" (setting FUNDING_MAX_MISSING).
+    max_missing = 4
+
+    def __init__(self, *args, run_id=None, quarantine=None, **kwargs):
         super(FundingSpider, self).__init__(*args, **kwargs)
+        # identifies the crawl run, e.g. in the raw HTML archive
+        self.run_id = run_id or datetime.now().strftime("%Y%m%d_%H%M%S")
+        # pages that cannot be parsed go to the quarantine instead of closing the
+        # spider (see funding_crawler.quarantine)
+        self.quarantine = quarantine
         self.total_cards_found = 0
         self.unique_urls = {}  # URL -> (page_number, page_url) mapping
         self.page_count = 0
+        self.hits_count = None  # number of programs displayed in #hits--count
+        self.expected_pages = None
+        self.short_pages = {}  # page_number -> URL of overview pages with missing cards
+        self.recrawl_rounds = 0
+        self.executor = None
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super(FundingSpider, cls).from_crawler(crawler, *args, **kwargs)
+        spider.parallel_pagination = crawler.settings.getbool(
+            "FUNDING_PARALLEL_PAGINATION", cls.parallel_pagination
+        )
+        spider.pagination_priority = crawler.settings.getint(
+            "FUNDING_PAGINATION_PRIORITY", cls.pagination_priority
+        )
+        spider.parse_workers = crawler.settings.getint(
+            "FUNDING_PARSE_WORKERS", cls.parse_workers
+        )
+        spider.parse_executor = crawler.settings.get(
+            "FUNDING_PARSE_EXECUTOR", cls.parse_executor
+        )
+        spider.extractor = crawler.settings.get("FUNDING_EXTRACTOR", cls.extractor)
+        spider.recrawl_short_pages = crawler.settings.getint(
+            "FUNDING_RECRAWL_SHORT_PAGES", cls.recrawl_short_pages
+        )
+        spider.max_missing = crawler.settings.getint(
+            "FUNDING_MAX_MISSING", cls.max_missing
+        )
+        crawler.signals.connect(spider.spider_idle, signal=signals.spider_idle)
+        return spider
+
+    @property
+    def details_callback(self):
+        """Callback for detail pages, depending on whether a worker pool is used."""
+        if self.parse_workers > 0:
+            return self.parse_details_in_pool
+        return self.parse_details
 
     def parse(self, response):
         """
@@ -128,11 +124,23 @@ class FundingSpider(Spider):
         ).extract()
 
         cards = response.css("div.card--fundingprogram")
-        self.total_cards_found += len(cards)
+        recrawl = response_meta(response).get("recrawl", False)
+        if not recrawl:
+            self.total_cards_found += len(cards)
         self.page_count += 1
+        page_number = response_meta(response).get("page_number", self.page_count)
+        next_page = response.css('a.forward.button::attr("href")').get()
+
+        if self.page_count == 1:
+            # the completeness check compares the unique URLs with this
+            self.hits_count = self.extract_hits_count(response)
+
+        # only the last page may have fewer cards
+        if next_page and len(cards) < self.cards_per_page:
+            self.short_pages[page_number] = response.url
 
         self.logger.debug(
-            f"Processing page {self.page_count}: {response.url} (found {len(cards)} cards)"
+            f"Processing page {page_number}: {response.url} (found {len(cards)} cards)"
         )
 
         if not cards:
@@ -165,218 +173,264 @@ class FundingSpider(Spider):
             if normalized in self.unique_urls:
                 original_page_num, original_page_url = self.unique_urls[normalized]
                 self.logger.warning(
-                    f"Skipping duplicate URL: {normalized}. Duplicate found on page {self.page_count}: {response.url}. Originally found on page {original_page_num}: {original_page_url}"
+                    f"Skipping duplicate URL: {normalized}. Duplicate found on page {page_number}: {response.url}. Originally found on page {original_page_num}: {original_page_url}"
                 )
                 continue
 
-            self.unique_urls[normalized] = (self.page_count, response.url)
-            yield Request(url=normalized, callback=self.parse_details)
+            self.unique_urls[normalized] = (page_number, response.url)
+            yield Request(
+                url=normalized,
+                callback=self.details_callback,
+                meta={"conditional_recrawl": True},
+            )
 
         if self.page_count % 10 == 0:
             self.logger.info(f"Total unique URLs found so far: {len(self.unique_urls)}")
 
-        next_page = response.css('a.forward.button::attr("href")').get()
+        self.update_stats()
+
+        if recrawl:
+            # the pages after a re-crawled page are scheduled already
+            return
+
+        if self.parallel_pagination:
+            # Pages scheduled by the fan-out must not fan out again
+            if not response_meta(response).get("fanned_out"):
+                yield from self.fan_out_pagination(response, len(cards))
+            return
 
         if next_page is not None and next_page != "":
-            yield response.follow(next_page, self.parse)
+            yield response.follow(
+                next_page, self.parse, priority=self.pagination_priority
+            )
 
-    def parse_details(self, response):
+    def fan_out_pagination(self, response, cards_per_page):
         """
-        Parse the response from a funding program detail page.
+        Schedule every remaining overview page at once, based on the first overview page.
 
-        Extracts details such as title, description, funding information, contact details,
-        and additional links. Computes unique identifiers and a checksum for the data.
+        The number of pages is taken from the pagination links and cross-checked with
+        the number of hits displayed in `#hits--count`.
 
         Args:
-            response (Response): The HTTP response object for the detail page.
+            response (Response): The HTTP response object for the first overview page.
+            cards_per_page (int): Number of program cards found on the first page.
 
         Yields:
-            dict: A dictionary containing the extracted program details.
+            Request: Requests for all remaining overview pages.
         """
-        dct = {}
-
-        dct["title"] = "".join(
-            response.xpath("//h1[@class='title']//text()").getall()
-        ).strip()
-        dct["title"] = dct["title"] if dct["title"] else None
-
-        if not dct["title"]:
-            self.logger.warning(f"No title found on page: {response.url}")
-            raise ValueError(f"No title found on page: {response.url}")
-
-        tab_names = response.xpath(
-            "/html/body/main/div[2]/div/div[1]/h2/span//text()"
-        ).getall()
-
-        if tab_names:
-            # try format with article tags first
-            article_nodes = response.xpath("//div[@class='content']//article")
-
-            # if no articles found, try older format where content is in rich--text div
-            if not article_nodes:
-                article_nodes = response.xpath("//div[@class='rich--text']")
-
-            for i, article in enumerate(article_nodes):
-                content = article.get()
-                try:
-                    key = translate_map[tab_names[i].strip()]
-                except KeyError:
-                    self.logger.error(
-                        f"Unknown tab name: '{tab_names[i].strip()}' on page: {response.url}"
-                    )
-                    raise CloseSpider(
-                        f"Unknown tab name: '{tab_names[i].strip()}' on page: {response.url}"
-                    )
-
-                dct[key] = content
-
-            # Log warning if description is missing
-            if "description" not in dct:
+        next_page = response.css('a.forward.button::attr("href")').get()
+        if not next_page:
+            self.expected_pages = 1
+            return
+
+        page_numbers = [
+            int(number)
+            for number in response.css("div.pagination a.page::text").getall()
+            if number.strip().isdigit()
+        ]
+        last_page = max(page_numbers, default=1)
+
+        if self.hits_count is not None and cards_per_page:
+            pages_from_hits = math.ceil(self.hits_count / cards_per_page)
+            if pages_from_hits != last_page:
                 self.logger.warning(
-                    f"No 'Kurzzusammenfassung' (description) tab found on page: {response.url}. Found tabs: {tab_names}"
+                    f"Pagination shows {last_page} pages but {self.hits_count} hits imply {pages_from_hits} pages, using the larger value"
                 )
-                dct["description"] = None
-        else:
-            content_node = response.xpath(
-                "//main/div[@class='jumbotron']/following-sibling::div/div[@class='content']"
-            ).get()
+                last_page = max(last_page, pages_from_hits)
+
+        self.expected_pages = last_page
+        self.logger.info(f"Scheduling {last_page - 1} overview pages in parallel")
+
+        for page_number in range(2, last_page + 1):
+            page_url = re.sub(r"(list%253D)\d+", rf"\g<1>{page_number}", next_page)
+            yield response.follow(
+                page_url,
+                self.parse,
+                priority=self.pagination_priority,
+                meta={"page_number": page_number, "fanned_out": True},
+            )
 
-            if not content_node:
-                self.logger.warning(f"No description found on page: {response.url}")
-                dct["description"] = None
-            else:
-                dct["description"] = content_node
-
-        dt_elements = response.xpath("//dt")
-        dd_elements = response.xpath("//dd")
-
-        for dt, dd in zip(dt_elements, dd_elements):
-            key = dt.xpath("text()").get()
-            if key:
-                key = translate_map.get(key.strip().replace(":", ""))
-                if not key:
-                    self.logger.warning("Field not in translate map: %s", key)
-                    continue
-            else:
-                self.logger.warning("Field couldnt be extracted: %s %s", dt, dd)
-                continue
+    def extract_hits_count(self, response):
+        """Read the number of programs displayed on an overview page, if present."""
+        hits = response.css("#hits--count::text").get()
+        if hits is None or not hits.strip().isdigit():
+            self.logger.warning(f"No hits count found on page: {response.url}")
+            return None
+        return int(hits.strip())
+
+    def update_stats(self):
+        """Expose the counts of the completeness check in the crawl stats."""
+        if getattr(self, "crawler", None) is None:
+            return
+
+        stats = self.crawler.stats
+        stats.set_value("funding/hits_count", self.hits_count)
+        stats.set_value("funding/total_cards_found", self.total_cards_found)
+        stats.set_value("funding/unique_urls", len(self.unique_urls))
+        stats.set_value("funding/missing_urls", self.missing_count())
+
+    def missing_count(self):
+        """Number of hits without a unique program URL, None if the hits are unknown."""
+        if self.hits_count is None:
+            return None
+        return self.hits_count - len(self.unique_urls)
+
+    def spider_idle(self):
+        """
+        Re-crawl overview pages with missing cards before the spider closes.
 
-            if key in [
-                "funding_type",
-                "funding_area",
-                "funding_location",
-                "eligible_applicants",
-            ]:
-                lst_str = dd.xpath("text()").get()
-                parts = lst_str.strip().split(", ") if lst_str else []
-                # Merge consecutive parts that form a known label containing ", "
-                # (e.g. "Kultur, Medien & Sport" would otherwise be split in two).
-                merged = []
-                i = 0
-                while i < len(parts):
-                    if i + 1 < len(parts):
-                        combined = parts[i] + ", " + parts[i + 1]
-                        if combined in known_labels:
-                            merged.append(combined)
-                            i += 2
-                            continue
-                    merged.append(parts[i])
-                    i += 1
-                lst = [code_to_label.get(v, v) for v in merged]
-                dct[key] = lst if lst else None
-
-            elif key == "funding_body":
-                # Try both umlaut and ASCII versions of the title attribute
-                str = dd.xpath(
-                    "p[@class='card--title']/a[@title='Öffnet die Einzelsicht' or @title='OeffnetEinzelsicht']/span[@class='link--label']/text()"
-                ).get()
-                dct[key] = str.strip() if str else None
-
-            elif key == "further_links":
-                links = []
-                for link in dd.xpath(".//a[@href]"):
-                    link_url = link.xpath("@href").get()
-                    if not link_url.startswith("http"):
-                        link_url = "https://www.foerderdatenbank.de/" + link_url
-                    links.append(link_url)
-
-                dct[key] = links if links else None
-
-            elif key == "contact_info":
-                dct["contact_info_institution"] = (
-                    " ".join(
-                        dd.xpath(
-                            ".//a[@title='Öffnet die Einzelsicht' or @title='OeffnetEinzelsicht']/span[@class='link--label']//text()"
-                        ).getall()
-                    ).strip()
-                    or None
+        The website sometimes serves overview pages with fewer cards, so programs
+        are missing although every page was crawled. If more than `max_missing`
+        programs are still missing afterwards, the spider is closed with the
+        finish_reason "urls_incomplete", so no programs are retired.
+        """
+        missing = self.missing_count()
+        if (
+            not missing
+            or missing < 0
+            or not self.short_pages
+            or self.recrawl_rounds >= self.recrawl_short_pages
+        ):
+            if missing is not None and missing > self.max_missing:
+                raise CloseSpider("urls_incomplete")
+            return
+
+        self.recrawl_rounds += 1
+        self.logger.info(
+            f"{missing} programs missing, re-crawling {len(self.short_pages)} overview pages with missing cards (round {self.recrawl_rounds})"
+        )
+        short_pages, self.short_pages = self.short_pages, {}
+        for page_number, url in sorted(short_pages.items()):
+            self.crawler.engine.crawl(
+                Request(
+                    url,
+                    callback=self.parse,
+                    dont_filter=True,
+                    priority=self.pagination_priority,
+                    meta={"page_number": page_number, "recrawl": True},
                 )
+            )
+        self.crawler.stats.inc_value("funding/recrawled_pages", len(short_pages))
+        raise DontCloseSpider
 
-                dct["contact_info_street"] = (
-                    dd.xpath(".//p[@class='adr']/text()").get() or ""
-                ).strip() or None
-
-                dct["contact_info_city"] = (
-                    dd.xpath(".//p[@class='locality']/text()").get() or ""
-                ).strip() or None
+    def closed(self, reason):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
 
-                dct["contact_info_fax"] = (
-                    dd.xpath(".//p[@class='fax']/text()").re_first(r"Fax:\s*(.*)")
-                    or None
-                )
+        self.update_stats()
 
-                dct["contact_info_phone"] = (
-                    dd.xpath(".//p[@class='tel']/text()").re_first(r"Tel:\s*(.*)")
-                    or None
-                )
+        if self.hits_count is not None and len(self.unique_urls) != self.hits_count:
+            self.logger.warning(
+                f"Found {len(self.unique_urls)} unique program URLs on {self.page_count}/{self.expected_pages} overview pages, but the website displays {self.hits_count} hits"
+            )
 
-                dct["contact_info_email"] = (
-                    dd.xpath(".//p[@class='email']/a[@href]")
-                    .xpath("@href")
-                    .re_first(r"mailto:(.*)")
-                    or None
-                )
+    def parse_details(self, response):
+        """
+        Parse the response from a funding program detail page.
 
-                dct["contact_info_website"] = (
-                    dd.xpath(".//p[@class='website']/a[@href]").xpath("@href").get()
-                    or None
-                )
+        Extracts details such as title, description, funding information, contact details,
+        and additional links. Computes unique identifiers and a checksum for the data.
 
-            else:
-                value = dd.xpath("text()").get()
-                dct[key] = value.strip() if value else None
+        Args:
+            response (Response): The HTTP response object for the detail page.
 
-        url_parts = response.url.partition("Foerderprogramm/")
+        Yields:
+            dict: A dictionary containing the extracted program details.
+        """
+        cached_item = response_meta(response).get("cached_item")
+
+        if cached_item is not None:
+            # Page is unchanged since the last crawl (see ConditionalRecrawlMiddleware),
+            # only the retrieval date in the license info has to be renewed
+            dct = dict(cached_item)
+            dct["license_info"] = gen_license(
+                dct["title"], datetime.today(), dct["url"]
+            )
+            yield dct
+            return
 
-        if url_parts[1] == "":
-            url_parts = response.url.partition(
-                "Archiv/"
-            )  # e.g. 'https://www.foerderdatenbank.de/FDB/Content/DE/Archiv/innovativer-schiffbau-sichert-arbeitsplaetze.html'
+        try:
+            if self.extractor == "lxml":
+                dct = extract_details_compiled(response.url, response.selector.root)
+            else:
+                dct = extract_details(response.url, response.selector)
+        except (DetailPageError, ValueError) as e:
+            self.handle_details_error(response, e)
+            return
 
-        foerderprogramm_url_id = (
-            url_parts[2].replace("/", "-").replace(".html", "").lower()
-        )
-        foerderprogramm_hash_id = hashlib.md5(
-            foerderprogramm_url_id.encode()
-        ).hexdigest()
+        yield dct
 
-        dct["url"] = response.url
-        dct["id_hash"] = foerderprogramm_hash_id
-        dct["id_url"] = foerderprogramm_url_id
+    async def parse_details_in_pool(self, response):
+        """
+        Same as `parse_details`, but extraction runs in a worker pool
+        (setting FUNDING_PARSE_WORKERS), so the reactor thread only handles I/O.
 
-        ignore_fields = ["url", "id_hash", "id_url"]
-        watch_fields = [x for x in list(dct.keys()) if x not in ignore_fields]
+        Args:
+            response (Response): The HTTP response object for the detail page.
 
-        dct["checksum"] = compute_checksum(dct, watch_fields)
+        Yields:
+            dict: A dictionary containing the extracted program details.
+        """
+        cached_item = response_meta(response).get("cached_item")
 
-        date = datetime.today()
-        dct["license_info"] = gen_license(dct["title"], date, dct["url"])
+        if cached_item is not None:
+            for dct in self.parse_details(response):
+                yield dct
+            return
 
-        # Validate the item with Pydantic schema (applies after_validators)
         try:
-            FundingProgramSchema(**dct)
-        except ValidationError as e:
-            self.logger.error(f"Validation error for program at {response.url}: {e}")
-            raise CloseSpider(f"Validation error for program at {response.url}: {e}")
+            dct = await self.run_in_pool(
+                process_details, response.url, response.text, self.extractor
+            )
+        except (DetailPageError, ValueError) as e:
+            self.handle_details_error(response, e)
+            return
 
         yield dct
+
+    def handle_details_error(self, response, error):
+        """
+        Quarantine a detail page that could not be parsed.
+
+        Without a quarantine, or once its limit is exceeded, the spider is closed
+        (unknown tab names) or the error is re-raised (missing title).
+        """
+        if self.quarantine is not None:
+            try:
+                self.quarantine.add(response.url, error, html=response.text)
+                return
+            except QuarantineLimitExceeded as e:
+                self.logger.error(str(e))
+                raise CloseSpider(str(e))
+
+        if isinstance(error, DetailPageError):
+            self.logger.error(str(error))
+            raise CloseSpider(str(error))
+
+        raise error
+
+    def run_in_pool(self, fn, *args):
+        """Submit `fn` to the worker pool and return an awaitable for its result."""
+        from twisted.internet import reactor
+
+        if self.executor is None:
+            if self.parse_executor == "thread":
+                self.executor = ThreadPoolExecutor(max_workers=self.parse_workers)
+            else:
+                # spawn: forking a process that runs the reactor and dlt threads is unsafe
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.parse_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+
+        deferred = Deferred()
+
+        def on_done(future):
+            exception = future.exception()
+            if exception is None:
+                reactor.callFromThread(deferred.callback, future.result())
+            else:
+                reactor.callFromThread(deferred.errback, Failure(exception))
+
+        self.executor.submit(fn, *args).add_done_callback(on_done)
+        return maybe_deferred_to_future(deferred)
@@ -0,0 +1,86 @@
+"""Upload of the export artifacts
+
+`write_zip` builds zips that only depend on the content of their files (fixed
+timestamps, permissions and order), so an unchanged export produces a
+byte-identical zip. `upload_if_changed` stores the sha256 of every upload in the
+object metadata and skips the upload if the object already has that hash;
+otherwise the file is streamed with a multipart upload of concurrent parts.
+"""
+
+import hashlib
+import logging
+import shutil
+import zipfile
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# fixed timestamp of all zip entries, the earliest one zip supports
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=CHUNK_SIZE,
+    multipart_chunksize=CHUNK_SIZE,
+    max_concurrency=8,
+)
+
+
+def write_zip(path, files):
+    """
+    Write a deterministic zip to `path`.
+
+    Args:
+        files (dict): Name in the archive -> local path.
+    """
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zipf:
+        for arcname in sorted(files):
+            info = zipfile.ZipInfo(arcname, date_time=ZIP_DATE_TIME)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            with open(files[arcname], "rb") as src, zipf.open(info, "w") as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def remote_sha256(client, bucket, key):
+    try:
+        return client.head_object(Bucket=bucket, Key=key)["Metadata"].get("sha256")
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+            return None
+        raise
+
+
+def upload_if_changed(
+    client, path, bucket, key, extra_args=None, transfer_config=TRANSFER_CONFIG
+):
+    """
+    Upload `path` to `bucket`/`key` unless the object already has the same content.
+
+    Returns:
+        bool: Whether the file was uploaded.
+    """
+    sha256 = file_sha256(path)
+    if remote_sha256(client, bucket, key) == sha256:
+        logger.info(f"Skipping upload of {path}, {key} is unchanged")
+        return False
+
+    logger.info(f"Uploading {path} to {key} in bucket {bucket}")
+    client.upload_file(
+        path,
+        bucket,
+        key,
+        ExtraArgs={**(extra_args or {}), "Metadata": {"sha256": sha256}},
+        Config=transfer_config,
+    )
+    return True
@@ -1,21 +1,58 @@
 import dlt
 import modal.mount
 from funding_crawler.spider import FundingSpider
-from funding_crawler.dlt_utils.helpers import create_pipeline_runner, cfg_provider
-from funding_crawler.helpers import gen_query, pydantic_to_polars_schema, get_hits_count
+from funding_crawler.dlt_utils.helpers import (
+    add_arrow_dlt_columns,
+    cfg_provider,
+    create_pipeline_runner,
+    resolve_start_urls,
+)
+from funding_crawler.dlt_utils.queue import QueueClosedError, ScrapingQueue
+from funding_crawler.dlt_utils.runner import PipelineRunner
 from scrapy_settings import scrapy_settings
 
-# from funding_crawler.helpers import get_hits_count
 from funding_crawler.models import FundingProgramSchema
+from funding_crawler.middlewares import forget_validators
+from funding_crawler.quarantine import Quarantine
+from funding_crawler.delta import ChangeDetector
+from funding_crawler.snapshot import refresh_snapshot
+from funding_crawler.migrations import migrate
+from funding_crawler.export import export_to_ipc, scan_export, join_lists
+from funding_crawler.formatting import MarkdownCache, format_columns, markdown_pool
+from funding_crawler.changes import MANIFEST_NAME, export_changes
+from funding_crawler.upload import upload_if_changed, write_zip
+from funding_crawler.backup import BackgroundBackup
+from funding_crawler.incremental_backup import (
+    MANIFEST_NAME as BACKUP_MANIFEST_NAME,
+    add_full_dump,
+    backup_increment,
+    empty_manifest,
+    full_dump_due,
+)
+from funding_crawler.extract import program_ids
+from funding_crawler.shards import (
+    crawl_shard,
+    fetch_plan,
+    merge_items,
+    merge_stats,
+    partition_urls,
+    read_jsonl,
+    shard_archive,
+    shard_settings,
+    shard_shares,
+)
+from funding_crawler.schema import (
+    DLT_SCHEMA_CONTRACT,
+    dlt_columns,
+    pydantic_to_arrow_schema,
+    query_polars_schema,
+)
 import polars as pl
 import boto3
-from markdownify import markdownify as md
-import zipfile
-import subprocess
-from sqlalchemy import create_engine
 import os
+import json
 import modal
-from datetime import datetime
+from datetime import datetime, timezone
 
 license_content = """
 Inhalte von foerderdatenbank.de sind individuell lizensiert durch das Bundesministerium für Wirtschaft und Klimaschutz unter CC BY-ND 3.0 DE. 
@@ -53,6 +90,20 @@ bucket_name = "foerderdatenbankdump"
 
 backup_bucket_name = "foerderdatenbankbackup"
 
+# "csv" stages the batches as csv files and loads them into the staging table with
+# COPY, from where dlt runs the scd2 merge. "insert_values" is dlt's default.
+loader_file_format = "csv"
+
+# number of shards whose detail pages are crawled in parallel containers and loaded
+# together (see funding_crawler/shards.py), 0 crawls everything in this container
+shards = 0
+
+# persistent crawler state across runs (e.g. validators for conditional re-crawls)
+state_dir = "/state"
+state_volume = modal.Volume.from_name(
+    "cdl_awo_funding_crawler_state", create_if_missing=True
+)
+
 
 @app.function(
     secrets=[
@@ -67,6 +118,7 @@ backup_bucket_name = "foerderdatenbankbackup"
     ],
     schedule=modal.Cron("0 2 */2 * *"),
     timeout=3600,
+    volumes={state_dir: state_volume},
 )
 def crawl():
     local_license_file_name = "LICENSE-DATA"
@@ -74,31 +126,7 @@ def crawl():
     postgres_conn_str = os.getenv("POSTGRES_CONN_STR")
     assert postgres_conn_str
 
-    engine = create_engine(postgres_conn_str)
-
-    # https://neon.com/docs/manage/backup-pg-dump
     date = datetime.now().strftime("%Y%m%d_%H%M%S")
-    local_dump_file_name = "dump"
-    remote_dump_file_name = f"{local_dump_file_name}_{date}"
-
-    print("dumping...")
-    pg_dump_cmd = [
-        "/usr/bin/pg_dump",
-        "-Fc",
-        "-v",
-        "-d",
-        postgres_conn_str,
-        "-f",
-        local_dump_file_name,
-        "--compress=zstd:12",
-    ]
-    result = subprocess.run(pg_dump_cmd, capture_output=True)
-
-    if result.returncode != 0:
-        print(f"pg_dump failed with return code {result.returncode}")
-        print(f"STDERR: {result.stderr.decode('utf-8', errors='replace')}")
-        print(f"STDOUT: {result.stdout.decode('utf-8', errors='replace')}")
-        raise Exception(f"pg_dump failed with return code {result.returncode}")
 
     session = boto3.session.Session()
     client = session.client(
@@ -112,13 +140,26 @@ def crawl():
         ),
     )
 
-    print(
-        f"Uploading {local_dump_file_name} to {remote_dump_file_name} in bucket {backup_bucket_name}"
-    )
-
-    client.upload_file(local_dump_file_name, backup_bucket_name, remote_dump_file_name)
+    # every run backs up its increment, full dumps are only taken weekly
+    remote_increments_dir = "incremental"
+    try:
+        backup_manifest = json.load(
+            client.get_object(
+                Bucket=backup_bucket_name,
+                Key=f"{remote_increments_dir}/{BACKUP_MANIFEST_NAME}",
+            )["Body"]
+        )
+    except client.exceptions.NoSuchKey:
+        backup_manifest = empty_manifest(dataset_name)
 
-    os.remove(local_dump_file_name)
+    # https://neon.com/docs/manage/backup-pg-dump
+    # runs while crawling, the load waits for the dump (see before_load below)
+    backup = None
+    if full_dump_due(backup_manifest):
+        print("dumping...")
+        backup = BackgroundBackup(
+            postgres_conn_str, client, backup_bucket_name, f"dump_{date}", jobs=4
+        ).start()
 
     dlt.config.register_provider(cfg_provider)
 
@@ -127,40 +168,251 @@ def crawl():
         destination=dlt.destinations.postgres(postgres_conn_str),
         dataset_name=dataset_name,
     )
-
-    scraping_host = create_pipeline_runner(
-        pipeline, FundingSpider, batch_size=50, scrapy_settings=scrapy_settings
+    # the programs are loaded as Arrow batches, see PipelineRunner
+    add_arrow_dlt_columns(pipeline)
+
+    crawl_settings = {
+        **scrapy_settings,
+        "CONDITIONAL_RECRAWL_STORE": f"{state_dir}/validators.sqlite",
+        "ARCHIVE_DIR": f"{state_dir}/archive",
+    }
+
+    # pages that fail to parse or validate, re-process with `python -m funding_crawler.quarantine`
+    quarantine = Quarantine(
+        f"{state_dir}/quarantine.sqlite", run_id=date, max_failures=25
     )
 
+    # items that failed the validation are stored with the validators of their
+    # pages, the crawl has to parse these pages again
+    invalid_urls = quarantine.invalid_urls()
+
+    # only new or changed programs are merged, see ChangeDetector
+    detector = ChangeDetector.from_destination(pipeline, dataset_name)
+    crawl_start = datetime.now(timezone.utc)
+
+    runner_kwargs = dict(
+        item_model=FundingProgramSchema,
+        quarantine=quarantine,
+        # Arrow batches skip dlt's row-wise normalization; csv files cannot hold
+        # Arrow list columns, so lists are handed over as JSON strings
+        arrow_schema=pydantic_to_arrow_schema(
+            FundingProgramSchema, json_lists=loader_file_format == "csv"
+        ),
+        batch_filter=detector.filter,
+        before_load=backup.wait_for_dump if backup is not None else None,
+    )
     # https://dlthub.com/docs/general-usage/incremental-loading#scd2-strategy
-    scraping_host.run(
-        columns=FundingProgramSchema,
+    run_kwargs = dict(
+        columns=dlt_columns(FundingProgramSchema),
+        schema_contract=DLT_SCHEMA_CONTRACT,
+        loader_file_format=loader_file_format,
         write_disposition={
             "disposition": "merge",
             "strategy": "scd2",
             "validity_column_names": ["on_website_from", "on_website_to"],
             "row_version_column_name": "checksum",
+            "boundary_timestamp": crawl_start,
         },
     )
 
-    columns = list(FundingProgramSchema.__annotations__.keys())
+    if shards:
+        (start_url,) = resolve_start_urls()
+        # program URLs and hits of the unfiltered search, every URL goes to one shard
+        plan = fetch_plan(start_url, crawl_settings, run_id=date)
+        partition = partition_urls(plan["urls"], shards)
+        invalid = partition_urls(invalid_urls, shards)
+        sharded = shard_settings(crawl_settings, shard_shares(partition))
+        print(f"crawling {len(plan['urls'])} programs in {len(sharded)} shards...")
+        results = list(
+            crawl_shard_remote.starmap(
+                [
+                    (
+                        shard,
+                        partition[shard],
+                        shard_archive(settings, shard),
+                        date,
+                        quarantine.max_failures,
+                        invalid[shard],
+                    )
+                    for shard, settings in sharded.items()
+                ]
+            )
+        )
+        items = merge_items(result.pop("items") for result in results)
+        for result in results:
+            print(
+                f"Shard {result['shard']}: {result['finish_reason']}, {result['unique_urls']} detail pages, {len(result['quarantined'])} quarantined"
+            )
+        # quarantined in the shard containers, see crawl_shard_remote
+        shard_quarantined = [url for result in results for url in result["quarantined"]]
+
+        queue = ScrapingQueue(batch_size=50)
+        pipeline_runner = PipelineRunner(pipeline, queue, **runner_kwargs)
+        # unchanged programs are not loaded, so scd2 must only retire loaded ids
+        pipeline_runner.scraping_resource.apply_hints(merge_key="id_hash")
+        pipeline_worker = pipeline_runner.run(**run_kwargs)
+        try:
+            queue.put_many(items)
+        except QueueClosedError:
+            # the load failed before it took the items, see load_info
+            pass
+        queue.close()
+        pipeline_worker.join()
+
+        # the merged programs must add up to the hits of the unfiltered search
+        crawl_stats = merge_stats(plan, results, len(items))
+        load_info = pipeline_runner.load_info
+    else:
+        shard_quarantined = []
+        forget_validators(
+            crawl_settings["CONDITIONAL_RECRAWL_STORE"], FundingSpider, invalid_urls
+        )
+        scraping_host = create_pipeline_runner(
+            pipeline,
+            FundingSpider,
+            batch_size=50,
+            scrapy_settings=crawl_settings,
+            spider_kwargs={"run_id": date},
+            **runner_kwargs,
+        )
+        # unchanged programs are not loaded, so scd2 must only retire loaded ids
+        scraping_host.pipeline_runner.scraping_resource.apply_hints(merge_key="id_hash")
+        scraping_host.run(**run_kwargs)
+
+        queue = scraping_host.queue
+        crawl_stats = scraping_host.scrapy_runner.stats
+        load_info = scraping_host.pipeline_runner.load_info
+
+    if backup is not None:
+        # the load already waited for the dump, this waits for the upload
+        backup.join()
+        backup_manifest = add_full_dump(backup_manifest, f"{backup.name}.tar")
+        print("Backup uploaded")
 
-    df = pl.read_database(
-        query=gen_query(f"{dataset_name}.{dataset_name}", columns),
-        connection=engine.connect(),
-        execute_options={"parameters": []},
-        schema_overrides=pydantic_to_polars_schema(FundingProgramSchema),
-        infer_schema_length=None,
-        batch_size=10000,
+    print(
+        f"Loaded {detector.forwarded} new or changed of {len(detector.seen)} programs"
     )
 
-    assert len(list(df["id_hash"].unique())) == len(df), "id_hash is not unique!"
+    print(
+        f"Found {crawl_stats.get('funding/unique_urls')} unique program URLs in {crawl_stats.get('funding/total_cards_found')} cards, the website displays {crawl_stats.get('funding/hits_count')} hits"
+    )
 
-    search_url = "https://www.foerderdatenbank.de/SiteGlobals/FDB/Forms/Suche/Foederprogrammsuche_Formular.html?resourceId=0065e6ec-5c0a-4678-b503-b7e7ec435dfd&input_=23adddb0-dcf7-4e32-96f5-93aec5db2716&pageLocale=de&filterCategories=FundingProgram"
-    hits_count = get_hits_count(search_url)
+    if load_info is not None:
+        # pages quarantined by earlier runs whose programs are loaded now, e.g. after
+        # a parser fix; before quarantined programs of this run are marked as seen
+        released = quarantine.release(detector.seen)
+        print(f"Released {len(released)} pages of earlier runs from the quarantine")
+    else:
+        print("Load failed, keeping the quarantined pages of earlier runs")
+
+    # programs that are no longer on the website, only known after a complete crawl
+    finish_reason = crawl_stats.get("finish_reason")
+    if finish_reason == "finished":
+        # quarantined pages are still on the website
+        quarantined = [entry["url"] for entry in quarantine.entries(date)]
+        detector.mark_seen(
+            program_ids(url)[1] for url in quarantined + shard_quarantined
+        )
+        retired = detector.retire(pipeline, dataset_name, crawl_start)
+        print(f"Retired {len(retired)} programs")
+    elif finish_reason == "urls_incomplete":
+        # see FundingSpider.spider_idle, the overview pages missed programs
+        print(
+            f"{crawl_stats.get('funding/missing_urls')} programs of the website are not on the crawled overview pages, not retiring any programs"
+        )
+    else:
+        print(f"Crawl did not finish ({finish_reason}), not retiring any programs")
+
+    entry, backup_manifest = backup_increment(
+        pipeline, dataset_name, "increments", backup_manifest
+    )
+    if entry is not None:
+        for file_name in (entry["rows_file"], entry["retirements_file"]):
+            client.upload_file(
+                os.path.join("increments", file_name),
+                backup_bucket_name,
+                f"{remote_increments_dir}/{file_name}",
+            )
+        print(f"Backed up {entry['rows']} rows and {entry['retirements']} retirements")
+    client.put_object(
+        Bucket=backup_bucket_name,
+        Key=f"{remote_increments_dir}/{BACKUP_MANIFEST_NAME}",
+        Body=json.dumps(backup_manifest, indent=2).encode(),
+        ContentType="application/json",
+    )
+
+    print(
+        f"Queue high-water marks: {queue.max_items_seen} items, {queue.max_bytes_seen} bytes"
+    )
+    print(f"{quarantine.count() + len(shard_quarantined)} pages quarantined")
+    quarantine.close()
+    state_volume.commit()
+
+    columns = list(FundingProgramSchema.__annotations__.keys())
+
+    applied = migrate(pipeline, dataset_name)
+    if applied:
+        print(f"Applied migrations: {applied}")
+
+    # result of gen_query, only recomputed for the programs touched by this run
+    snapshot_name = f"{dataset_name}_snapshot"
+    recomputed = refresh_snapshot(pipeline, dataset_name, snapshot_name, columns)
+    print(f"Refreshed snapshot, recomputed {recomputed} programs")
+
+    # change sets of the runs since the last export, next to the full dumps
+    remote_changes_dir = "data/changes"
+    try:
+        manifest = json.load(
+            client.get_object(
+                Bucket=bucket_name, Key=f"{remote_changes_dir}/{MANIFEST_NAME}"
+            )["Body"]
+        )
+    except client.exceptions.NoSuchKey:
+        manifest = None
+    entries, manifest = export_changes(pipeline, dataset_name, "changes", manifest)
+    for entry in entries:
+        client.upload_file(
+            os.path.join("changes", entry["file"]),
+            bucket_name,
+            f"{remote_changes_dir}/{entry['file']}",
+            ExtraArgs={"ACL": "public-read"},
+        )
+    client.put_object(
+        Bucket=bucket_name,
+        Key=f"{remote_changes_dir}/{MANIFEST_NAME}",
+        Body=json.dumps(manifest, indent=2).encode(),
+        ACL="public-read",
+        ContentType="application/json",
+    )
+    print(f"Exported {len(entries)} change sets")
+
+    # streamed as Arrow batches into a local file, the exports are sunk from it lazily
+    local_export_file_name = "snapshot.arrow"
+    exported = export_to_ipc(
+        postgres_conn_str,
+        # ordered, so unchanged data gives identical files and the upload is skipped
+        f"SELECT * FROM {dataset_name}.{snapshot_name} ORDER BY id_hash",
+        local_export_file_name,
+    )
+    print(f"Exported {exported} programs")
+    # complete schema, no type inference needed
+    lf = scan_export(local_export_file_name, query_polars_schema(FundingProgramSchema))
+
+    counts = lf.select(
+        pl.len().alias("rows"),
+        pl.col("id_hash").n_unique().alias("unique"),
+        pl.col("deleted").not_().sum().alias("not_deleted"),
+    ).collect()
+    not_deleted = counts["not_deleted"][0]
+
+    assert counts["unique"][0] == counts["rows"][0], "id_hash is not unique!"
+
+    # number of programs displayed on the first overview page of the crawl
+    hits_count = crawl_stats.get("funding/hits_count")
+    assert hits_count is not None, "Hits count not found on the overview page"
     assert (
-        abs(len(df.filter(pl.col("deleted") == False)) - hits_count) <= 4  # noqa: E712
-    ), f"Scraped items do not approx. equal amount displayed on website {len(df.filter(pl.col("deleted") == False))}, {hits_count}"  # noqa: E712
+        abs(not_deleted - hits_count) <= 4
+    ), f"Scraped items do not approx. equal amount displayed on website {not_deleted}, {hits_count}"
 
     min_cols = [
         "id_hash",
@@ -179,10 +431,16 @@ def crawl():
     ]
     format_cols = ["description", "more_info", "legal_basis"]
 
-    mindf = df[min_cols]
     print("formatting columns...")
-    for col in format_cols:
-        mindf = mindf.with_columns(pl.col(col).map_elements(md, return_dtype=pl.String))
+    # only new or changed texts are converted, the csv is written from the parquet file
+    markdown_cache = MarkdownCache(f"{state_dir}/markdown.sqlite")
+    # one pool for all batches, it is closed once the frame is sunk
+    with markdown_pool() as pool:
+        format_columns(
+            lf.select(min_cols), format_cols, cache=markdown_cache, pool=pool
+        ).sink_parquet("min_data_format.parquet", engine="streaming")
+    markdown_cache.close()
+    mindf = pl.scan_parquet("min_data_format.parquet")
 
     with open(local_license_file_name, "w") as f:
         f.write(license_content)
@@ -195,36 +453,56 @@ def crawl():
 
         if ext == "csv":
             print("handling list columns")
-            for col in mindf.columns:
-                if mindf[col].dtype == pl.List:
-                    mindf = mindf.with_columns(
-                        pl.col(col)
-                        .list.join(", ")
-                        .alias(col)  # Use original column name
-                    )
-
-            mindf.write_csv(local_data_min_format)
+            join_lists(mindf).sink_csv(local_data_min_format, engine="streaming")
         elif ext == "parquet":
-            df.write_parquet(local_data_name)
-            mindf.write_parquet(local_data_min_format)
+            lf.sink_parquet(local_data_name, engine="streaming")
         else:
             raise
 
-        with zipfile.ZipFile(local_zip_name, "w") as zipf:
-            if ext != "csv":
-                zipf.write(local_data_name, os.path.basename(local_data_name))
-            zipf.write(local_data_min_format, os.path.basename(local_data_min_format))
-            zipf.write(
-                local_license_file_name, os.path.basename(local_license_file_name)
-            )
-
-        print(
-            f"Uploading {local_zip_name} to {remote_zip_name} in bucket {bucket_name}"
-        )
+        zip_files = {
+            os.path.basename(local_data_min_format): local_data_min_format,
+            os.path.basename(local_license_file_name): local_license_file_name,
+        }
+        if ext != "csv":
+            zip_files[os.path.basename(local_data_name)] = local_data_name
+        write_zip(local_zip_name, zip_files)
 
-        client.upload_file(
+        uploaded = upload_if_changed(
+            client,
             local_zip_name,
             bucket_name,
             remote_zip_name,
-            ExtraArgs={"ACL": "public-read"},
+            extra_args={"ACL": "public-read"},
         )
+        print(
+            f"{'Uploaded' if uploaded else 'Skipped unchanged'} {local_zip_name} to {remote_zip_name} in bucket {bucket_name}"
+        )
+
+    # the Markdown cache is only persisted once the exports are published
+    state_volume.commit()
+
+
+@app.function(timeout=3600, volumes={state_dir: state_volume})
+def crawl_shard_remote(
+    shard, urls, settings, run_id, max_failures=None, invalid_urls=None
+):
+    # one validator store, quarantine and archive per shard, containers must not
+    # write the same SQLite file; a shard keeps its URLs while the number of shards
+    # is unchanged
+    settings = {
+        **settings,
+        "CONDITIONAL_RECRAWL_STORE": f"{state_dir}/validators_{shard}.sqlite",
+    }
+    output_path = f"{shard}.jsonl"
+    result = crawl_shard(
+        shard,
+        urls,
+        settings,
+        output_path,
+        run_id,
+        quarantine_path=f"{state_dir}/quarantine_{shard}.sqlite",
+        max_failures=max_failures,
+        invalid_urls=invalid_urls,
+    )
+    state_volume.commit()
+    return {**result, "items": list(read_jsonl(output_path))}
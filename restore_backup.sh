@@ -1,32 +1,48 @@
 #!/bin/bash
 
 # Script to restore PostgreSQL database from backup
-# Usage: ./restore_backup.sh <backup_file> <postgres_conn_str>
+# Usage: ./restore_backup.sh <backup> <postgres_conn_str> [jobs]
+#
+# <backup> is one of
+# - a tar of a directory-format dump (dump_YYYYMMDD_HHMMSS.tar, the current backups)
+# - an extracted directory-format dump
+# - a custom-format dump file (older backups)
 
 set -e
 
-BACKUP_FILE="${1:-backups/dump_20251219_020014}"
+BACKUP="${1:-backups/dump_20251219_020014}"
 POSTGRES_CONN_STR="${2:-$POSTGRES_CONN_STR}"
+JOBS="${3:-4}"
 
 if [ -z "$POSTGRES_CONN_STR" ]; then
     echo "Error: PostgreSQL connection string not provided"
-    echo "Usage: $0 [backup_file] [postgres_conn_str]"
+    echo "Usage: $0 [backup] [postgres_conn_str] [jobs]"
     echo "Or set POSTGRES_CONN_STR environment variable"
     exit 1
 fi
 
-if [ ! -f "$BACKUP_FILE" ]; then
-    echo "Error: Backup file '$BACKUP_FILE' not found"
+if [ ! -e "$BACKUP" ]; then
+    echo "Error: Backup '$BACKUP' not found"
     exit 1
 fi
 
-echo "Backup file: $BACKUP_FILE"
-echo "Restoring database..."
+if [[ -f "$BACKUP" && "$BACKUP" == *.tar ]]; then
+    # pg_restore -j needs the directory, extract the tar first
+    TMP_DIR="$(mktemp -d)"
+    trap 'rm -rf "$TMP_DIR"' EXIT
+    echo "Extracting $BACKUP..."
+    tar -xf "$BACKUP" -C "$TMP_DIR"
+    BACKUP="$(find "$TMP_DIR" -mindepth 1 -maxdepth 1 -type d | head -n 1)"
+fi
+
+echo "Backup: $BACKUP"
+echo "Restoring database with $JOBS jobs..."
 
-# Use pg_restore to restore the custom format dump
+# Use pg_restore to restore the directory or custom format dump
 # -c: Clean (drop) database objects before recreating them
+# -j: Number of parallel jobs
 # -d: Specify database connection string
 # -v: Verbose mode
-pg_restore -c -v -d "$POSTGRES_CONN_STR" "$BACKUP_FILE"
+pg_restore -c -j "$JOBS" -v -d "$POSTGRES_CONN_STR" "$BACKUP"
 
 echo "Database restored successfully!"
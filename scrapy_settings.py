@@ -8,6 +8,12 @@ scrapy_settings = {
     "DOWNLOAD_DELAY": 0.7,
     "RANDOMIZE_DOWNLOAD_DELAY": True,
     "RETRY_TIMES": 5,
+    "FUNDING_PARALLEL_PAGINATION": True,
+    # only active if CONDITIONAL_RECRAWL_STORE / ARCHIVE_DIR are set
+    "DOWNLOADER_MIDDLEWARES": {
+        "funding_crawler.middlewares.ConditionalRecrawlMiddleware": 560,
+        "funding_crawler.middlewares.ArchiveMiddleware": 570,
+    },
     "RETRY_HTTP_CODES": [500, 502, 503, 504, 408, 429, 522, 524],
     "USER_AGENT": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/127.0 Safari/537.36",
     "DEFAULT_REQUEST_HEADERS": {
@@ -0,0 +1,72 @@
+import pytest
+from funding_crawler.dlt_utils.helpers import add_arrow_dlt_columns
+from funding_crawler.dlt_utils.queue import ScrapingQueue
+from funding_crawler.dlt_utils.runner import PipelineRunner
+from funding_crawler.models import FundingProgramSchema
+from funding_crawler.schema import (
+    DLT_SCHEMA_CONTRACT,
+    dlt_columns,
+    pydantic_to_arrow_schema,
+)
+
+
+@pytest.fixture
+def program():
+    """Factory of minimal valid programs in version `version`."""
+
+    def make(id_hash, version, **fields):
+        # the checksum is the scd2 row version, so it must differ between programs
+        return {
+            "id_hash": id_hash,
+            "id_url": id_hash,
+            "url": f"https://example.org/{id_hash}",
+            "title": f"{id_hash} {version}",
+            "description": "description",
+            "checksum": f"{id_hash}{version}",
+            "license_info": "license",
+            **fields,
+        }
+
+    return make
+
+
+@pytest.fixture
+def load():
+    """Load `rows` into the table `programs` at `boundary` like main.py does."""
+
+    def run(pipeline, rows, boundary, batch_filter=None):
+        # DuckDB cannot load csv files, it gets the Arrow list columns as parquet
+        csv = pipeline.destination.destination_type.endswith(".postgres")
+        add_arrow_dlt_columns(pipeline)
+        queue = ScrapingQueue(batch_size=50, read_timeout=0.1)
+        runner = PipelineRunner(
+            pipeline,
+            queue,
+            item_model=FundingProgramSchema,
+            arrow_schema=pydantic_to_arrow_schema(FundingProgramSchema, json_lists=csv),
+            batch_filter=batch_filter,
+        )
+        runner.scraping_resource.apply_hints(merge_key="id_hash")
+        worker = runner.run(
+            table_name="programs",
+            columns=dlt_columns(FundingProgramSchema),
+            schema_contract=DLT_SCHEMA_CONTRACT,
+            loader_file_format="csv" if csv else "parquet",
+            write_disposition={
+                "disposition": "merge",
+                "strategy": "scd2",
+                "validity_column_names": ["on_website_from", "on_website_to"],
+                "row_version_column_name": "checksum",
+                "boundary_timestamp": boundary,
+            },
+        )
+        queue.put_many(rows)
+        queue.close()
+        worker.join()
+
+        # the pipeline thread only logs its errors
+        for step in pipeline.last_trace.steps:
+            assert step.step_exception is None, step.step_exception
+        assert runner.load_info is not None
+
+    return run
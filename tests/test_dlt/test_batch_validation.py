@@ -0,0 +1,132 @@
+import dlt
+import pytest
+from pydantic import ValidationError
+from scrapy.http import HtmlResponse
+from funding_crawler.dlt_utils.helpers import add_arrow_dlt_columns
+from funding_crawler.dlt_utils.queue import ScrapingQueue
+from funding_crawler.dlt_utils.runner import PipelineRunner
+from funding_crawler.models import FundingProgramSchema
+from funding_crawler.spider import FundingSpider
+
+
+def scrape_fixture(path):
+    with open(path) as f:
+        html = f.read()
+
+    response = HtmlResponse(
+        url="https://www.foerderdatenbank.de/FDB/Content/DE/Foerderprogramm/Land/Hessen/fue-unternehmen-hessen-864943.html",
+        body=html,
+        encoding="utf-8",
+    )
+    return list(FundingSpider().parse_details(response))[0]
+
+
+def test_validate_batch():
+    pipeline = dlt.pipeline(pipeline_name="testbatchvalidation", destination="duckdb")
+    runner = PipelineRunner(
+        pipeline=pipeline, queue=ScrapingQueue(), item_model=FundingProgramSchema
+    )
+
+    item = scrape_fixture("tests/test_scrapy/detail_fail_19_12.html")
+
+    rows = runner.validate_batch([item])
+    assert len(rows) == 1
+    assert rows[0]["id_hash"] == item["id_hash"]
+    assert rows[0]["funding_location"] == ["Hessen"]
+    # rows contain every model field, also those missing on the page
+    assert set(rows[0]) == set(FundingProgramSchema.model_fields)
+
+    invalid = {**item, "description": None, "legal_basis": None, "more_info": None}
+    with pytest.raises(ValidationError):
+        runner.validate_batch([item, invalid])
+
+
+def test_arrow_batches():
+    import pyarrow as pa
+    from funding_crawler.schema import pydantic_to_arrow_schema
+
+    schema = pydantic_to_arrow_schema(FundingProgramSchema)
+    assert schema.field("id_hash").type == pa.string()
+    assert not schema.field("id_hash").nullable
+    assert schema.field("funding_type").type == pa.list_(pa.string())
+    assert schema.field("funding_type").nullable
+
+    queue = ScrapingQueue(batch_size=10, read_timeout=0.1)
+    runner = PipelineRunner(
+        pipeline=dlt.pipeline(pipeline_name="testarrowbatches", destination="duckdb"),
+        queue=queue,
+        item_model=FundingProgramSchema,
+        arrow_schema=schema,
+    )
+
+    item = scrape_fixture("tests/test_scrapy/detail_fail_19_12.html")
+    queue.put_many([item, {**item, "id_hash": "other"}])
+    queue.close()
+
+    (table,) = list(runner.batches())
+    assert table.schema == schema
+    assert table.num_rows == 2
+    assert table.column("funding_location").to_pylist() == [["Hessen"], ["Hessen"]]
+
+
+def test_arrow_batches_json_lists():
+    import json
+    import pyarrow as pa
+    from funding_crawler.schema import pydantic_to_arrow_schema
+
+    # csv load files cannot hold list columns
+    schema = pydantic_to_arrow_schema(FundingProgramSchema, json_lists=True)
+    assert schema.field("funding_location").type == pa.string()
+
+    queue = ScrapingQueue(batch_size=10, read_timeout=0.1)
+    runner = PipelineRunner(
+        pipeline=dlt.pipeline(pipeline_name="testarrowjsonlists", destination="duckdb"),
+        queue=queue,
+        item_model=FundingProgramSchema,
+        arrow_schema=schema,
+    )
+
+    item = scrape_fixture("tests/test_scrapy/detail_fail_19_12.html")
+    queue.put_many([item])
+    queue.close()
+
+    (table,) = list(runner.batches())
+    assert table.schema == schema
+    (location,) = table.column("funding_location").to_pylist()
+    assert json.loads(location) == ["Hessen"]
+    assert table.column("title").to_pylist() == [item["title"]]
+
+
+def test_arrow_batches_dlt_columns(tmp_path):
+    from funding_crawler.schema import pydantic_to_arrow_schema
+
+    pipeline = dlt.pipeline(
+        pipeline_name="testarrowdltcolumns",
+        destination=dlt.destinations.duckdb(str(tmp_path / "test.duckdb")),
+        dataset_name="testdataset",
+        pipelines_dir=str(tmp_path),
+    )
+    add_arrow_dlt_columns(pipeline)
+    queue = ScrapingQueue(batch_size=10, read_timeout=0.1)
+    runner = PipelineRunner(
+        pipeline=pipeline,
+        queue=queue,
+        item_model=FundingProgramSchema,
+        arrow_schema=pydantic_to_arrow_schema(FundingProgramSchema),
+    )
+
+    item = scrape_fixture("tests/test_scrapy/detail_fail_19_12.html")
+    queue.put_many([item, {**item, "id_hash": "other"}])
+    queue.close()
+    runner.run(table_name="programs").join()
+
+    # dlt leaves both off Arrow tables by default, the pipeline switched them on
+    with pipeline.sql_client() as client:
+        rows = client.execute_sql(
+            "SELECT _dlt_load_id, _dlt_id FROM testdataset.programs"
+        )
+    assert len(rows) == 2
+    assert {load_id for load_id, _ in rows} == {
+        pipeline.last_trace.last_load_info.loads_ids[0]
+    }
+    assert all(dlt_id for _, dlt_id in rows)
@@ -0,0 +1,30 @@
+import dlt
+from funding_crawler.dlt_utils.queue import ScrapingQueue
+from funding_crawler.dlt_utils.runner import PipelineRunner
+
+
+def test_before_load(tmp_path):
+    pipeline = dlt.pipeline(
+        pipeline_name="testbeforeload",
+        destination=dlt.destinations.duckdb(str(tmp_path / "test.duckdb")),
+        pipelines_dir=str(tmp_path),
+    )
+    queue = ScrapingQueue(batch_size=10, read_timeout=0.1)
+    queued = []
+    runner = PipelineRunner(
+        pipeline=pipeline,
+        queue=queue,
+        # e.g. BackgroundBackup.wait_for_dump, items are queued meanwhile
+        before_load=lambda: queued.append(queue.qsize()),
+    )
+
+    queue.put_many([{"id": 1}, {"id": 2}])
+    queue.close()
+    runner.run().join()
+
+    assert queued == [2]
+    with pipeline.sql_client() as client:
+        ((count,),) = client.execute_sql(
+            f"SELECT COUNT(*) FROM {client.make_qualified_table_name('testbeforeload_results')}"
+        )
+    assert count == 2
@@ -0,0 +1,76 @@
+import os
+from datetime import datetime, timezone
+import dlt
+from funding_crawler.delta import ChangeDetector
+
+table_name = "programs"
+
+
+def test_change_detection(tmp_path, program, load):
+    pipeline = dlt.pipeline(
+        pipeline_name="testchangedetection",
+        destination=dlt.destinations.duckdb(str(tmp_path / "test.duckdb")),
+        dataset_name="testdataset",
+        pipelines_dir=str(tmp_path),
+    )
+    first = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    second = datetime(2026, 1, 3, tzinfo=timezone.utc)
+
+    detector = ChangeDetector.from_destination(pipeline, table_name)
+    assert detector.current == {}
+    load(
+        pipeline,
+        [program("a", "1"), program("b", "1"), program("c", "1")],
+        first,
+        detector.filter,
+    )
+
+    # second crawl: a unchanged, b changed, c gone
+    detector = ChangeDetector.from_destination(pipeline, table_name)
+    assert detector.current == {"a": "a1", "b": "b1", "c": "c1"}
+    load(pipeline, [program("a", "1"), program("b", "2")], second, detector.filter)
+    assert detector.forwarded == 1
+
+    assert detector.retire(pipeline, table_name, second) == {"c"}
+
+    with pipeline.sql_client() as client:
+        rows = client.execute_sql(
+            "SELECT id_hash, checksum, on_website_to FROM programs ORDER BY id_hash, checksum"
+        )
+
+    assert [(id_hash, checksum, to is None) for id_hash, checksum, to in rows] == [
+        ("a", "a1", True),
+        ("b", "b1", False),
+        ("b", "b2", True),
+        ("c", "c1", False),
+    ]
+    assert all(to == second for _, _, to in rows if to is not None)
+
+    os.remove(str(tmp_path / "test.duckdb"))
+
+
+def test_retire_empty_crawl(tmp_path, program, load):
+    pipeline = dlt.pipeline(
+        pipeline_name="testretireempty",
+        destination=dlt.destinations.duckdb(str(tmp_path / "test.duckdb")),
+        dataset_name="testdataset",
+        pipelines_dir=str(tmp_path),
+    )
+    first = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    second = datetime(2026, 1, 3, tzinfo=timezone.utc)
+
+    # nothing loaded yet: the table does not exist, there is nothing to retire
+    detector = ChangeDetector.from_destination(pipeline, table_name)
+    assert detector.retire(pipeline, table_name, first) == set()
+
+    load(pipeline, [program("a", "1"), program("b", "1")], first)
+
+    # a crawl that saw no program retires all current programs
+    detector = ChangeDetector.from_destination(pipeline, table_name)
+    assert detector.retire(pipeline, table_name, second) == {"a", "b"}
+    assert detector.current == {}
+
+    with pipeline.sql_client() as client:
+        rows = client.execute_sql("SELECT id_hash, on_website_to FROM programs")
+    assert sorted(rows) == [("a", second), ("b", second)]
+    assert ChangeDetector.from_destination(pipeline, table_name).current == {}
@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+import polars as pl
+import dlt
+from funding_crawler.changes import export_changes
+from funding_crawler.delta import ChangeDetector
+
+
+def crawl(pipeline, load, rows, day):
+    # a complete crawl of main.py: changed programs are loaded, absent ones retired
+    boundary = datetime(2026, 1, day, tzinfo=timezone.utc)
+    detector = ChangeDetector.from_destination(pipeline, "programs")
+    load(pipeline, rows, boundary, detector.filter)
+    detector.retire(pipeline, "programs", boundary)
+
+
+def test_export_changes(tmp_path, program, load):
+    pipeline = dlt.pipeline(
+        pipeline_name="testchanges",
+        destination=dlt.destinations.duckdb(str(tmp_path / "test.duckdb")),
+        dataset_name="testdataset",
+        pipelines_dir=str(tmp_path),
+    )
+    directory = str(tmp_path / "changes")
+
+    crawl(pipeline, load, [program(x, "1") for x in "abc"], 1)
+    entries, manifest = export_changes(pipeline, "programs", directory)
+    assert [(e["inserted"], e["updated"], e["retired"]) for e in entries] == [(3, 0, 0)]
+
+    # b changed, c was retired and d is new, a is unchanged
+    crawl(pipeline, load, [program("a", "1"), program("b", "2"), program("d", "1")], 2)
+    # a run that only retires, d is gone
+    crawl(pipeline, load, [program("a", "1"), program("b", "2")], 3)
+
+    entries, manifest = export_changes(pipeline, "programs", directory, manifest)
+    assert [(e["inserted"], e["updated"], e["retired"]) for e in entries] == [
+        (1, 1, 1),
+        (0, 0, 1),
+    ]
+    assert len(manifest["runs"]) == 3
+    # nothing was loaded in the last run, its file is named after the boundary
+    boundary = datetime(2026, 1, 3, tzinfo=timezone.utc)
+    assert entries[1]["file"] == f"{boundary.timestamp():.6f}.parquet"
+
+    changes = pl.read_parquet(f"{directory}/{entries[0]['file']}")
+    assert sorted(zip(changes["id_hash"], changes["change"], changes["checksum"])) == [
+        ("b", "update", "b2"),
+        ("c", "retire", "c1"),
+        ("d", "insert", "d1"),
+    ]
+
+    # nothing new since the last export
+    assert export_changes(pipeline, "programs", directory, manifest)[0] == []
+
+
+def test_export_changes_first_run(tmp_path, program, load):
+    pipeline = dlt.pipeline(
+        pipeline_name="testchangesfirstrun",
+        destination=dlt.destinations.duckdb(str(tmp_path / "test.duckdb")),
+        dataset_name="testdataset",
+        pipelines_dir=str(tmp_path),
+    )
+    crawl(pipeline, load, [program(x, "1") for x in "abc"], 1)
+    crawl(pipeline, load, [program("a", "2"), program("b", "1")], 2)
+
+    # the feed starts with the latest run
+    entries, manifest = export_changes(pipeline, "programs", str(tmp_path / "latest"))
+    assert [(e["inserted"], e["updated"], e["retired"]) for e in entries] == [(0, 1, 1)]
+    assert manifest["runs"] == entries
+
+    entries, _ = export_changes(
+        pipeline, "programs", str(tmp_path / "backfill"), backfill=True
+    )
+    assert [(e["inserted"], e["updated"], e["retired"]) for e in entries] == [
+        (3, 0, 0),
+        (0, 1, 1),
+    ]
@@ -0,0 +1,119 @@
+from datetime import datetime, timezone
+import dlt
+from funding_crawler.compaction import compact
+from funding_crawler.delta import ChangeDetector
+
+
+def day(n):
+    return datetime(2026, 1, n, tzinfo=timezone.utc)
+
+
+def versions(pipeline, id_hash):
+    with pipeline.sql_client() as client:
+        return client.execute_sql(
+            "SELECT checksum, on_website_from, on_website_to FROM testdataset.programs WHERE id_hash = %s ORDER BY on_website_from, checksum",
+            id_hash,
+        )
+
+
+def test_compaction(tmp_path, program, load):
+    pipeline = dlt.pipeline(
+        pipeline_name="testcompaction",
+        destination=dlt.destinations.duckdb(str(tmp_path / "test.duckdb")),
+        dataset_name="testdataset",
+        pipelines_dir=str(tmp_path),
+    )
+
+    # a flips between label and code before a genuine change of its title,
+    # c is off the website on day 2 and comes back unchanged
+    crawls = [
+        [
+            program("a", "1", funding_area=["Arbeit"], title="title"),
+            program("b", "1", funding_area=["Beratung"], title="title"),
+            program("c", "1", funding_area=["Arbeit"], title="title"),
+        ],
+        [
+            program("a", "2", funding_area=["arbeit"], title="title"),
+            program("b", "1", funding_area=["Beratung"], title="title"),
+        ],
+        [
+            program("a", "3", funding_area=["Arbeit"], title="title"),
+            program("b", "1", funding_area=["Beratung"], title="title"),
+            program("c", "2", funding_area=["Arbeit"], title="title"),
+        ],
+        [
+            program("a", "4", funding_area=["Arbeit"], title="new title"),
+            program("b", "1", funding_area=["Beratung"], title="title"),
+            program("c", "2", funding_area=["Arbeit"], title="title"),
+        ],
+    ]
+    for n, rows in enumerate(crawls, start=1):
+        detector = ChangeDetector.from_destination(pipeline, "programs")
+        load(pipeline, rows, day(n), detector.filter)
+        detector.retire(pipeline, "programs", day(n))
+
+    # an exact duplicate of the current version of b
+    with pipeline.sql_client() as client:
+        client.execute_sql(
+            "INSERT INTO testdataset.programs SELECT * REPLACE ('duplicate' AS _dlt_id) FROM testdataset.programs WHERE id_hash = 'b'"
+        )
+
+    # pages smaller than the table
+    dry_run = compact(pipeline, "programs", dry_run=True, chunk_size=3)
+    assert dry_run == {"versions": 8, "deleted": 3, "restitched": 1}
+    assert len(versions(pipeline, "b")) == 2
+
+    assert compact(pipeline, "programs") == dry_run
+
+    # the flip-flop is merged into its latest version, the genuine change is kept
+    assert versions(pipeline, "a") == [("a3", day(1), day(4)), ("a4", day(4), None)]
+    assert versions(pipeline, "b") == [("b1", day(1), None)]
+    # the gap in the history of c is kept
+    assert versions(pipeline, "c") == [("c1", day(1), day(2)), ("c2", day(3), None)]
+
+    # compaction is idempotent
+    assert compact(pipeline, "programs") == {
+        "versions": 5,
+        "deleted": 0,
+        "restitched": 0,
+    }
+
+
+def test_compaction_islands(tmp_path, program, load):
+    pipeline = dlt.pipeline(
+        pipeline_name="testcompactionislands",
+        destination=dlt.destinations.duckdb(str(tmp_path / "test.duckdb")),
+        dataset_name="testdataset",
+        pipelines_dir=str(tmp_path),
+    )
+
+    # versions 1 and 2 only differ by code and label, version 3 changes the
+    # title and version 4 changes it back to the content of versions 1 and 2
+    for n, (area, title) in enumerate(
+        [
+            ("Arbeit", "title"),
+            ("arbeit", "title"),
+            ("Arbeit", "other"),
+            ("Arbeit", "title"),
+        ],
+        start=1,
+    ):
+        load(
+            pipeline,
+            [program("a", str(n), funding_area=[area], title=title)],
+            day(n),
+        )
+
+    assert compact(pipeline, "programs") == {
+        "versions": 4,
+        "deleted": 1,
+        "restitched": 1,
+    }
+
+    # adjacent equal versions are one island, equal content after another
+    # version is a new island
+    assert versions(pipeline, "a") == [
+        ("a2", day(1), day(3)),
+        ("a3", day(3), day(4)),
+        ("a4", day(4), None),
+    ]
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta, timezone
+import dlt
+from funding_crawler.delta import ChangeDetector
+from funding_crawler.incremental_backup import (
+    add_full_dump,
+    backup_increment,
+    empty_manifest,
+    full_dump_due,
+    restore,
+)
+
+
+def read(pipeline):
+    with pipeline.sql_client() as client:
+        rows = client.execute_sql(
+            f"SELECT _dlt_id, _dlt_load_id, id_hash, checksum, on_website_from, on_website_to FROM {client.make_qualified_table_name('programs')}"
+        )
+    return sorted(tuple(map(str, row)) for row in rows)
+
+
+def make_pipeline(tmp_path, name):
+    return dlt.pipeline(
+        pipeline_name=name,
+        destination=dlt.destinations.duckdb(str(tmp_path / f"{name}.duckdb")),
+        dataset_name="testdataset",
+        pipelines_dir=str(tmp_path / name),
+    )
+
+
+def test_incremental_backup(tmp_path, program, load):
+    pipeline = make_pipeline(tmp_path, "testincrementalbackup")
+    directory = str(tmp_path / "increments")
+    manifest = None
+
+    # rows and retirements of every increment, None if nothing changed
+    crawls = [
+        ([program(x, "1") for x in "abc"], (3, 0)),
+        # b changed and c was retired
+        ([program("a", "1"), program("b", "2")], (1, 2)),
+        # nothing changed
+        ([program("a", "1"), program("b", "2")], None),
+        # only a was retired
+        ([program("b", "2")], (0, 1)),
+    ]
+    for day, (rows, expected) in enumerate(crawls, start=1):
+        boundary = datetime(2026, 1, day, tzinfo=timezone.utc)
+        detector = ChangeDetector.from_destination(pipeline, "programs")
+        load(pipeline, rows, boundary, detector.filter)
+        detector.retire(pipeline, "programs", boundary)
+
+        entry, manifest = backup_increment(pipeline, "programs", directory, manifest)
+        if expected is None:
+            assert entry is None
+        else:
+            assert (entry["rows"], entry["retirements"]) == expected
+    assert len(manifest["increments"]) == 3
+
+    restored = make_pipeline(tmp_path, "testrestore")
+    assert restore(restored, "programs", directory, manifest) == 3
+    assert read(restored) == read(pipeline)
+    # the restored table continues the chain of increments
+    assert backup_increment(restored, "programs", directory, manifest)[0] is None
+
+
+def test_restore_retirements_only(tmp_path, program, load):
+    pipeline = make_pipeline(tmp_path, "testbackupretirements")
+    directory = str(tmp_path / "increments")
+    first = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    second = datetime(2026, 1, 2, tzinfo=timezone.utc)
+
+    load(pipeline, [program("a", "1"), program("b", "1")], first)
+    _, manifest = backup_increment(pipeline, "programs", directory)
+    restored = make_pipeline(tmp_path, "testrestoreretirements")
+    assert restore(restored, "programs", directory, manifest) == 1
+
+    # a run that loads nothing and only retires b
+    detector = ChangeDetector.from_destination(pipeline, "programs")
+    detector.mark_seen(["a"])
+    assert detector.retire(pipeline, "programs", second) == {"b"}
+    entry, manifest = backup_increment(pipeline, "programs", directory, manifest)
+    assert (entry["rows"], entry["retirements"]) == (0, 1)
+
+    # on top of the restored table, only the retirement is replayed
+    assert restore(restored, "programs", directory, manifest, skip=1) == 1
+    assert read(restored) == read(pipeline)
+
+
+def test_full_dump_due():
+    now = datetime(2026, 1, 10, tzinfo=timezone.utc)
+    manifest = empty_manifest("programs")
+    assert full_dump_due(manifest, now)
+
+    manifest = add_full_dump(manifest, "dump.tar", created_at=now - timedelta(days=2))
+    assert manifest["full_dumps"][0]["increments"] == 0
+    assert not full_dump_due(manifest, now)
+    assert full_dump_due(manifest, now + timedelta(days=5))
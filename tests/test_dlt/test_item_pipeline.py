@@ -0,0 +1,34 @@
+import pytest
+from scrapy.utils.test import get_crawler
+from funding_crawler.dlt_utils.pipelines import QueueItemPipeline
+from funding_crawler.dlt_utils.queue import ScrapingQueue
+from funding_crawler.spider import FundingSpider
+
+
+def create_pipeline(queue):
+    crawler = get_crawler(FundingSpider, {"SCRAPING_QUEUE_CHUNK_SIZE": 3})
+    crawler.spider = FundingSpider.from_crawler(crawler, scraping_queue=queue)
+    return QueueItemPipeline.from_crawler(crawler)
+
+
+def test_queue_item_pipeline():
+    crawler = get_crawler(FundingSpider)
+    crawler.spider = FundingSpider.from_crawler(crawler)
+    with pytest.raises(ValueError, match="scraping_queue"):
+        QueueItemPipeline.from_crawler(crawler)
+
+    queue_a, queue_b = ScrapingQueue(), ScrapingQueue()
+    pipeline_a, pipeline_b = create_pipeline(queue_a), create_pipeline(queue_b)
+
+    for i in range(4):
+        assert pipeline_a.process_item({"id": i}, None) == {"id": i}
+    pipeline_b.process_item({"id": "b"}, None)
+
+    # items are handed over in chunks, each pipeline feeds its own queue only
+    assert queue_a.qsize() == 3
+    assert queue_b.qsize() == 0
+
+    pipeline_a.close_spider(None)
+    pipeline_b.close_spider(None)
+    assert queue_a.get_many(10, 0) == [{"id": i} for i in range(4)]
+    assert queue_b.get_many(10, 0) == [{"id": "b"}]
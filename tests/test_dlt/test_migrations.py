@@ -0,0 +1,66 @@
+import os
+from datetime import datetime, timezone
+import dlt
+import pytest
+from funding_crawler.migrations import MIGRATIONS, MIGRATIONS_TABLE, migrate
+
+postgres_conn_str = os.getenv("POSTGRES_CONN_STR")
+
+
+def test_migrate_skips_other_destinations(tmp_path, program, load):
+    pipeline = dlt.pipeline(
+        pipeline_name="testmigrationsduckdb",
+        destination=dlt.destinations.duckdb(str(tmp_path / "test.duckdb")),
+        dataset_name="testdataset",
+        pipelines_dir=str(tmp_path),
+    )
+    load(pipeline, [program("a", "1")], datetime(2026, 1, 1, tzinfo=timezone.utc))
+
+    assert migrate(pipeline, "programs") == []
+    with pipeline.sql_client() as client:
+        assert not client.execute_sql(
+            "SELECT 1 FROM information_schema.tables WHERE table_name = %s",
+            MIGRATIONS_TABLE,
+        )
+
+
+@pytest.mark.skipif(postgres_conn_str is None, reason="POSTGRES_CONN_STR is not set")
+def test_migrate_postgres(tmp_path, program, load):
+    pipeline = dlt.pipeline(
+        pipeline_name="testmigrationspostgres",
+        destination=dlt.destinations.postgres(postgres_conn_str),
+        dataset_name="testdataset",
+        pipelines_dir=str(tmp_path),
+        dev_mode=True,
+    )
+    load(
+        pipeline,
+        [program("a", "1"), program("b", "1")],
+        datetime(2026, 1, 1, tzinfo=timezone.utc),
+    )
+
+    assert migrate(pipeline, "programs") == list(MIGRATIONS)
+    # applied migrations are recorded and skipped in later runs
+    assert migrate(pipeline, "programs") == []
+
+    with pipeline.sql_client() as client:
+        migrations_table = client.make_qualified_table_name(MIGRATIONS_TABLE)
+        rows = client.execute_sql(
+            f"SELECT table_name, version FROM {migrations_table} ORDER BY version"
+        )
+        indexes = client.execute_sql(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = %s AND tablename = %s",
+            pipeline.dataset_name,
+            "programs",
+        )
+
+    assert [tuple(row) for row in rows] == [("programs", v) for v in MIGRATIONS]
+    indexes = dict(indexes)
+    assert {
+        "programs_id_hash_on_website_to_idx",
+        "programs_id_hash_checksum_load_id_idx",
+        "programs_current_id_hash_idx",
+        "programs_load_id_idx",
+    } <= set(indexes)
+    # the Arrow batches of the load fixture carry the load id, like in main.py
+    assert "(_dlt_load_id)" in indexes["programs_load_id_idx"]
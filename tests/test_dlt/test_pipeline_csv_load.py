@@ -0,0 +1,100 @@
+import os
+from datetime import datetime, timezone
+import dlt
+import pytest
+from funding_crawler.dlt_utils.helpers import add_arrow_dlt_columns
+from funding_crawler.dlt_utils.queue import ScrapingQueue
+from funding_crawler.dlt_utils.runner import PipelineRunner
+from funding_crawler.models import FundingProgramSchema
+from funding_crawler.schema import (
+    DLT_SCHEMA_CONTRACT,
+    dlt_columns,
+    pydantic_to_arrow_schema,
+)
+
+postgres_conn_str = os.getenv("POSTGRES_CONN_STR")
+
+
+def program(id_hash, version):
+    return {
+        "id_hash": id_hash,
+        "id_url": id_hash,
+        "url": f"https://example.org/{id_hash}",
+        "title": f"{id_hash} {version}",
+        "description": "<p>description</p>",
+        "funding_location": ["Bund", "Hessen"],
+        "funding_type": None,
+        "checksum": f"{id_hash}{version}",
+        "license_info": "license",
+    }
+
+
+def load(pipeline, rows, day):
+    # the load of main.py: Arrow batches with JSON lists, csv files and scd2
+    add_arrow_dlt_columns(pipeline)
+    queue = ScrapingQueue(batch_size=50, read_timeout=0.1)
+    runner = PipelineRunner(
+        pipeline,
+        queue,
+        item_model=FundingProgramSchema,
+        arrow_schema=pydantic_to_arrow_schema(FundingProgramSchema, json_lists=True),
+    )
+    runner.scraping_resource.apply_hints(merge_key="id_hash")
+    worker = runner.run(
+        table_name="programs",
+        columns=dlt_columns(FundingProgramSchema),
+        schema_contract=DLT_SCHEMA_CONTRACT,
+        loader_file_format="csv",
+        write_disposition={
+            "disposition": "merge",
+            "strategy": "scd2",
+            "validity_column_names": ["on_website_from", "on_website_to"],
+            "row_version_column_name": "checksum",
+            "boundary_timestamp": datetime(2026, 1, day, tzinfo=timezone.utc),
+        },
+    )
+    queue.put_many(rows)
+    queue.close()
+    worker.join()
+
+
+@pytest.mark.skipif(postgres_conn_str is None, reason="POSTGRES_CONN_STR is not set")
+def test_csv_load_postgres(tmp_path):
+    pipeline = dlt.pipeline(
+        pipeline_name="testcsvload",
+        destination=dlt.destinations.postgres(postgres_conn_str),
+        dataset_name="testcsvload",
+        pipelines_dir=str(tmp_path),
+        dev_mode=True,
+    )
+    load(pipeline, [program("a", "1"), program("b", "1")], 1)
+    load(pipeline, [program("a", "2"), program("b", "1")], 2)
+
+    with pipeline.sql_client() as client:
+        columns = dict(
+            client.execute_sql(
+                "SELECT column_name, data_type FROM information_schema.columns WHERE table_schema = %s AND table_name = %s",
+                pipeline.dataset_name,
+                "programs",
+            )
+        )
+        rows = client.execute_sql(
+            f"""SELECT id_hash, checksum, funding_location, jsonb_typeof(funding_location),
+            funding_type, on_website_to IS NULL, _dlt_load_id, _dlt_id
+            FROM {client.make_qualified_table_name('programs')} ORDER BY id_hash, checksum"""
+        )
+
+    # types of dlt_columns, not inferred from the csv files
+    assert columns["title"] == "character varying"
+    assert columns["funding_location"] == columns["funding_type"] == "jsonb"
+    assert columns["on_website_from"] == "timestamp with time zone"
+    assert columns["_dlt_load_id"] == columns["_dlt_id"] == "character varying"
+
+    # lists arrive as jsonb arrays, not as JSON encoded strings
+    assert [row[:6] for row in rows] == [
+        ("a", "a1", ["Bund", "Hessen"], "array", None, False),
+        ("a", "a2", ["Bund", "Hessen"], "array", None, True),
+        ("b", "b1", ["Bund", "Hessen"], "array", None, True),
+    ]
+    assert rows[0][6] < rows[1][6] == max(row[6] for row in rows)
+    assert len({row[7] for row in rows}) == 3
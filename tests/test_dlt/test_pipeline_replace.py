@@ -27,7 +27,11 @@ def test_pipeline():
     }
 
     scraping_host = create_pipeline_runner(
-        pipeline, FundingSpider, batch_size=10, scrapy_settings=scrapy_settings
+        pipeline,
+        FundingSpider,
+        batch_size=10,
+        scrapy_settings=scrapy_settings,
+        item_model=FundingProgramSchema,
     )
 
     scraping_host.pipeline_runner.scraping_resource.add_limit(5)
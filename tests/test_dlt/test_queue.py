@@ -0,0 +1,101 @@
+import threading
+import time
+import pytest
+from funding_crawler.dlt_utils.queue import QueueClosedError, ScrapingQueue
+
+
+def test_get_many():
+    queue = ScrapingQueue(batch_size=3, read_timeout=0.2)
+    for i in range(5):
+        queue.put(i)
+
+    # full batches are returned right away
+    start = time.monotonic()
+    assert queue.get_many(3, 10) == [0, 1, 2]
+    assert time.monotonic() - start < 1
+
+    # incomplete batches are flushed after the maximum batch latency
+    start = time.monotonic()
+    assert queue.get_many(3, 0.2) == [3, 4]
+    assert time.monotonic() - start >= 0.2
+
+    # items are marked as done
+    queue.join()
+
+
+def test_get_batches_close():
+    queue = ScrapingQueue(batch_size=10, read_timeout=5)
+    batches = []
+
+    consumer = threading.Thread(target=lambda: batches.extend(queue.get_batches()))
+    consumer.start()
+
+    for i in range(25):
+        queue.put(i)
+
+    # closing wakes up the consumer, which drains the remaining items
+    # without waiting for the batch latency
+    start = time.monotonic()
+    queue.close()
+    consumer.join(timeout=2)
+    assert not consumer.is_alive()
+    assert time.monotonic() - start < 2
+
+    assert [item for batch in batches for item in batch] == list(range(25))
+    assert [len(batch) for batch in batches][:2] == [10, 10]
+    queue.join()
+
+
+def test_stream_exit_discards():
+    queue = ScrapingQueue(batch_size=2, read_timeout=0.1)
+    for i in range(5):
+        queue.put(i)
+
+    stream = queue.stream()
+    assert next(stream) == [0, 1]
+    stream.close()
+
+    assert queue.is_closed
+    # join does not hang on items nobody consumes anymore
+    queue.join()
+
+
+def test_put_after_close():
+    queue = ScrapingQueue()
+    queue.put(1)
+    queue.close()
+
+    # nobody consumes a closed queue, items put now would be lost silently
+    with pytest.raises(QueueClosedError):
+        queue.put(2)
+    with pytest.raises(QueueClosedError):
+        queue.put_many([3, 4])
+    assert queue.get_many(10, 0) == [1]
+
+
+def test_byte_bound():
+    item = {"url": "x" * 100, "description": "y" * 900}
+    queue = ScrapingQueue(batch_size=2, read_timeout=0.1, max_bytes=3000)
+
+    drained = []
+    queue.add_drain_listener(lambda: drained.append(True))
+    assert drained == [True]  # called right away if there is room
+    drained.clear()
+
+    for _ in range(3):
+        queue.put(item)
+
+    # put does not block, producers check is_full instead
+    assert queue.is_full
+    assert queue.bytes >= 3000
+    queue.add_drain_listener(lambda: drained.append(True))
+
+    queue.get_many(1, 0)
+    assert not queue.is_full
+    assert drained == []  # waits until half of the capacity is free
+
+    queue.get_many(1, 0)
+    assert drained == [True]
+
+    assert queue.max_items_seen == 3
+    assert queue.max_bytes_seen == 3 * queue.bytes
@@ -0,0 +1,81 @@
+from datetime import datetime, timezone
+import dlt
+from funding_crawler.delta import ChangeDetector
+from funding_crawler.helpers import gen_query
+from funding_crawler.snapshot import STATE_TABLE, refresh_snapshot
+
+columns = ["id_hash", "title", "checksum"]
+
+
+def read(pipeline, query):
+    with pipeline.sql_client() as client:
+        rows = client.execute_sql(query)
+    return sorted(tuple(map(str, row)) for row in rows)
+
+
+def test_incremental_snapshot(tmp_path, program, load):
+    pipeline = dlt.pipeline(
+        pipeline_name="testsnapshot",
+        destination=dlt.destinations.duckdb(str(tmp_path / "test.duckdb")),
+        dataset_name="testdataset",
+        pipelines_dir=str(tmp_path),
+    )
+    days = [datetime(2026, 1, day, tzinfo=timezone.utc) for day in (1, 3, 5)]
+
+    load(pipeline, [program(x, "1") for x in "abcd"], days[0])
+    assert refresh_snapshot(pipeline, "programs", "programs_snapshot", columns) is None
+
+    # two complete crawls: b changes twice, d and then c are retired, e is new
+    for day, rows in zip(
+        days[1:],
+        [
+            [program("a", "1"), program("b", "2"), program("c", "1")],
+            [program("a", "1"), program("b", "3"), program("e", "1")],
+        ],
+    ):
+        detector = ChangeDetector.from_destination(pipeline, "programs")
+        load(pipeline, rows, day, detector.filter)
+        detector.retire(pipeline, "programs", day)
+
+    # b, c, d and e were touched since the last refresh, a was not
+    recomputed = refresh_snapshot(pipeline, "programs", "programs_snapshot", columns)
+    assert recomputed == 4
+
+    snapshot = read(pipeline, "SELECT * FROM testdataset.programs_snapshot")
+    full = read(pipeline, gen_query("testdataset.programs", columns))
+    assert snapshot == full
+    assert len(snapshot) == 5
+
+    # nothing changed since the last refresh
+    assert refresh_snapshot(pipeline, "programs", "programs_snapshot", columns) == 0
+
+
+def test_snapshot_watermark_same_second(tmp_path, program, load, monkeypatch):
+    # dlt load ids are Unix timestamps, both loads happen within one second
+    load_ids = iter(f"1767225600.{n}" for n in range(1, 10))
+    monkeypatch.setattr("dlt.extract.storage.create_load_id", lambda: next(load_ids))
+    pipeline = dlt.pipeline(
+        pipeline_name="testsnapshotsecond",
+        destination=dlt.destinations.duckdb(str(tmp_path / "test.duckdb")),
+        dataset_name="testdataset",
+        pipelines_dir=str(tmp_path),
+    )
+    boundary = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    # first run: no watermark yet, the snapshot is built from scratch
+    load(pipeline, [program("a", "1"), program("b", "1")], boundary)
+    assert refresh_snapshot(pipeline, "programs", "programs_snapshot", columns) is None
+    ((first_load_id,),) = read(pipeline, f"SELECT last_load_id FROM {STATE_TABLE}")
+
+    load(pipeline, [program("b", "2")], boundary.replace(hour=1))
+    ((second_load_id,),) = read(
+        pipeline, "SELECT MAX(_dlt_load_id) FROM testdataset.programs"
+    )
+    assert first_load_id.split(".")[0] == second_load_id.split(".")[0]
+    assert second_load_id > first_load_id
+
+    # the later load id of the same second is past the watermark
+    assert refresh_snapshot(pipeline, "programs", "programs_snapshot", columns) == 1
+    assert read(pipeline, "SELECT * FROM testdataset.programs_snapshot") == read(
+        pipeline, gen_query("testdataset.programs", columns)
+    )
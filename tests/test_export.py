@@ -0,0 +1,38 @@
+from datetime import datetime, timezone
+import polars as pl
+import pyarrow as pa
+import pyarrow.ipc
+from funding_crawler.export import join_lists, scan_export
+
+
+def test_scan_export(tmp_path):
+    # like ADBC reads the snapshot: jsonb as text, timestamp arrays as lists
+    table = pa.table(
+        {
+            "id_hash": ["a", "b"],
+            "funding_area": ['["Arbeit", "Beratung"]', None],
+            "previous_update_dates": pa.array(
+                [[datetime(2026, 1, 1, tzinfo=timezone.utc)], []],
+                pa.list_(pa.timestamp("us", tz="UTC")),
+            ),
+        }
+    )
+    path = tmp_path / "snapshot.arrow"
+    with pa.ipc.new_file(str(path), table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=1):
+            writer.write_batch(batch)
+
+    schema = {
+        "id_hash": pl.Utf8,
+        "funding_area": pl.List(pl.Utf8),
+        "previous_update_dates": pl.List(pl.Datetime("us", "UTC")),
+        "title": pl.Utf8,
+    }
+    lf = scan_export(str(path), schema)
+
+    df = lf.collect()
+    assert df["funding_area"].to_list() == [["Arbeit", "Beratung"], None]
+    assert df.schema["previous_update_dates"] == pl.List(pl.Datetime("us", "UTC"))
+
+    csv = join_lists(lf.select("id_hash", "funding_area")).collect()
+    assert csv["funding_area"].to_list() == ["Arbeit, Beratung", None]
@@ -1,4 +1,12 @@
+import polars as pl
 from markdownify import markdownify as md
+from funding_crawler import formatting
+from funding_crawler.formatting import (
+    MarkdownCache,
+    format_columns,
+    markdown_pool,
+    to_markdown,
+)
 
 html1 = """
 <div class="content"> <div class="rich--text"> <h5 class=""> Rechtsgrundlage</h5> <p> Richtlinie zur Förderung der Gesundheit und Robustheit landwirtschaftlicher Nutztiere (NuTieFöRL M-V)<strong><br> </strong><span>vom: 20.08.2022 – VI 320-2<br> Verwaltungsvorschrift des Ministeriums für Klimaschutz, Landwirtschaft, ländliche Räume und Umwelt<br> </span><span><abbr class="" title="Verwaltungsvorschrift">VV</abbr> Meckl.-Vorp. Gl.-<abbr class="" title="Nummer">Nr.</abbr> 630 - 420<br> Fundstelle: AmtsBl. M-V 2022 <abbr class="" title="Seite">S.</abbr> 548<br> </span></p> <p> <span><span>Der Antrag ist vollständig bis zum 30. November für das jeweils folgende Jahr bei der Bewilligungsbehörde einzureichen.</span></span></p> <p> <span><span><a class="RichTextExtLink ExternalLink" href="https://www.landesrecht-mv.de/bsmv/document/VVMV-VVMV000010894" title="Richtlinie zur Förderung der Gesundheit und Robustheit landwirtschaftlicher Nutztiere (NuTieFöRL M-V) vom: 20.08.2022 – VI 320-2 Verwaltungsvorschrift des Ministeriums für Klimaschutz, Landwirtschaft, ländliche Räume und Umwelt VV Meckl.-Vorp. Gl.-Nr. 630 - 420 Fundstelle: AmtsBl. M-V 2022 S. 548">Weblink zur Förderrichtlinie</a></span></span></p> </div> </div>
@@ -13,3 +21,42 @@ def test_format():
     print(md(html1))
     print("\n\n")
     print(md(html2))
+
+
+def test_to_markdown(tmp_path, monkeypatch):
+    values = [html1, html2, html1, f"<p>{html2}</p>"]
+    expected = [md(v) for v in values]
+
+    cache = MarkdownCache(str(tmp_path / "markdown.sqlite"))
+    # convert in a process pool
+    monkeypatch.setattr(formatting, "MIN_PARALLEL", 1)
+    with markdown_pool(workers=2) as pool:
+        assert to_markdown(values, cache, pool) == expected
+
+    # everything is cached now
+    monkeypatch.setattr(formatting, "markdownify", None)
+    assert to_markdown(values, cache) == expected
+    cache.close()
+
+
+def test_format_columns(tmp_path):
+    lf = pl.LazyFrame(
+        {
+            "id": [1, 2, 3, 4],
+            "description": [html1, None, html2, html1],
+            "legal_basis": [None, None, None, None],
+        },
+        schema_overrides={"legal_basis": pl.String},
+    )
+    cache = MarkdownCache(str(tmp_path / "markdown.sqlite"))
+
+    with markdown_pool(workers=2) as pool:
+        formatted = format_columns(lf, ["description", "legal_basis"], cache, pool)
+        assert isinstance(formatted, pl.LazyFrame)
+
+        path = str(tmp_path / "formatted.parquet")
+        formatted.sink_parquet(path, engine="streaming")
+    df = pl.read_parquet(path)
+    assert df["description"].to_list() == [md(html1), None, md(html2), md(html1)]
+    assert df["legal_basis"].to_list() == [None] * 4
+    cache.close()
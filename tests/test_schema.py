@@ -0,0 +1,62 @@
+import duckdb
+import polars as pl
+import pyarrow as pa
+from funding_crawler.models import FundingProgramSchema
+from funding_crawler.schema import (
+    DLT_SYSTEM_COLUMNS,
+    SCD2_COLUMNS,
+    create_table_ddl,
+    dlt_columns,
+    pydantic_to_arrow_schema,
+    pydantic_to_polars_schema,
+    query_polars_schema,
+)
+
+columns = list(FundingProgramSchema.__annotations__.keys())
+
+
+def test_schemas_cover_all_fields():
+    dlt_schema = dlt_columns(FundingProgramSchema)
+    arrow_schema = pydantic_to_arrow_schema(FundingProgramSchema)
+    polars_schema = pydantic_to_polars_schema(FundingProgramSchema)
+
+    assert list(dlt_schema) == columns
+    assert arrow_schema.names == columns
+    assert list(polars_schema) == columns
+
+    assert dlt_schema["funding_type"]["data_type"] == "json"
+    assert dlt_schema["id_hash"] == {
+        "name": "id_hash",
+        "data_type": "text",
+        "nullable": False,
+    }
+    assert arrow_schema.field("further_links").type == pa.list_(pa.string())
+    assert polars_schema["further_links"] == pl.List(pl.Utf8)
+
+    # Arrow and Polars schemas agree
+    assert dict(pl.from_arrow(arrow_schema.empty_table()).schema) == polars_schema
+
+    query_schema = query_polars_schema(FundingProgramSchema)
+    assert query_schema["deleted"] == pl.Boolean
+    assert set(columns) < set(query_schema)
+
+
+def test_create_table_ddl():
+    ddl = create_table_ddl(
+        FundingProgramSchema,
+        "programs",
+        dialect="duckdb",
+        extra_columns={**SCD2_COLUMNS, **DLT_SYSTEM_COLUMNS},
+    )
+
+    conn = duckdb.connect()
+    conn.execute(ddl)
+    described = {row[0]: row[1] for row in conn.execute("DESCRIBE programs").fetchall()}
+
+    assert list(described) == columns + list(SCD2_COLUMNS) + list(DLT_SYSTEM_COLUMNS)
+    assert described["funding_area"] == "JSON"
+    assert described["on_website_to"] == "TIMESTAMP WITH TIME ZONE"
+
+    postgres_ddl = create_table_ddl(FundingProgramSchema, "programs")
+    assert "id_hash varchar NOT NULL" in postgres_ddl
+    assert "funding_area jsonb," in postgres_ddl
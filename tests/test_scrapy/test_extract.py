@@ -0,0 +1,45 @@
+from datetime import datetime
+import pytest
+from parsel import Selector
+from funding_crawler import extract
+from funding_crawler.extract import extract_details, extract_details_compiled
+
+URL = (
+    "https://www.foerderdatenbank.de/FDB/Content/DE/Foerderprogramm/Bund/BMWi/test.html"
+)
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def today(cls):
+        return cls(2026, 1, 1, 12, 0, 0)
+
+
+@pytest.mark.parametrize(
+    "fixture",
+    [
+        "detail_multi_desc.html",
+        "detail_single_desc.html",
+        "details_single_desc_alt.html",
+        "detail_rechts_only.html",
+        "detail_fail_19_12.html",
+        "detail_fail_07_25.html",
+    ],
+)
+def test_compiled_extractor_matches_parsel(fixture, monkeypatch):
+    # the license info contains the scrape time
+    monkeypatch.setattr(extract, "datetime", FrozenDatetime)
+
+    with open(f"tests/test_scrapy/{fixture}") as f:
+        html = f.read()
+
+    selector = Selector(text=html)
+
+    try:
+        expected = extract_details(URL, selector)
+    except ValueError:
+        with pytest.raises(ValueError):
+            extract_details_compiled(URL, selector.root)
+        return
+
+    assert extract_details_compiled(URL, selector.root) == expected
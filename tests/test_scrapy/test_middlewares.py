@@ -0,0 +1,157 @@
+import types
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+from funding_crawler import middlewares
+from funding_crawler.middlewares import (
+    ConditionalRecrawlMiddleware,
+    forget_validators,
+    parser_version,
+)
+from funding_crawler.quarantine import Quarantine
+from funding_crawler.spider import FundingSpider
+
+url = "https://www.foerderdatenbank.de/FDB/Content/DE/Foerderprogramm/Land/Thueringen/beteiligungen-thueringen-mbg-express.html"
+
+
+def test_conditional_recrawl(tmp_path):
+    crawler = get_crawler(
+        FundingSpider,
+        {"CONDITIONAL_RECRAWL_STORE": str(tmp_path / "validators.sqlite")},
+    )
+    spider = FundingSpider.from_crawler(crawler)
+    middleware = ConditionalRecrawlMiddleware.from_crawler(crawler)
+    middleware.spider_opened(spider)
+
+    with open("tests/test_scrapy/detail_multi_desc.html", "rb") as f:
+        body = f.read()
+
+    # first crawl: no validators known yet
+    request = Request(url, meta={"conditional_recrawl": True})
+    assert middleware.process_request(request, spider) is None
+    assert b"If-None-Match" not in request.headers
+
+    response = HtmlResponse(
+        url=url,
+        body=body,
+        encoding="utf-8",
+        headers={"ETag": '"abc"'},
+        request=request,
+    )
+    response = middleware.process_response(request, response, spider)
+    items = list(spider.parse_details(response))
+    assert len(items) == 1
+    middleware.item_scraped(items[0], response, spider)
+
+    # second crawl: validators are sent and a 304 re-emits the stored item
+    request = Request(url, meta={"conditional_recrawl": True})
+    middleware.process_request(request, spider)
+    assert request.headers.get("If-None-Match") == b'"abc"'
+    assert 304 in request.meta["handle_httpstatus_list"]
+
+    response = HtmlResponse(url=url, status=304, body=b"", request=request)
+    response = middleware.process_response(request, response, spider)
+    cached = list(spider.parse_details(response))
+
+    assert len(cached) == 1
+    assert cached[0]["checksum"] == items[0]["checksum"]
+    assert {k: v for k, v in cached[0].items() if k != "license_info"} == {
+        k: v for k, v in items[0].items() if k != "license_info"
+    }
+
+    # identical body without validators is recognized by its hash
+    request = Request(url, meta={"conditional_recrawl": True})
+    response = HtmlResponse(url=url, body=body, encoding="utf-8", request=request)
+    middleware.process_response(request, response, spider)
+    assert request.meta["cached_item"]["checksum"] == items[0]["checksum"]
+
+    middleware.spider_closed(spider)
+
+
+def test_conditional_recrawl_quarantined(tmp_path):
+    crawler = get_crawler(
+        FundingSpider,
+        {"CONDITIONAL_RECRAWL_STORE": str(tmp_path / "validators.sqlite")},
+    )
+    quarantine = Quarantine(str(tmp_path / "quarantine.sqlite"), "run_1")
+    spider = FundingSpider.from_crawler(crawler, run_id="run_1", quarantine=quarantine)
+    middleware = ConditionalRecrawlMiddleware.from_crawler(crawler)
+    middleware.spider_opened(spider)
+
+    with open("tests/test_scrapy/detail_multi_desc.html") as f:
+        broken = f.read().replace(
+            '<span class="btn--label">Zusatzinfos </span>',
+            '<span class="btn--label">Neuer Tab</span>',
+        )
+
+    # the validators of a page that is quarantined are dropped with its request
+    request = Request(url, meta={"conditional_recrawl": True})
+    response = HtmlResponse(
+        url=url,
+        body=broken,
+        encoding="utf-8",
+        headers={"ETag": '"abc"'},
+        request=request,
+    )
+    response = middleware.process_response(request, response, spider)
+    assert request.meta["validators"][0] == '"abc"'
+    assert list(spider.parse_details(response)) == []
+    assert quarantine.count() == 1
+
+    # nothing was stored, the page is fetched and parsed again
+    request = Request(url, meta={"conditional_recrawl": True})
+    middleware.process_request(request, spider)
+    assert b"If-None-Match" not in request.headers
+    assert middleware.store.get(url) is None
+
+    middleware.spider_closed(spider)
+    quarantine.close()
+
+
+def test_forget_invalid_items(tmp_path):
+    store_path = str(tmp_path / "validators.sqlite")
+    crawler = get_crawler(FundingSpider, {"CONDITIONAL_RECRAWL_STORE": store_path})
+    quarantine = Quarantine(str(tmp_path / "quarantine.sqlite"), "run_1")
+    spider = FundingSpider.from_crawler(crawler, run_id="run_1", quarantine=quarantine)
+    middleware = ConditionalRecrawlMiddleware.from_crawler(crawler)
+    middleware.spider_opened(spider)
+
+    with open("tests/test_scrapy/detail_multi_desc.html", "rb") as f:
+        body = f.read()
+
+    # the item is stored when it is scraped, the pipeline rejects it afterwards
+    request = Request(url, meta={"conditional_recrawl": True})
+    response = HtmlResponse(url=url, body=body, encoding="utf-8", request=request)
+    response = middleware.process_response(request, response, spider)
+    (item,) = spider.parse_details(response)
+    middleware.item_scraped(item, response, spider)
+    middleware.spider_closed(spider)
+    quarantine.add(item["url"], "title: Field required", item=item)
+    quarantine.close()
+
+    # the next run drops it before crawling, the page is parsed again
+    quarantine = Quarantine(str(tmp_path / "quarantine.sqlite"), "run_2")
+    assert quarantine.invalid_urls() == [url]
+    forget_validators(store_path, FundingSpider, quarantine.invalid_urls())
+    quarantine.close()
+
+    middleware.spider_opened(spider)
+    request = Request(url, meta={"conditional_recrawl": True})
+    response = HtmlResponse(url=url, body=body, encoding="utf-8", request=request)
+    middleware.process_response(request, response, spider)
+    assert "cached_item" not in request.meta
+    middleware.spider_closed(spider)
+
+
+def test_parser_version_covers_parser_modules(tmp_path, monkeypatch):
+    path = tmp_path / "parser.py"
+    path.write_text("VERSION = 1\n")
+    module = types.ModuleType("parser")
+    module.__file__ = str(path)
+    monkeypatch.setattr(middlewares, "PARSER_MODULES", [module])
+
+    version = parser_version(FundingSpider)
+    assert parser_version(FundingSpider) == version
+
+    # a parser fix outside the spider invalidates the store
+    path.write_text("VERSION = 2\n")
+    assert parser_version(FundingSpider) != version
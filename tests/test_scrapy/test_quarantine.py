@@ -0,0 +1,90 @@
+import dlt
+import pytest
+from scrapy.exceptions import CloseSpider
+from scrapy.http import HtmlResponse
+from funding_crawler.dlt_utils.queue import ScrapingQueue
+from funding_crawler.dlt_utils.runner import PipelineRunner
+from funding_crawler.extract import program_ids
+from funding_crawler.models import FundingProgramSchema
+from funding_crawler.quarantine import Quarantine, QuarantineLimitExceeded, reprocess
+from funding_crawler.spider import FundingSpider
+
+base_url = "https://www.foerderdatenbank.de/FDB/Content/DE/Foerderprogramm/"
+
+
+def detail_response(url, html):
+    return HtmlResponse(url=url, body=html, encoding="utf-8")
+
+
+def test_quarantine(tmp_path):
+    with open("tests/test_scrapy/detail_multi_desc.html") as f:
+        html = f.read()
+    broken = html.replace(
+        '<span class="btn--label">Zusatzinfos </span>',
+        '<span class="btn--label">Neuer Tab</span>',
+    )
+
+    quarantine = Quarantine(
+        str(tmp_path / "quarantine.sqlite"), "run_1", max_failures=1
+    )
+    spider = FundingSpider(run_id="run_1", quarantine=quarantine)
+
+    # an unknown tab name no longer closes the spider
+    assert (
+        list(spider.parse_details(detail_response(base_url + "a.html", broken))) == []
+    )
+    assert quarantine.count() == 1
+    assert quarantine.entries("run_1")[0]["html"] == broken
+    assert "Neuer Tab" in quarantine.entries("run_1")[0]["error"]
+
+    # ... unless the limit of the run is exceeded
+    with pytest.raises(CloseSpider):
+        list(spider.parse_details(detail_response(base_url + "b.html", broken)))
+
+    # invalid items are quarantined by the batch validation of the pipeline
+    item = list(spider.parse_details(detail_response(base_url + "c.html", html)))[0]
+    invalid = {**item, "url": base_url + "d.html", "title": None}
+    runner = PipelineRunner(
+        pipeline=dlt.pipeline(pipeline_name="testquarantine", destination="duckdb"),
+        queue=ScrapingQueue(),
+        item_model=FundingProgramSchema,
+        quarantine=Quarantine(str(tmp_path / "quarantine.sqlite"), "run_2"),
+    )
+    rows = runner.validate_batch([item, invalid])
+    assert [row["url"] for row in rows] == [base_url + "c.html"]
+    assert runner.quarantine.entries("run_2")[0]["item"]["url"] == base_url + "d.html"
+
+    with pytest.raises(QuarantineLimitExceeded):
+        quarantine.add(base_url + "e.html", "error")
+
+    # after a "parser fix" the quarantined page is re-processed successfully
+    with quarantine.lock, quarantine.connection:
+        quarantine.connection.execute(
+            "UPDATE quarantine SET html = ? WHERE url = ?", (html, base_url + "a.html")
+        )
+    results = {entry["url"]: item for entry, item in reprocess(quarantine, "run_1")}
+    assert results[base_url + "a.html"]["title"] == item["title"]
+    assert results[base_url + "b.html"] is None
+
+
+def test_quarantine_release(tmp_path):
+    path = str(tmp_path / "quarantine.sqlite")
+    earlier = Quarantine(path, "run_1")
+    earlier.add(base_url + "a.html", "error", html="<html></html>")
+    earlier.add(base_url + "b.html", "error", html="<html></html>")
+    earlier.close()
+
+    quarantine = Quarantine(path, "run_2")
+    quarantine.add(base_url + "a.html", "error", html="<html></html>")
+
+    # only the pages of earlier runs whose programs were loaded
+    released = quarantine.release({program_ids(base_url + "a.html")[1]})
+
+    assert [(entry["run_id"], entry["url"]) for entry in released] == [
+        ("run_1", base_url + "a.html")
+    ]
+    assert [(entry["run_id"], entry["url"]) for entry in quarantine.entries()] == [
+        ("run_1", base_url + "b.html"),
+        ("run_2", base_url + "a.html"),
+    ]
+    quarantine.close()
@@ -0,0 +1,46 @@
+from scrapy.http import HtmlResponse
+from funding_crawler.archive import HtmlArchive
+from funding_crawler.replay import replay, validate_items
+from funding_crawler.spider import FundingSpider
+
+base_url = "https://www.foerderdatenbank.de/FDB/Content/DE/Foerderprogramm/"
+
+
+def test_archive_replay(tmp_path):
+    archive = HtmlArchive(str(tmp_path))
+
+    with open("tests/test_scrapy/detail_multi_desc.html", "rb") as f:
+        body = f.read()
+
+    archive.put("run_1", base_url + "a.html", "parse_details", body, "text/html")
+    # identical content is stored only once
+    archive.put("run_1", base_url + "b.html", "parse_details", body, "text/html")
+    assert len(list((tmp_path / "objects").rglob("*.zst"))) == 1
+    assert archive.get(archive.entries("run_1")[0]["digest"]) == body
+
+    # a 304 in a later run links the last archived body
+    assert archive.link_latest("run_2", base_url + "a.html", "parse_details")
+    assert archive.runs() == ["run_1", "run_2"]
+    archive.close()
+
+    batches = list(replay(str(tmp_path), "run_1", workers=2, chunk_size=1))
+    items = [item for batch in batches for item in batch]
+
+    assert len(items) == 2
+    assert {item["url"] for item in items} == {base_url + "a.html", base_url + "b.html"}
+    assert items[0]["checksum"] == items[1]["checksum"]
+
+    items = [item for batch in replay(str(tmp_path)) for item in batch]
+    assert [item["url"] for item in items] == [base_url + "a.html"]
+
+
+def test_validate_items(caplog):
+    with open("tests/test_scrapy/detail_multi_desc.html", "rb") as f:
+        response = HtmlResponse(url=base_url + "a.html", body=f.read())
+    (item,) = FundingSpider().parse_details(response)
+
+    # an invalid item is logged and left out, the others are kept
+    programs = validate_items([{**item, "title": None}, item])
+
+    assert [program["url"] for program in programs] == [item["url"]]
+    assert "is invalid" in caplog.text
@@ -1,7 +1,14 @@
+import json
+import multiprocessing
+import pytest
+from scrapy.crawler import CrawlerProcess
+from scrapy.exceptions import CloseSpider, DontCloseSpider
 from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
 from funding_crawler.spider import FundingSpider
 from pydantic import ValidationError
 from funding_crawler.models import FundingProgramSchema
+from funding_crawler.quarantine import Quarantine
 import requests
 
 
@@ -41,6 +48,99 @@ def test_parse():
     assert pagination_requests[0].callback == spider.parse
 
 
+def test_parse_parallel_pagination():
+    spider = FundingSpider()
+    spider.parallel_pagination = True
+
+    with open("tests/test_scrapy/overview.html") as f:
+        html = f.read()
+
+    response = HtmlResponse(url="http://example.com", body=html, encoding="utf-8")
+
+    results = list(spider.parse(response))
+
+    detail_requests = [req for req in results if req.callback == spider.parse_details]
+    pagination_requests = [req for req in results if req.callback == spider.parse]
+
+    assert len(detail_requests) == 10
+    assert spider.hits_count == 2395
+    assert spider.expected_pages == 240
+    assert len(pagination_requests) == 239
+    assert len({req.url for req in pagination_requests}) == 239
+    assert all(
+        req.priority == spider.pagination_priority for req in pagination_requests
+    )
+    assert pagination_requests[-1].meta["page_number"] == 240
+    assert "list%253D240" in pagination_requests[-1].url
+
+    # pages scheduled by the fan-out do not fan out again
+    fanned_out = HtmlResponse(
+        url=pagination_requests[0].url,
+        body=html,
+        encoding="utf-8",
+        request=pagination_requests[0],
+    )
+    results = list(spider.parse(fanned_out))
+    assert not [req for req in results if req.callback == spider.parse]
+
+
+def test_recrawl_short_pages():
+    crawler = get_crawler(FundingSpider, {"FUNDING_RECRAWL_SHORT_PAGES": 1})
+    spider = FundingSpider.from_crawler(crawler)
+    scheduled = []
+    crawler.engine = type("Engine", (), {"crawl": staticmethod(scheduled.append)})()
+
+    with open("tests/test_scrapy/overview.html") as f:
+        # one card is missing on the page
+        html = f.read().replace("card--fundingprogram", "card--missing", 1)
+
+    response = HtmlResponse(url="http://example.com", body=html, encoding="utf-8")
+    list(spider.parse(response))
+
+    assert crawler.stats.get_value("funding/hits_count") == 2395
+    assert crawler.stats.get_value("funding/total_cards_found") == 9
+    assert crawler.stats.get_value("funding/unique_urls") == 9
+    assert spider.short_pages == {1: "http://example.com"}
+
+    with pytest.raises(DontCloseSpider):
+        spider.spider_idle()
+    assert [(r.url, r.meta["recrawl"], r.dont_filter) for r in scheduled] == [
+        ("http://example.com", True, True)
+    ]
+
+    # re-crawled pages are not followed again
+    recrawled = HtmlResponse(
+        url="http://example.com", body=html, encoding="utf-8", request=scheduled[0]
+    )
+    assert not [req for req in spider.parse(recrawled) if req.callback == spider.parse]
+
+    # only one round, then the spider closes as incomplete
+    with pytest.raises(CloseSpider) as e:
+        spider.spider_idle()
+    assert e.value.reason == "urls_incomplete"
+    assert len(scheduled) == 1
+    assert crawler.stats.get_value("funding/missing_urls") == 2386
+
+
+def test_closed_urls_complete():
+    crawler = get_crawler(FundingSpider, {"FUNDING_MAX_MISSING": 2})
+    spider = FundingSpider.from_crawler(crawler)
+    spider.unique_urls = {f"https://example.org/{i}": (1, None) for i in range(8)}
+
+    # within the tolerance, the spider closes as finished
+    spider.hits_count = 10
+    spider.spider_idle()
+
+    spider.hits_count = 11
+    with pytest.raises(CloseSpider) as e:
+        spider.spider_idle()
+    assert e.value.reason == "urls_incomplete"
+
+    # unknown hits cannot be checked
+    spider.hits_count = None
+    spider.spider_idle()
+
+
 def test_parse_details_multi():
     spider = FundingSpider()
 
@@ -262,3 +362,81 @@ def test_parse_details_fail_19_12():
     assert validated_item.further_links == [
         "https://foerderportal.wibank.de/site/#/public/home"
     ]
+
+
+class DetailPagesSpider(FundingSpider):
+    """Fetches the detail pages `detail_urls` only."""
+
+    def __init__(self, *args, detail_urls=(), **kwargs):
+        super(DetailPagesSpider, self).__init__(*args, **kwargs)
+        self.detail_urls = detail_urls
+
+    def start_requests(self):
+        for url in self.detail_urls:
+            yield Request(url, callback=self.details_callback)
+
+
+def crawl_detail_pages(urls, settings, output_path, quarantine_path):
+    # starts a Twisted reactor, so it runs in a fresh process
+    quarantine = Quarantine(quarantine_path, "run_1")
+    process = CrawlerProcess(
+        settings={**settings, "FEEDS": {output_path: {"format": "jsonlines"}}}
+    )
+    crawler = process.create_crawler(DetailPagesSpider)
+    process.crawl(crawler, detail_urls=urls, run_id="run_1", quarantine=quarantine)
+    process.start()
+    quarantine.close()
+    return crawler.stats.get_value("finish_reason")
+
+
+def test_parse_details_in_pool_thread(tmp_path):
+    with open("tests/test_scrapy/detail_multi_desc.html") as f:
+        html = f.read()
+    broken = html.replace(
+        '<span class="btn--label">Zusatzinfos </span>',
+        '<span class="btn--label">Neuer Tab</span>',
+    )
+    pages = {"valid.html": html, "broken.html": broken}
+    for name, body in pages.items():
+        (tmp_path / name).write_text(body, encoding="utf-8")
+    urls = [(tmp_path / name).as_uri() for name in pages]
+    output_path = str(tmp_path / "items.jsonl")
+    quarantine_path = str(tmp_path / "quarantine.sqlite")
+
+    # a real crawl, the reactor resolves the awaited results of the thread pool
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        finish_reason = pool.apply(
+            crawl_detail_pages,
+            (
+                urls,
+                {
+                    "LOG_LEVEL": "ERROR",
+                    "FUNDING_PARSE_WORKERS": 2,
+                    "FUNDING_PARSE_EXECUTOR": "thread",
+                },
+                output_path,
+                quarantine_path,
+            ),
+        )
+
+    assert finish_reason == "finished"
+    with open(output_path, encoding="utf-8") as f:
+        items = [json.loads(line) for line in f]
+    # the same item as the inline path
+    inline = list(
+        FundingSpider().parse_details(
+            HtmlResponse(url=urls[0], body=html, encoding="utf-8")
+        )
+    )
+    # the license info holds the retrieval time
+    assert [{**item, "license_info": None} for item in items] == [
+        {**item, "license_info": None} for item in json.loads(json.dumps(inline))
+    ]
+
+    # the extraction error of the worker reaches handle_details_error
+    quarantine = Quarantine(quarantine_path, "run_1")
+    (entry,) = quarantine.entries("run_1")
+    assert entry["url"] == urls[1]
+    assert "Neuer Tab" in entry["error"]
+    quarantine.close()
@@ -0,0 +1,141 @@
+import pytest
+from scrapy.http import HtmlResponse
+from scrapy.utils.test import get_crawler
+from funding_crawler.shards import (
+    ShardPlanSpider,
+    ShardSpider,
+    merge_items,
+    merge_stats,
+    partition_urls,
+    shard_archive,
+    shard_settings,
+    shard_shares,
+)
+
+START_URL = "https://www.foerderdatenbank.de/SiteGlobals/FDB/Forms/Suche/Expertensuche_Formular.html?resourceId=c4b4dbf3&submit=Suchen&pageLocale=de&filterCategories=FundingProgram"
+
+
+def test_shard_plan():
+    with open("tests/test_scrapy/overview.html", "rb") as f:
+        response = HtmlResponse(url=START_URL, body=f.read(), encoding="utf-8")
+    crawler = get_crawler(ShardPlanSpider, {"FUNDING_PARALLEL_PAGINATION": True})
+    spider = ShardPlanSpider.from_crawler(crawler)
+
+    requests = list(spider.parse(response))
+
+    # the overview pages are crawled, the detail pages are only listed
+    assert requests
+    assert all(request.callback == spider.parse for request in requests)
+    assert len(spider.unique_urls) == 10
+    assert crawler.stats.get_value("funding/hits_count") == 2395
+
+
+def test_shard_spider():
+    urls = ["https://example.org/a", "https://example.org/b"]
+    crawler = get_crawler(ShardSpider)
+    spider = ShardSpider.from_crawler(crawler, detail_urls=urls)
+
+    requests = list(spider.start_requests())
+
+    assert [request.url for request in requests] == urls
+    assert all(request.callback == spider.parse_details for request in requests)
+    assert all(request.meta["conditional_recrawl"] for request in requests)
+    assert len(spider.unique_urls) == 2
+
+
+def test_partition_urls():
+    urls = [f"https://example.org/{i}" for i in range(100)]
+
+    partition = partition_urls(urls, 4)
+
+    # every URL in exactly one shard
+    assert sorted(url for shard in partition for url in shard) == sorted(urls)
+    assert all(partition)
+    # independent of the other URLs of the run
+    assert partition_urls(urls[:50], 4) == [
+        [url for url in shard if url in urls[:50]] for shard in partition
+    ]
+
+
+def test_shard_shares():
+    partition = [["a", "b", "c"], [], ["d"]]
+
+    assert shard_shares(partition) == {0: 0.75, 2: 0.25}
+
+
+def test_shard_settings_stay_below_total_rate():
+    settings = {"DOWNLOAD_DELAY": 0.5, "CONCURRENT_REQUESTS": 16, "LOG_LEVEL": "INFO"}
+    sharded = shard_settings(settings, {0: 0.75, 1: 0.25})
+
+    assert sharded[1]["LOG_LEVEL"] == "INFO"
+    # the larger shard requests faster, together slower than one crawl
+    concurrency = [s["CONCURRENT_REQUESTS"] for s in sharded.values()]
+    assert concurrency == [10, 4]
+    rate = sum(1 / s["DOWNLOAD_DELAY"] for s in sharded.values())
+    assert rate < 1 / settings["DOWNLOAD_DELAY"]
+    assert sharded[0]["DOWNLOAD_DELAY"] < sharded[1]["DOWNLOAD_DELAY"]
+
+    # every shard needs one concurrent request, less than one crawl has
+    shares = {shard: 1 / 8 for shard in range(8)}
+    assert (
+        sum(
+            s["CONCURRENT_REQUESTS"]
+            for s in shard_settings({"CONCURRENT_REQUESTS": 16}, shares).values()
+        )
+        < 16
+    )
+    with pytest.raises(ValueError):
+        shard_settings({"CONCURRENT_REQUESTS": 7}, shares)
+
+
+def test_shard_archive():
+    assert shard_archive({"ARCHIVE_DIR": "/state/archive"}, 2) == {
+        "ARCHIVE_DIR": "/state/archive_2"
+    }
+    assert shard_archive({"ARCHIVE_DIR": None}, 2) == {"ARCHIVE_DIR": None}
+
+
+def test_merge_items():
+    shards = [
+        [{"id_hash": "a", "shard": 1}, {"id_hash": "b", "shard": 1}],
+        [{"id_hash": "b", "shard": 2}, {"id_hash": "c", "shard": 2}],
+    ]
+
+    merged = merge_items(iter(shard) for shard in shards)
+
+    assert [item["id_hash"] for item in merged] == ["a", "b", "c"]
+    assert merged[1]["shard"] == 1
+
+
+def test_merge_stats():
+    plan = {
+        "finish_reason": "finished",
+        "hits_count": 142,
+        "total_cards_found": 142,
+        "urls": [f"https://example.org/{i}" for i in range(142)],
+    }
+    results = [
+        {"finish_reason": "finished", "quarantined": []},
+        {"finish_reason": "finished", "quarantined": ["https://example.org/1"]},
+    ]
+
+    stats = merge_stats(plan, results, 140)
+    assert stats["finish_reason"] == "finished"
+    assert stats["funding/unique_urls"] == 142
+    assert stats["funding/merged_programs"] == 140
+
+    # the merged programs are compared with the unfiltered search
+    assert merge_stats(plan, results, 120)["finish_reason"] == "shards_incomplete"
+    assert (
+        merge_stats({**plan, "hits_count": None}, results, 140)["finish_reason"]
+        == "shards_incomplete"
+    )
+
+    results[1]["finish_reason"] = "closespider_errorcount"
+    assert merge_stats(plan, results, 142)["finish_reason"] == "shard_not_finished"
+    assert (
+        merge_stats({**plan, "finish_reason": "shutdown"}, results, 142)[
+            "finish_reason"
+        ]
+        == "plan_not_finished"
+    )
@@ -0,0 +1,37 @@
+import os
+import boto3
+from moto import mock_aws
+from funding_crawler.upload import upload_if_changed, write_zip
+
+
+def test_write_zip_is_deterministic(tmp_path):
+    (tmp_path / "data.csv").write_text("id_hash,title\na,b\n")
+    (tmp_path / "LICENSE-DATA").write_text("license")
+    files = {
+        "data.csv": str(tmp_path / "data.csv"),
+        "LICENSE-DATA": str(tmp_path / "LICENSE-DATA"),
+    }
+
+    write_zip(str(tmp_path / "a.zip"), files)
+    os.utime(tmp_path / "data.csv", (0, 0))
+    write_zip(str(tmp_path / "b.zip"), dict(reversed(files.items())))
+
+    assert (tmp_path / "a.zip").read_bytes() == (tmp_path / "b.zip").read_bytes()
+
+
+@mock_aws
+def test_upload_if_changed(tmp_path):
+    client = boto3.client("s3", region_name="us-east-1")
+    client.create_bucket(Bucket="bucket")
+
+    path = tmp_path / "data.zip"
+    # larger than one part, so it is uploaded in parts
+    path.write_bytes(os.urandom(9 * 1024 * 1024))
+
+    assert upload_if_changed(client, str(path), "bucket", "data/data.zip")
+    assert not upload_if_changed(client, str(path), "bucket", "data/data.zip")
+
+    path.write_bytes(b"changed")
+    assert upload_if_changed(client, str(path), "bucket", "data/data.zip")
+    obj = client.get_object(Bucket="bucket", Key="data/data.zip")
+    assert obj["Body"].read() == b"changed"